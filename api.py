@@ -0,0 +1,317 @@
+import base64
+import binascii
+import contextlib
+import datetime
+import functools
+import hashlib
+import json
+import logging
+
+from sqlalchemy import text
+from starlette.applications import Starlette
+from starlette.concurrency import run_in_threadpool
+from starlette.middleware import Middleware
+from starlette.middleware.gzip import GZipMiddleware
+from starlette.responses import JSONResponse, Response
+from starlette.routing import Route
+
+import app as ems
+import tenancy
+
+# The app's caches warn on every call made outside a Streamlit script run
+logging.getLogger("streamlit.runtime.scriptrunner_utils.script_run_context").setLevel(logging.ERROR)
+
+# Headless API
+# A JSON API over the same data access as the Streamlit pages, for scripts and
+# integrations. It uses the app's database settings and runs next to it:
+#     uvicorn api:app --port 8000
+# Every request carries an API key created under Admin > API Keys, either as
+# "Authorization: Bearer <key>" or "X-API-Key: <key>", and only sees the key's
+# organization. Lists are newest first and paged by cursor: pass next_cursor
+# back as ?cursor= until it is null. Responses carry an ETag, and a GET with a
+# matching If-None-Match gets an empty 304. Larger bodies are gzip-compressed
+# for clients that accept it.
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+GZIP_MINIMUM_SIZE = 1000
+
+TASK_STATUSES = {"all": "All Tasks", "pending": "Pending", "completed": "Completed"}
+
+
+class ApiError(Exception):
+    def __init__(self, status_code, message):
+        super().__init__(message)
+        self.status_code = status_code
+        self.message = message
+
+
+def json_default(value):
+    if isinstance(value, (datetime.date, datetime.datetime)):
+        return value.isoformat()
+    raise TypeError(f"Cannot serialize {type(value).__name__}")
+
+
+# Weak validator: the same JSON is also served gzip-compressed
+def etag_for(body):
+    return f'W/"{hashlib.sha256(body).hexdigest()[:32]}"'
+
+
+def etag_matches(header, etag):
+    if not header:
+        return False
+    candidates = [candidate.strip() for candidate in header.split(",")]
+    return "*" in candidates or etag.removeprefix("W/") in (candidate.removeprefix("W/") for candidate in candidates)
+
+
+def json_response(request, data, status_code=200):
+    body = json.dumps(data, default=json_default, separators=(",", ":")).encode()
+    headers = {"ETag": etag_for(body), "Cache-Control": "private, no-cache"}
+    if request.method == "GET" and etag_matches(request.headers.get("if-none-match"), headers["ETag"]):
+        return Response(status_code=304, headers=headers)
+    return Response(body, status_code=status_code, headers=headers, media_type="application/json")
+
+
+# Cursors are opaque to clients: base64 of the JSON sort key of the last row
+def encode_cursor(values):
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    try:
+        return json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except (binascii.Error, ValueError):
+        raise ApiError(400, "Invalid cursor")
+
+
+def parse_date(value, name):
+    try:
+        return datetime.date.fromisoformat(value)
+    except (TypeError, ValueError):
+        raise ApiError(400, f"{name} must be a date (YYYY-MM-DD)")
+
+
+def parse_int(value, name):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise ApiError(400, f"{name} must be an integer")
+
+
+def page_size(request):
+    limit = parse_int(request.query_params.get("limit", DEFAULT_PAGE_SIZE), "limit")
+    return max(1, min(limit, MAX_PAGE_SIZE))
+
+
+def required(body, name):
+    if body.get(name) in (None, ""):
+        raise ApiError(400, f"{name} is required")
+    return body[name]
+
+
+def api_key(request):
+    authorization = request.headers.get("authorization", "")
+    if authorization.lower().startswith("bearer "):
+        return authorization[7:].strip()
+    return request.headers.get("x-api-key")
+
+
+# (org_id, key name) of an active key, or None
+def key_owner(key):
+    with ems.engine.connect() as conn:
+        result = conn.execute(text('''
+        SELECT org_id, name FROM api_keys
+        WHERE key_hash = :key_hash AND revoked_at IS NULL
+        '''), {'key_hash': ems.hash_api_key(key)})
+        return result.fetchone()
+
+
+def employee_directory(org_id):
+    return ems.fetch_employee_directory(org_id, ems.changes.org_versions(org_id, "employees"))
+
+
+# Changes made with a key are audited under its name
+def audit(request, org_id, action, target_type=None, target_id=None, **details):
+    ems.get_audit_log().record(org_id, None, f"api:{request.state.key_name}"[:100], action, target_type, target_id, details)
+
+
+# Reports and tasks can only be written for active employees of the key's organization
+def check_employee(org_id, employee_id):
+    employee_id = parse_int(employee_id, "employee_id")
+    if not any(emp[0] == employee_id and emp[4] and not emp[5] for emp in employee_directory(org_id)):
+        raise ApiError(404, "Employee not found")
+    return employee_id
+
+
+# Handlers are plain functions run in the thread pool, like the app's data
+# access; they take the request, the key's organization and the JSON body and
+# return (status code, data)
+def endpoint(handler):
+    @functools.wraps(handler)
+    async def wrapper(request):
+        try:
+            key = api_key(request)
+            owner = await run_in_threadpool(key_owner, key) if key else None
+            if owner is None:
+                raise ApiError(401, "Missing or invalid API key")
+            org_id, request.state.key_name = owner
+            body = None
+            if request.method in ("POST", "PATCH"):
+                try:
+                    body = await request.json()
+                except ValueError:
+                    raise ApiError(400, "Request body must be JSON")
+                if not isinstance(body, dict):
+                    raise ApiError(400, "Request body must be a JSON object")
+            status_code, data = await run_in_threadpool(handler, request, org_id, body)
+        except ApiError as e:
+            return JSONResponse({"error": e.message}, status_code=e.status_code)
+        return json_response(request, data, status_code)
+    return wrapper
+
+
+# Same figures as the admin overview cards
+@endpoint
+def get_stats(request, org_id, body):
+    results = ems.get_reader(org_id).fetch_all({'stats': (ems.OVERVIEW_STATS_SQL, None)}, org_id=org_id)
+    total_reports, total_tasks, completed_tasks = results['stats'][0]
+    return 200, {
+        "active_employees": sum(1 for emp in employee_directory(org_id) if emp[4] and not emp[5]),
+        "total_reports": total_reports,
+        "total_tasks": total_tasks,
+        "completed_tasks": completed_tasks,
+        "pending_tasks": total_tasks - completed_tasks,
+    }
+
+
+@endpoint
+def list_employees(request, org_id, body):
+    return 200, {"data": [
+        {"id": emp[0], "username": emp[1], "full_name": emp[2], "is_active": bool(emp[4])}
+        for emp in employee_directory(org_id) if not emp[5]
+    ]}
+
+
+@endpoint
+def list_reports(request, org_id, body):
+    params = request.query_params
+    start_date = parse_date(params["start_date"], "start_date") if "start_date" in params else datetime.date.min
+    end_date = parse_date(params["end_date"], "end_date") if "end_date" in params else datetime.date.max
+    employee_id = parse_int(params["employee_id"], "employee_id") if "employee_id" in params else None
+    before = None
+    if "cursor" in params:
+        cursor = decode_cursor(params["cursor"])
+        if not isinstance(cursor, list) or len(cursor) != 2:
+            raise ApiError(400, "Invalid cursor")
+        before = (parse_date(cursor[0], "cursor"), parse_int(cursor[1], "cursor"))
+    limit = page_size(request)
+
+    # One extra row tells whether another page follows
+    reports = ems.fetch_report_page(org_id, start_date, end_date, employee_id, before, limit + 1)
+    next_cursor = None
+    if len(reports) > limit:
+        reports = reports[:limit]
+        next_cursor = encode_cursor([reports[-1][3].isoformat(), reports[-1][0]])
+    return 200, {
+        "data": [
+            {"id": report[0], "employee_id": report[1], "employee_name": report[2], "report_date": report[3], "report_text": report[4]}
+            for report in reports
+        ],
+        "next_cursor": next_cursor,
+    }
+
+
+# Creates or replaces the employee's report for the day, like Submit Report
+@endpoint
+def submit_report(request, org_id, body):
+    employee_id = check_employee(org_id, required(body, "employee_id"))
+    report_date = parse_date(body.get("report_date", datetime.date.today().isoformat()), "report_date")
+    report_text = required(body, "report_text")
+    try:
+        with tenancy.connect(ems.engine, org_id) as conn:
+            report_id = ems.upsert_report(conn, employee_id, report_date, str(report_text))
+            conn.commit()
+    except ValueError as e:
+        raise ApiError(409, str(e))
+    audit(request, org_id, "report.submit", "report", report_id, employee_id=employee_id, report_date=report_date)
+    return 200, {"employee_id": employee_id, "report_date": report_date, "report_text": report_text}
+
+
+def task_data(task):
+    return {
+        "id": task[0],
+        "employee_id": task[6],
+        "employee_name": task[1],
+        "task_description": task[2],
+        "due_date": task[3],
+        "is_completed": bool(task[4]),
+        "created_at": task[5],
+    }
+
+
+@endpoint
+def list_tasks(request, org_id, body):
+    params = request.query_params
+    status = params.get("status", "all")
+    if status not in TASK_STATUSES:
+        raise ApiError(400, f"status must be one of {', '.join(TASK_STATUSES)}")
+    employee_id = parse_int(params["employee_id"], "employee_id") if "employee_id" in params else None
+    before_id = parse_int(decode_cursor(params["cursor"]), "cursor") if "cursor" in params else None
+    limit = page_size(request)
+
+    tasks = ems.fetch_tasks(employee_id, status=TASK_STATUSES[status], limit=limit + 1,
+                            org_id=org_id, before_id=before_id, newest_first=True)
+    next_cursor = None
+    if len(tasks) > limit:
+        tasks = tasks[:limit]
+        next_cursor = encode_cursor(tasks[-1][0])
+    return 200, {"data": [task_data(task) for task in tasks], "next_cursor": next_cursor}
+
+
+@endpoint
+def create_task(request, org_id, body):
+    employee_id = check_employee(org_id, required(body, "employee_id"))
+    task_description = str(required(body, "task_description"))
+    due_date = parse_date(body["due_date"], "due_date") if body.get("due_date") else None
+    with tenancy.connect(ems.engine, org_id) as conn:
+        task_id = ems.create_task(conn, org_id, employee_id, task_description, due_date)
+        conn.commit()
+    audit(request, org_id, "task.create", "task", task_id, employee_id=employee_id, due_date=due_date)
+    return 201, {"id": task_id, "employee_id": employee_id, "task_description": task_description,
+                 "due_date": due_date, "is_completed": False}
+
+
+@endpoint
+def update_task(request, org_id, body):
+    task_id = request.path_params["task_id"]
+    is_completed = required(body, "is_completed")
+    if not isinstance(is_completed, bool):
+        raise ApiError(400, "is_completed must be true or false")
+    with tenancy.connect(ems.engine, org_id) as conn:
+        updated = ems.update_task_completion(conn, task_id, is_completed, org_id)
+        conn.commit()
+    if not updated:
+        raise ApiError(404, "Task not found")
+    audit(request, org_id, "task.complete" if is_completed else "task.reopen", "task", task_id)
+    return 200, {"id": task_id, "is_completed": is_completed}
+
+
+@contextlib.asynccontextmanager
+async def lifespan(app):
+    if not await run_in_threadpool(ems.init_services):
+        raise RuntimeError("Failed to connect to the database. Please check your database configuration.")
+    yield
+
+
+app = Starlette(
+    routes=[
+        Route("/api/stats", get_stats, methods=["GET"]),
+        Route("/api/employees", list_employees, methods=["GET"]),
+        Route("/api/reports", list_reports, methods=["GET"]),
+        Route("/api/reports", submit_report, methods=["POST"]),
+        Route("/api/tasks", list_tasks, methods=["GET"]),
+        Route("/api/tasks", create_task, methods=["POST"]),
+        Route("/api/tasks/{task_id:int}", update_task, methods=["PATCH"]),
+    ],
+    middleware=[Middleware(GZipMiddleware, minimum_size=GZIP_MINIMUM_SIZE)],
+    lifespan=lifespan,
+)
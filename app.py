@@ -1,29 +1,40 @@
 import streamlit as st
+from streamlit.runtime.scriptrunner import get_script_run_ctx
 import pandas as pd
 import datetime
 import time
-from sqlalchemy import create_engine, text
-import io
+import os
+import hashlib
+import json
+import secrets
+from sqlalchemy import bindparam, text
+from sqlalchemy.exc import IntegrityError
 import base64
+import tempfile
+import threading
 from PIL import Image
 import requests
 from streamlit_option_menu import option_menu
+from write_queue import WriteBehindQueue
+from backends import create_backend, split_statements, as_date, as_datetime
+from notifications import create_change_bus
+from async_reads import create_reader
+from replicas import ReplicaSet
+from report_storage import ReportStorage
+from audit import AuditLog
+import bulk_import
+import metrics
+import rendering
+import session_memory
+import tenancy
 import plotly.express as px
 from reportlab.lib.pagesizes import letter
 from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.lib import colors
 
-# Page config
-st.set_page_config(
-    page_title="Employee Management System",
-    page_icon="👥",
-    layout="centered",
-    initial_sidebar_state="expanded"
-)
-
 # Custom CSS for better UI
-st.markdown("""
+PAGE_CSS = """
 <style>
     .main-header {
         font-size: 2.5rem;
@@ -131,32 +142,92 @@ st.markdown("""
         border: 3px solid #1E88E5;
     }
 </style>
-""", unsafe_allow_html=True)
+"""
+
+# Page config; runs first in main(), so other processes (the API) can import
+# this module for its data access without starting a page
+def setup_page():
+    st.set_page_config(
+        page_title="Employee Management System",
+        page_icon="👥",
+        layout="centered",
+        initial_sidebar_state="expanded"
+    )
+    st.markdown(PAGE_CSS, unsafe_allow_html=True)
+
+# Settings come from Streamlit secrets, with environment variables as a fallback
+# so the app can run locally or in CI without a secrets file
+def get_setting(*keys, env=None):
+    try:
+        value = st.secrets
+        for key in keys:
+            value = value[key]
+        return value
+    except Exception:
+        return os.environ.get(env) if env else None
 
 # Database connection
+# DATABASE_URL overrides the configured URL, e.g. DATABASE_URL=sqlite:///ems.db
+# (WAL-mode file) or DATABASE_URL=sqlite:// (in-memory) for a local stand-in
 @st.cache_resource
 def init_connection():
     try:
-        return create_engine(st.secrets["postgres"]["url"])
+        url = os.environ.get("DATABASE_URL") or get_setting("database", "url") or get_setting("postgres", "url")
+        if not url:
+            raise ValueError("No database URL configured. Set [postgres] url in .streamlit/secrets.toml or DATABASE_URL")
+        backend = create_backend(url)
+        metrics.track_pool("primary", backend.engine)
+        return backend
     except Exception as e:
         st.error(f"Database connection error: {e}")
         return None
 
-# Initialize DB tables if they don't exist
+# Organizations
+# Every tenant table carries org_id. Employees, per-org admins included, belong
+# to one organization, and pages only read and write rows of the session's
+# organization through connections scoped to it (see tenancy.py). Existing
+# single-tenant data becomes organization 1.
+DEFAULT_ORG_ID = 1
+ORG_TABLES = ("employees", "daily_reports", "tasks", "report_daily_stats", "missing_reports")
+
+def current_org():
+    return st.session_state.user.get("org_id", DEFAULT_ORG_ID)
+
+# Connection scoped to the session's organization; reads may go to a replica
+def org_connection(read=False):
+    org_id = current_org()
+    return tenancy.connect(read_engine(org_id) if read else engine, org_id)
+
+# The index added by the newest migration in init_db. Readiness probes check
+# for it to tell that the schema is current; move it along with new migrations.
+LATEST_SCHEMA_INDEX = 'idx_tasks_org_completed'
+
+# Initialize DB tables if they don't exist; runs once per process
+@st.cache_resource
 def init_db():
     with engine.connect() as conn:
-        conn.execute(text('''
+        for statement in split_statements(f'''
+        CREATE TABLE IF NOT EXISTS organizations (
+            id {db.serial_primary_key},
+            name VARCHAR(100) UNIQUE NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        );
+        
         CREATE TABLE IF NOT EXISTS employees (
-            id SERIAL PRIMARY KEY,
+            id {db.serial_primary_key},
+            org_id INTEGER NOT NULL DEFAULT {DEFAULT_ORG_ID} REFERENCES organizations(id),
             username VARCHAR(50) UNIQUE NOT NULL,
             password VARCHAR(255) NOT NULL,
             full_name VARCHAR(100) NOT NULL,
             profile_pic_url TEXT,
-            is_active BOOLEAN DEFAULT TRUE
+            is_active BOOLEAN DEFAULT TRUE,
+            is_admin BOOLEAN DEFAULT FALSE,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
         );
         
         CREATE TABLE IF NOT EXISTS daily_reports (
-            id SERIAL PRIMARY KEY,
+            id {db.serial_primary_key},
+            org_id INTEGER NOT NULL DEFAULT {DEFAULT_ORG_ID} REFERENCES organizations(id),
             employee_id INTEGER REFERENCES employees(id),
             report_date DATE NOT NULL,
             report_text TEXT NOT NULL,
@@ -164,50 +235,786 @@ def init_db():
         );
         
         CREATE TABLE IF NOT EXISTS tasks (
-            id SERIAL PRIMARY KEY,
+            id {db.serial_primary_key},
+            org_id INTEGER NOT NULL DEFAULT {DEFAULT_ORG_ID} REFERENCES organizations(id),
             employee_id INTEGER REFERENCES employees(id),
             task_description TEXT NOT NULL,
             due_date DATE,
             is_completed BOOLEAN DEFAULT FALSE,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            completed_at TIMESTAMP,
+            reopened_at TIMESTAMP,
+            deleted_at TIMESTAMP
+        );
+        
+        CREATE TABLE IF NOT EXISTS report_daily_stats (
+            org_id INTEGER NOT NULL DEFAULT {DEFAULT_ORG_ID} REFERENCES organizations(id),
+            employee_id INTEGER REFERENCES employees(id),
+            stat_date DATE NOT NULL,
+            reports_submitted INTEGER NOT NULL DEFAULT 0,
+            tasks_created INTEGER NOT NULL DEFAULT 0,
+            tasks_due INTEGER NOT NULL DEFAULT 0,
+            tasks_completed INTEGER NOT NULL DEFAULT 0,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (employee_id, stat_date)
+        );
+        
+        CREATE TABLE IF NOT EXISTS compliance_days (
+            report_date DATE PRIMARY KEY,
+            materialized_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        );
+        
+        CREATE TABLE IF NOT EXISTS missing_reports (
+            org_id INTEGER NOT NULL DEFAULT {DEFAULT_ORG_ID} REFERENCES organizations(id),
+            employee_id INTEGER REFERENCES employees(id),
+            report_date DATE NOT NULL,
+            PRIMARY KEY (employee_id, report_date)
+        );
+        
+        CREATE TABLE IF NOT EXISTS api_keys (
+            id {db.serial_primary_key},
+            org_id INTEGER NOT NULL REFERENCES organizations(id),
+            name VARCHAR(100) NOT NULL,
+            key_hash CHAR(64) UNIQUE NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            revoked_at TIMESTAMP
+        );
+        
+        CREATE TABLE IF NOT EXISTS digests (
+            id {db.serial_primary_key},
+            org_id INTEGER NOT NULL REFERENCES organizations(id),
+            period_start TIMESTAMP,
+            period_end TIMESTAMP NOT NULL,
+            report_count INTEGER NOT NULL,
+            delivered_to TEXT NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        );
+        
+        CREATE TABLE IF NOT EXISTS task_reminders (
+            task_id INTEGER PRIMARY KEY REFERENCES tasks(id) ON DELETE CASCADE,
+            due_date DATE NOT NULL,
+            stage SMALLINT NOT NULL,
+            sent_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        );
+        
+        CREATE TABLE IF NOT EXISTS reminder_runs (
+            id {db.serial_primary_key},
+            run_date DATE NOT NULL,
+            last_task_id INTEGER NOT NULL,
+            notifications INTEGER NOT NULL,
             created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
         );
+        
+        CREATE TABLE IF NOT EXISTS audit_events (
+            id {db.serial_primary_key},
+            event_key CHAR(32) UNIQUE NOT NULL,
+            org_id INTEGER NOT NULL REFERENCES organizations(id),
+            occurred_at TIMESTAMP NOT NULL,
+            actor_id INTEGER,
+            actor VARCHAR(100) NOT NULL,
+            action VARCHAR(50) NOT NULL,
+            target_type VARCHAR(20),
+            target_id INTEGER,
+            details TEXT
+        );
+        '''):
+            conn.execute(text(statement))
+        
+        # Databases created before organizations existed: everything belongs
+        # to the default organization
+        conn.execute(text('''
+        INSERT INTO organizations (name)
+        SELECT 'Default' WHERE NOT EXISTS (SELECT 1 FROM organizations)
         '''))
+        for table in ORG_TABLES:
+            db.add_column(conn, table, 'org_id', f'INTEGER NOT NULL DEFAULT {DEFAULT_ORG_ID}', references='organizations(id)')
+        db.add_column(conn, 'employees', 'is_admin', 'BOOLEAN DEFAULT FALSE')
+        # Hire date; NULL for employees added before it was recorded
+        db.add_column(conn, 'employees', 'created_at', 'TIMESTAMP')
+        for column in ('completed_at', 'reopened_at', 'deleted_at'):
+            db.add_column(conn, 'tasks', column, 'TIMESTAMP')
+        
+        # Admin pages filter by organization first, so their indexes lead with org_id
+        for statement in split_statements('''
+        CREATE INDEX IF NOT EXISTS idx_employees_org ON employees (org_id, is_active);
+        CREATE INDEX IF NOT EXISTS idx_daily_reports_org_date ON daily_reports (org_id, report_date);
+        CREATE INDEX IF NOT EXISTS idx_report_daily_stats_org_date ON report_daily_stats (org_id, stat_date);
+        CREATE INDEX IF NOT EXISTS idx_missing_reports_org_date ON missing_reports (org_id, report_date);
+        CREATE INDEX IF NOT EXISTS idx_digests_org_period ON digests (org_id, period_end);
+        CREATE INDEX IF NOT EXISTS idx_audit_events_org_time ON audit_events (org_id, occurred_at);
+        CREATE INDEX IF NOT EXISTS idx_audit_events_org_target ON audit_events (org_id, target_type, target_id);
+        DROP INDEX IF EXISTS idx_report_daily_stats_date;
+        DROP INDEX IF EXISTS idx_missing_reports_date
+        '''):
+            conn.execute(text(statement))
+        
+        # Deleted tasks are kept with deleted_at set. Task queries only read
+        # live rows, so the task indexes leave deleted ones out: they stay as
+        # small as before and match every query that filters deleted_at IS NULL.
+        # idx_tasks_open_due covers open tasks with a due date across
+        # organizations, for the reminder worker; idx_tasks_org_completed
+        # completion times, for turnaround analytics.
+        for statement in split_statements('''
+        CREATE INDEX IF NOT EXISTS idx_tasks_live_employee_due ON tasks (employee_id, due_date) WHERE deleted_at IS NULL;
+        CREATE INDEX IF NOT EXISTS idx_tasks_live_employee_created ON tasks (employee_id, created_at) WHERE deleted_at IS NULL;
+        CREATE INDEX IF NOT EXISTS idx_tasks_live_org_due ON tasks (org_id, due_date) WHERE deleted_at IS NULL;
+        CREATE INDEX IF NOT EXISTS idx_tasks_open_due ON tasks (due_date)
+            WHERE is_completed = FALSE AND due_date IS NOT NULL AND deleted_at IS NULL;
+        CREATE INDEX IF NOT EXISTS idx_tasks_org_completed ON tasks (org_id, completed_at)
+            WHERE completed_at IS NOT NULL AND deleted_at IS NULL;
+        DROP INDEX IF EXISTS idx_tasks_employee_due;
+        DROP INDEX IF EXISTS idx_tasks_employee_created;
+        DROP INDEX IF EXISTS idx_tasks_org_due;
+        DROP INDEX IF EXISTS idx_tasks_pending_due
+        '''):
+            conn.execute(text(statement))
+        db.make_append_only(conn, 'audit_events')
+        
+        # One report per employee and day. Duplicates left by the old
+        # check-then-insert path are collapsed before the unique index is built.
+        if not db.index_exists(conn, 'uq_daily_reports_employee_date'):
+            conn.execute(text('''
+            DELETE FROM daily_reports
+            WHERE id NOT IN (SELECT MAX(id) FROM daily_reports GROUP BY employee_id, report_date)
+            '''))
+            conn.execute(text('CREATE UNIQUE INDEX uq_daily_reports_employee_date ON daily_reports (employee_id, report_date)'))
+            conn.execute(text('DROP INDEX IF EXISTS idx_daily_reports_employee_date'))
+        
+        report_storage.setup(conn)
         conn.commit()
 
+# Report storage tiers, both off by default:
+# [database] partitioning = "monthly" or "yearly" (DAILY_REPORTS_PARTITIONING)
+# partitions daily_reports by report_date on Postgres;
+# [database] archive_dir (REPORT_ARCHIVE_DIR) moves reports older than
+# archive_after_months (REPORT_ARCHIVE_AFTER_MONTHS, default 24) to Parquet files.
+@st.cache_resource
+def get_report_storage():
+    return ReportStorage(
+        init_connection(),
+        partitioning=get_setting("database", "partitioning", env="DAILY_REPORTS_PARTITIONING"),
+        archive_dir=get_setting("database", "archive_dir", env="REPORT_ARCHIVE_DIR"),
+        archive_after_months=get_setting("database", "archive_after_months", env="REPORT_ARCHIVE_AFTER_MONTHS") or 24,
+    )
+
+# Create upcoming partitions and archive old periods, at most once a day per process.
+# Archive files are published once their rows are gone from the database; files
+# staged by a run that failed are sorted out by the next one.
+@st.cache_resource(ttl=86400, show_spinner=False)
+def maintain_report_storage():
+    with engine.connect() as conn:
+        archived = report_storage.maintain(conn)
+        if archived:
+            changes.notify(conn, "reports")
+        conn.commit()
+    report_storage.publish(archived)
+    return archived
+
+# Daily rollups for the analytics page
+# Each (employee, date) row is recomputed from the base tables whenever a write
+# touches that date, so the rollup stays exact without rescanning history.
+# Reports of archived periods are no longer in daily_reports, so their counts
+# are kept as they were when the period was archived.
+REFRESH_DAILY_STATS_SQL = '''
+INSERT INTO report_daily_stats (org_id, employee_id, stat_date, reports_submitted, tasks_created, tasks_due, tasks_completed, updated_at)
+SELECT :org_id, :employee_id, :stat_date,
+    CASE WHEN :archived
+        THEN COALESCE((SELECT reports_submitted FROM report_daily_stats WHERE employee_id = :employee_id AND stat_date = :stat_date), 0)
+        ELSE (SELECT COUNT(*) FROM daily_reports WHERE employee_id = :employee_id AND report_date = :stat_date)
+    END,
+    (SELECT COUNT(*) FROM tasks WHERE employee_id = :employee_id AND created_at >= :stat_date AND created_at < :next_date AND deleted_at IS NULL),
+    (SELECT COUNT(*) FROM tasks WHERE employee_id = :employee_id AND due_date = :stat_date AND deleted_at IS NULL),
+    (SELECT COUNT(*) FROM tasks WHERE employee_id = :employee_id AND due_date = :stat_date AND is_completed = TRUE AND deleted_at IS NULL),
+    CURRENT_TIMESTAMP
+ON CONFLICT (employee_id, stat_date) DO UPDATE SET
+    reports_submitted = EXCLUDED.reports_submitted,
+    tasks_created = EXCLUDED.tasks_created,
+    tasks_due = EXCLUDED.tasks_due,
+    tasks_completed = EXCLUDED.tasks_completed,
+    updated_at = EXCLUDED.updated_at
+'''
+
+def refresh_daily_stats(conn, employee_id, dates):
+    stat_dates = set()
+    for d in dates:
+        if isinstance(d, datetime.datetime):
+            d = d.date()
+        if d is not None:
+            stat_dates.add(d)
+    
+    if employee_id is None or not stat_dates:
+        return
+    
+    conn = tenancy.scoped(conn, tenancy.employee_org(conn, employee_id))
+    live_from = report_storage.live_from()
+    conn.execute(text(REFRESH_DAILY_STATS_SQL), [
+        {'employee_id': employee_id, 'stat_date': d, 'next_date': d + datetime.timedelta(days=1),
+         'archived': live_from is not None and d < live_from}
+        for d in sorted(stat_dates)
+    ])
+
+# Full rebuild of one organization, or of every organization when org_id is
+# None; used to backfill the rollup and as a periodic consistency job. Rows of
+# archived periods cannot be recomputed from daily_reports and are kept.
+def rebuild_daily_stats(conn, org_id=None):
+    live_from = report_storage.live_from() or datetime.date.min
+    org_filter = 'AND stat_date >= :live_from' + ('' if org_id is None else ' AND e.org_id = :org_id')
+    conn.execute(text('DELETE FROM report_daily_stats WHERE stat_date >= :live_from' + ('' if org_id is None else ' AND org_id = :org_id')),
+                 {'org_id': org_id, 'live_from': live_from})
+    conn.execute(text(f'''
+    INSERT INTO report_daily_stats (org_id, employee_id, stat_date, reports_submitted, tasks_created, tasks_due, tasks_completed)
+    SELECT e.org_id, activity.employee_id, stat_date, SUM(reports_submitted), SUM(tasks_created), SUM(tasks_due), SUM(tasks_completed)
+    FROM (
+        SELECT employee_id, report_date AS stat_date, 1 AS reports_submitted, 0 AS tasks_created, 0 AS tasks_due, 0 AS tasks_completed
+        FROM daily_reports
+        UNION ALL
+        SELECT employee_id, {db.to_date('created_at')}, 0, 1, 0, 0
+        FROM tasks
+        WHERE deleted_at IS NULL
+        UNION ALL
+        SELECT employee_id, due_date, 0, 0, 1, CASE WHEN is_completed THEN 1 ELSE 0 END
+        FROM tasks
+        WHERE due_date IS NOT NULL AND deleted_at IS NULL
+    ) activity
+    JOIN employees e ON e.id = activity.employee_id
+    WHERE stat_date IS NOT NULL {org_filter}
+    GROUP BY e.org_id, activity.employee_id, stat_date
+    '''), {'org_id': org_id, 'live_from': live_from})
+
+# Missing-report summary for the compliance view
+# missing_reports holds one row per active employee and working day without a
+# report. Each working day is materialized once with an anti-join and listed in
+# compliance_days; report writes then add or remove single rows. Days before an
+# employee was added are not counted.
+COMPLIANCE_WINDOW_DAYS = 365
+COMPLIANCE_WEEKDAYS = (0, 1, 2, 3, 4)  # Monday to Friday
+
+def is_compliance_day(day):
+    return day.weekday() in COMPLIANCE_WEEKDAYS
+
+def sync_missing_reports(conn, today=None):
+    today = today or datetime.date.today()
+    window_start = today - datetime.timedelta(days=COMPLIANCE_WINDOW_DAYS)
+    
+    result = conn.execute(text('SELECT report_date FROM compliance_days WHERE report_date >= :start_date'),
+                          {'start_date': window_start})
+    materialized = {row[0] for row in result.fetchall()}
+    pending_days = [
+        window_start + datetime.timedelta(days=i)
+        for i in range(COMPLIANCE_WINDOW_DAYS + 1)
+        if is_compliance_day(window_start + datetime.timedelta(days=i))
+        and window_start + datetime.timedelta(days=i) not in materialized
+    ]
+    if not pending_days:
+        return 0
+    
+    params = [{'report_date': day} for day in pending_days]
+    conn.execute(text(f'''
+    INSERT INTO missing_reports (org_id, employee_id, report_date)
+    SELECT e.org_id, e.id, :report_date
+    FROM employees e
+    WHERE e.is_active = TRUE AND e.is_admin = FALSE
+    AND (e.created_at IS NULL OR {db.to_date('e.created_at')} <= :report_date)
+    AND NOT EXISTS (
+        SELECT 1 FROM daily_reports dr
+        WHERE dr.employee_id = e.id AND dr.report_date = :report_date
+    )
+    ON CONFLICT DO NOTHING
+    '''), params)
+    conn.execute(text('INSERT INTO compliance_days (report_date) VALUES (:report_date) ON CONFLICT DO NOTHING'), params)
+    return len(pending_days)
+
+def refresh_missing_reports(conn, employee_id, dates):
+    params = [{'employee_id': employee_id, 'report_date': d} for d in set(dates) if d is not None]
+    if employee_id is None or not params:
+        return
+    
+    conn = tenancy.scoped(conn, tenancy.employee_org(conn, employee_id))
+    conn.execute(text('DELETE FROM missing_reports WHERE org_id = :org_id AND employee_id = :employee_id AND report_date = :report_date'), params)
+    conn.execute(text(f'''
+    INSERT INTO missing_reports (org_id, employee_id, report_date)
+    SELECT e.org_id, e.id, cd.report_date
+    FROM employees e
+    JOIN compliance_days cd ON cd.report_date = :report_date
+    WHERE e.org_id = :org_id AND e.id = :employee_id AND e.is_active = TRUE AND e.is_admin = FALSE
+    AND (e.created_at IS NULL OR {db.to_date('e.created_at')} <= cd.report_date)
+    AND NOT EXISTS (
+        SELECT 1 FROM daily_reports dr
+        WHERE dr.employee_id = e.id AND dr.report_date = cd.report_date
+    )
+    '''), params)
+
+# Every write calls one of these inside its transaction. They keep the summary
+# tables in sync and publish a change notification that is delivered on commit.
+def record_report_change(conn, employee_id, dates):
+    refresh_daily_stats(conn, employee_id, dates)
+    refresh_missing_reports(conn, employee_id, dates)
+    changes.notify(conn, "reports", key=employee_id, org=tenancy.employee_org(conn, employee_id))
+
+def record_task_change(conn, employee_id, dates):
+    refresh_daily_stats(conn, employee_id, dates)
+    changes.notify(conn, "tasks", key=employee_id, org=tenancy.employee_org(conn, employee_id) if employee_id else None)
+
+def record_employee_change(conn, employee_id):
+    changes.notify(conn, "employees", key=employee_id, org=tenancy.employee_org(conn, employee_id))
+
+# Insert or replace the employee's report for a day in a single statement; returns the report id
+def upsert_report(conn, employee_id, report_date, report_text):
+    report_storage.prepare_write(conn, report_date)
+    conn = tenancy.scoped(conn, tenancy.employee_org(conn, employee_id))
+    result = conn.execute(text('''
+    INSERT INTO daily_reports (org_id, employee_id, report_date, report_text)
+    VALUES (:org_id, :employee_id, :report_date, :report_text)
+    ON CONFLICT (employee_id, report_date) DO UPDATE
+    SET report_text = EXCLUDED.report_text, created_at = CURRENT_TIMESTAMP
+    RETURNING id
+    '''), {
+        'employee_id': employee_id,
+        'report_date': report_date,
+        'report_text': report_text
+    })
+    report_id = result.scalar()
+    record_report_change(conn, employee_id, [report_date])
+    return report_id
+
+# Task writes shared by the admin and employee pages and the API; they keep the rollup in sync
+def get_task_stat_key(conn, task_id):
+    result = conn.execute(text('SELECT employee_id, due_date, created_at FROM tasks WHERE id = :id AND org_id = :org_id'), {'id': task_id})
+    task = result.fetchone()
+    if not task:
+        return None, []
+    return task[0], [task[1], task[2]]
+
+def create_task(conn, org_id, employee_id, task_description, due_date):
+    conn = tenancy.scoped(conn, org_id)
+    result = conn.execute(text('''
+    INSERT INTO tasks (org_id, employee_id, task_description, due_date, is_completed)
+    VALUES (:org_id, :employee_id, :task_description, :due_date, FALSE)
+    RETURNING id
+    '''), {
+        'employee_id': employee_id,
+        'task_description': task_description,
+        'due_date': due_date
+    })
+    task_id = result.scalar()
+    record_task_change(conn, *get_task_stat_key(conn, task_id))
+    return task_id
+
+# Completing keeps the first completion time and reopening records when it
+# happened, so replaying the write changes nothing
+def update_task_completion(conn, task_id, is_completed, org_id):
+    conn = tenancy.scoped(conn, org_id)
+    result = conn.execute(text('''
+    UPDATE tasks SET
+        completed_at = CASE WHEN :is_completed THEN COALESCE(completed_at, CURRENT_TIMESTAMP) ELSE NULL END,
+        reopened_at = CASE WHEN is_completed AND NOT :is_completed THEN CURRENT_TIMESTAMP ELSE reopened_at END,
+        is_completed = :is_completed
+    WHERE id = :id AND org_id = :org_id AND deleted_at IS NULL
+    '''), {'id': task_id, 'is_completed': is_completed})
+    if result.rowcount:
+        record_task_change(conn, *get_task_stat_key(conn, task_id))
+        if not is_completed:
+            changes.notify(conn, "task_reopens", org=org_id)
+    return result.rowcount > 0
+
+# Task completion goes through the write-behind queue. Waiting briefly keeps the
+# rerun consistent when the database is healthy without blocking during an outage.
+def set_task_completed(task_id, is_completed):
+    org_id = current_org()
+    ticket = get_write_queue().submit(
+        "task_completion",
+        {'task_id': task_id, 'is_completed': is_completed, 'org_id': org_id},
+        owner=st.session_state.user["id"]
+    )
+    # Recorded once the write lands, from the write-behind thread
+    audit_log, actor = get_audit_log(), session_actor()
+    action = "task.complete" if is_completed else "task.reopen"
+    
+    def task_written(ticket):
+        if ticket.status == "done":
+            audit_log.record(org_id, *actor, action, "task", task_id)
+    ticket.add_done_callback(task_written)
+    ticket.wait(WRITE_WAIT_SECONDS)
+    return ticket
+
+def delete_task(task_id):
+    with org_connection() as conn:
+        employee_id, stat_dates = get_task_stat_key(conn, task_id)
+        # Soft delete: the row stays for history and leaves every task query and index
+        result = conn.execute(text('''
+        UPDATE tasks SET deleted_at = CURRENT_TIMESTAMP
+        WHERE id = :id AND org_id = :org_id AND deleted_at IS NULL
+        RETURNING task_description
+        '''), {'id': task_id})
+        deleted = result.fetchone()
+        if deleted:
+            record_task_change(conn, employee_id, stat_dates)
+        conn.commit()
+    if deleted:
+        audit("task.delete", "task", task_id, employee_id=employee_id, task_description=deleted[0])
+
+# Employee directory
+# Filters, counts and the employee list all read one process-wide copy of an
+# organization's employees, shared by every session of that organization. It is
+# keyed on the organization's "employees" change version, so adding, renaming,
+# activating or deactivating an employee in any session or process loads a
+# fresh copy on the next read.
+EMPLOYEE_DIRECTORY_TTL = 3600
+
+def load_employee_directory():
+    org_id = current_org()
+    metrics.cache_lookups.inc(cache="employee_directory")
+    return fetch_employee_directory(org_id, changes.org_versions(org_id, "employees"))
+
+@st.cache_data(ttl=EMPLOYEE_DIRECTORY_TTL, max_entries=256, show_spinner=False)
+def fetch_employee_directory(org_id, version):
+    metrics.cache_misses.inc(cache="employee_directory")
+    with tenancy.connect(read_engine(org_id), org_id) as conn:
+        result = conn.execute(text('''
+        SELECT id, username, full_name, profile_pic_url, is_active, is_admin
+        FROM employees
+        WHERE org_id = :org_id
+        ORDER BY full_name
+        '''))
+        return [tuple(row) for row in result.fetchall()]
+
+# (id, full_name) of active employees, ordered by name; admins do not report
+def get_active_employees():
+    return [(emp[0], emp[2]) for emp in load_employee_directory() if emp[4] and not emp[5]]
+
+# Task list helpers
+TASKS_PAGE_SIZE = 50
+
+def format_due_date(due_date):
+    return due_date.strftime('%d %b, %Y') if due_date else "No due date"
+
+# Actions for a rendered task list: one task picker and the buttons that apply
+# to it, instead of a row of buttons under every task.
+# options maps task_id -> (label, is_completed)
+def task_action_controls(options, key_prefix, allow_reopen=False, allow_delete=False):
+    if not options:
+        return
+    
+    task_id = st.selectbox("Task", list(options), format_func=lambda t: options[t][0], key=f"{key_prefix}_task")
+    is_completed = options[task_id][1]
+    
+    columns = st.columns(2 if allow_delete else 1)
+    with columns[0]:
+        if not is_completed:
+            if st.button("Mark as Completed", key=f"{key_prefix}_complete"):
+                set_task_completed(task_id, True)
+                st.success("Task marked as completed")
+                st.rerun()
+        elif allow_reopen:
+            if st.button("Reopen Task", key=f"{key_prefix}_reopen"):
+                set_task_completed(task_id, False)
+                st.success("Task reopened")
+                st.rerun()
+    
+    if allow_delete:
+        with columns[1]:
+            if st.button("Delete Task", key=f"{key_prefix}_delete"):
+                delete_task(task_id)
+                st.success("Task deleted")
+                st.rerun()
+
+# Task list component
+# Shared by Manage Tasks, My Tasks and the employee overview. Each render runs
+# one task query for the given filters, draws the rows as HTML blocks and adds
+# a single set of action controls under key_prefix.
+# The API pages through tasks newest first with before_id as the cursor.
+def fetch_tasks(employee_id=None, employee_name=None, status="All Tasks", limit=None,
+                org_id=None, before_id=None, newest_first=False):
+    query = '''
+    SELECT t.id, e.full_name, t.task_description, t.due_date, t.is_completed, t.created_at, e.id as employee_id
+    FROM tasks t
+    JOIN employees e ON t.employee_id = e.id
+    WHERE t.org_id = :org_id AND t.deleted_at IS NULL
+    '''
+    
+    org_id = org_id or current_org()
+    params = {}
+    
+    if employee_id is not None:
+        query += ' AND t.employee_id = :employee_id'
+        params['employee_id'] = employee_id
+    
+    if before_id is not None:
+        query += ' AND t.id < :before_id'
+        params['before_id'] = before_id
+    
+    if employee_name:
+        query += ' AND e.full_name = :employee_name'
+        params['employee_name'] = employee_name
+    
+    if status == "Pending":
+        query += ' AND t.is_completed = FALSE'
+    elif status == "Completed":
+        query += ' AND t.is_completed = TRUE'
+    
+    if newest_first:
+        query += ' ORDER BY t.id DESC'
+    else:
+        query += ' ORDER BY t.due_date ASC NULLS LAST, t.created_at DESC'
+    
+    if limit:
+        query += ' LIMIT :limit'
+        params['limit'] = limit
+    
+    with tenancy.connect(read_engine(org_id), org_id) as conn:
+        result = conn.execute(text(query), params)
+        return result.fetchall()
+
+def task_html(task, show_employee=False, footer=None, preview_limit=None):
+    if show_employee:
+        header = f"{rendering.strong(task[1])} - Due: {format_due_date(task[3])}"
+    else:
+        header = rendering.strong(f"Due: {format_due_date(task[3])}")
+    
+    if footer == "status":
+        footer_html = rendering.task_status_footer(task[5].strftime('%d %b, %Y'), task[4])
+    elif footer == "created":
+        footer_html = rendering.task_created_footer(task[5].strftime('%d %b, %Y'))
+    else:
+        footer_html = ""
+    
+    return rendering.task_item(header, task[2], footer=footer_html, completed=task[4], limit=preview_limit)
+
+def task_view(key_prefix, employee_id=None, employee_name=None, status="All Tasks", limit=None,
+              show_employee=False, group_by_status=False, footer=None, preview_limit=None,
+              allow_reopen=False, allow_delete=False, empty_message="No tasks found"):
+    tasks = fetch_tasks(employee_id, employee_name, status, limit)
+    
+    if not tasks:
+        st.info(empty_message)
+        return tasks
+    
+    if not limit:
+        st.write(f"Found {len(tasks)} tasks")
+    
+    # Paginate so a long list stays one small element
+    page_count = (len(tasks) + TASKS_PAGE_SIZE - 1) // TASKS_PAGE_SIZE
+    page = 1
+    if page_count > 1:
+        page = st.selectbox("Page", range(1, page_count + 1), format_func=lambda p: f"Page {p} of {page_count}", key=f"{key_prefix}_page")
+    page_tasks = tasks[(page - 1) * TASKS_PAGE_SIZE:page * TASKS_PAGE_SIZE]
+    
+    if group_by_status:
+        # Pending tasks first, then completed
+        groups = [
+            ("Pending Tasks", [task for task in page_tasks if not task[4]]),
+            ("Completed Tasks", [task for task in page_tasks if task[4]]),
+        ]
+    else:
+        groups = [(None, page_tasks)]
+    
+    for title, group_tasks in groups:
+        if not group_tasks:
+            continue
+        if title:
+            st.markdown(f'<h3 class="sub-header">{title}</h3>', unsafe_allow_html=True)
+        st.markdown(rendering.join(
+            task_html(task, show_employee, footer, preview_limit) for task in group_tasks
+        ), unsafe_allow_html=True)
+    
+    if show_employee:
+        options = {task[0]: (f"{task[1]} - {format_due_date(task[3])} - {task[2][:60]}", task[4]) for task in page_tasks}
+    else:
+        options = {task[0]: (f"{format_due_date(task[3])} - {task[2][:60]}", task[4]) for task in page_tasks}
+    if not allow_reopen:
+        options = {task_id: option for task_id, option in options.items() if not option[1]}
+    task_action_controls(options, key_prefix, allow_reopen=allow_reopen, allow_delete=allow_delete)
+    return tasks
+
+# Change notifications between sessions, and between processes on Postgres
+@st.cache_resource
+def get_change_bus():
+    return create_change_bus(init_connection())
+
+# Read replicas
+# DATABASE_REPLICA_URLS (comma-separated) or [database] replica_urls lists
+# replicas for the read-heavy pages: report browsing, My Reports, task lists,
+# the employee directory, analytics and the dashboards. Without replicas every
+# read uses the primary. Writes are credited to the logged-in user so their
+# next reads see them, and changes to their organization so the caches it
+# fills do.
+def current_owner():
+    if get_script_run_ctx() is None:
+        return None
+    user = st.session_state.get('user')
+    return user['id'] if user else None
+
+@st.cache_resource
+def get_replica_set():
+    urls = os.environ.get("DATABASE_REPLICA_URLS") or get_setting("database", "replica_urls") or []
+    if isinstance(urls, str):
+        urls = [url.strip() for url in urls.split(',') if url.strip()]
+    replicas = [create_backend(url) for url in urls]
+    for i, replica in enumerate(replicas, 1):
+        metrics.track_pool(f"replica_{i}", replica.engine)
+    replica_set = ReplicaSet(init_connection(), replicas, owner=current_owner)
+    get_change_bus().subscribe(replica_set.record_change)
+    return replica_set
+
+def read_engine(org_id):
+    return get_replica_set().read_engine(current_owner(), org_id)
+
+# Readers that run a page's independent read queries concurrently, one for the
+# primary and one for each replica
+@st.cache_resource
+def get_readers():
+    replica_set = get_replica_set()
+    readers = {}
+    for i, backend in enumerate([replica_set.primary] + replica_set.replicas):
+        reader = readers[backend] = create_reader(backend)
+        if reader.engine is not backend.engine:
+            metrics.track_pool(f"async_reads_replica_{i}" if i else "async_reads", reader.engine)
+    return readers
+
+# The reader for the database read_engine would pick
+def get_reader(org_id):
+    return get_readers()[get_replica_set().read_backend(current_owner(), org_id)]
+
+# Write-behind queue shared by every session in this process
+WRITE_WAIT_SECONDS = 2
+
+@st.cache_resource
+def get_write_queue():
+    replica_set = get_replica_set()
+    
+    def record_writes(tickets):
+        for ticket in tickets:
+            replica_set.record_write(ticket.owner)
+    
+    return WriteBehindQueue(init_connection().engine, {
+        "report": upsert_report,
+        "task_completion": update_task_completion,
+    }, on_commit=record_writes)
+
+# Audit log of changes, written in batches by its own background thread
+@st.cache_resource
+def get_audit_log():
+    return AuditLog(init_connection().engine)
+
+# Records a change by the logged-in user in the session's organization
+def audit(action, target_type=None, target_id=None, **details):
+    get_audit_log().record(current_org(), *session_actor(), action, target_type, target_id, details)
+
+# (actor_id, actor) for audit events; the platform admin has no employee row
+def session_actor():
+    user = st.session_state.user
+    return user["id"] or None, user["username"]
+
+# Report drafts, keyed by (employee_id, report_date). They live in the server
+# process rather than the session, so a dropped connection or a page reload
+# does not lose text. A draft is cleared once its report has been written.
+@st.cache_resource
+def get_draft_store():
+    return {}
+
+def describe_write(ticket):
+    if ticket.kind == "report":
+        return f"Your report for {ticket.params['report_date'].strftime('%d %b, %Y')}"
+    action = "Completing" if ticket.params['is_completed'] else "Reopening"
+    return f"{action} task #{ticket.params['task_id']}"
+
+# Pending writes, and writes the database rejected until the user dismisses them
+def display_sync_status(owner):
+    write_queue = get_write_queue()
+    pending = write_queue.pending(owner)
+    if pending:
+        message = f"{len(pending)} change{'s' if len(pending) != 1 else ''} waiting to sync with the database."
+        if write_queue.last_error:
+            message += " The database is currently unavailable; your changes are kept and will be retried automatically."
+        st.warning(message)
+    
+    failed = write_queue.failed(owner)
+    if failed:
+        for ticket in failed:
+            st.error(f"{describe_write(ticket)} was not saved: {ticket.error}")
+        if st.button("Dismiss", key="dismiss_failed_writes"):
+            write_queue.dismiss_failed(owner, failed)
+            st.rerun()
+
+# Session memory
+# Session state stays in the server process for as long as a browser tab is
+# open. A monitor measures every session each minute and drops per-session
+# caches that can be rebuilt from the database from sessions left idle, or
+# once they grow large; sessions idle for longer are logged out. Sizes are
+# shown to the platform admin on the Organizations page.
+EVICTABLE_SESSION_KEYS = ("my_reports_cache", "admin_overview", "edit_report")
+
+@st.cache_resource
+def get_session_monitor():
+    idle_evict_minutes = float(get_setting("sessions", "idle_evict_minutes", env="SESSION_IDLE_EVICT_MINUTES") or 30)
+    idle_logout_minutes = float(get_setting("sessions", "idle_logout_minutes", env="SESSION_IDLE_LOGOUT_MINUTES") or 480)
+    large_entry_mb = float(get_setting("sessions", "large_entry_mb", env="SESSION_LARGE_ENTRY_MB") or 5)
+    return session_memory.SessionMonitor(
+        EVICTABLE_SESSION_KEYS,
+        idle_evict_seconds=idle_evict_minutes * 60,
+        idle_logout_seconds=idle_logout_minutes * 60,
+        large_entry_bytes=int(large_entry_mb * 1024 * 1024),
+    )
+
+def display_session_memory():
+    st.markdown('<h3>Server Sessions</h3>', unsafe_allow_html=True)
+    monitor = get_session_monitor()
+    sessions = monitor.snapshot()
+    st.caption(
+        f"{len(sessions)} sessions, {sum(s['bytes'] for s in sessions) / 1e6:.1f} MB of session state as of the last check. "
+        f"{monitor.evicted_entries} cached entries dropped and {monitor.logged_out_sessions} idle sessions logged out since the server started."
+    )
+    if sessions:
+        st.dataframe(pd.DataFrame([{
+            "User": s["user"] or "-",
+            "Connected": s["connected"],
+            "Idle (min)": s["idle_seconds"] // 60,
+            "State (KB)": round(s["bytes"] / 1024, 1),
+            "Entries": s["entries"],
+            "Widgets": s["widgets"],
+            "Largest Entry": s["largest_entry"] or "-",
+            "Largest (KB)": round(s["largest_bytes"] / 1024, 1),
+        } for s in sessions]), hide_index=True, use_container_width=True)
+
 # Admin authentication is handled directly through Streamlit secrets
 # No need to store admin credentials in the database
 
 # Authentication function
 def authenticate(username, password):
-    # Check if admin credentials are properly set in Streamlit secrets
-    if "admin_username" not in st.secrets or "admin_password" not in st.secrets:
-        st.warning("Admin credentials are not properly configured in Streamlit secrets. Please set admin_username and admin_password in .streamlit/secrets.toml")
-        return None
+    # The admin in Streamlit secrets is the platform admin: it can create
+    # organizations and act as the admin of any of them
+    admin_username = get_setting("admin_username", env="ADMIN_USERNAME")
+    admin_password = get_setting("admin_password", env="ADMIN_PASSWORD")
     
-    # Check if credentials match admin in Streamlit secrets
-    admin_username = st.secrets["admin_username"]
-    admin_password = st.secrets["admin_password"]
-    
-    if username == admin_username and password == admin_password:
+    if admin_username and admin_password and username == admin_username and password == admin_password:
         return {
             "id": 0,  # Special ID for admin
             "username": username, 
             "full_name": "Administrator", 
             "is_admin": True, 
+            "is_platform_admin": True,
+            "org_id": DEFAULT_ORG_ID,
             "profile_pic_url": "https://www.gravatar.com/avatar/00000000000000000000000000000000?d=mp&f=y"
         }
     
-    # If not admin, check employee credentials in database
+    # Otherwise check employee and organization admin credentials in the database
     with engine.connect() as conn:
         result = conn.execute(text('''
-        SELECT id, username, full_name, profile_pic_url
+        SELECT id, username, full_name, profile_pic_url, org_id, is_admin
         FROM employees
         WHERE username = :username AND password = :password AND is_active = TRUE
         '''), {'username': username, 'password': password})
         user = result.fetchone()
     
     if user:
-        return {"id": user[0], "username": user[1], "full_name": user[2], "is_admin": False, "profile_pic_url": user[3]}
+        return {
+            "id": user[0],
+            "username": user[1],
+            "full_name": user[2],
+            "is_admin": bool(user[5]),
+            "org_id": user[4],
+            "profile_pic_url": user[3]
+        }
     return None
 
 # Login form
@@ -256,11 +1063,20 @@ def admin_dashboard():
         ''', unsafe_allow_html=True)
         st.markdown('</div>', unsafe_allow_html=True)
     
+    is_platform_admin = st.session_state.user.get("is_platform_admin", False)
+    if is_platform_admin:
+        select_organization()
+    
     # Navigation
+    options = ["Dashboard", "Employees", "Reports", "Tasks", "Analytics", "API Keys", "Audit Log", "Logout"]
+    icons = ["house", "people", "clipboard-data", "list-task", "bar-chart", "key", "journal-text", "box-arrow-right"]
+    if is_platform_admin:
+        options.insert(-1, "Organizations")
+        icons.insert(-1, "building")
     selected = option_menu(
         menu_title=None,
-        options=["Dashboard", "Employees", "Reports", "Tasks", "Logout"],
-        icons=["house", "people", "clipboard-data", "list-task", "box-arrow-right"],
+        options=options,
+        icons=icons,
         menu_icon="cast",
         default_index=0,
         orientation="horizontal",
@@ -272,6 +1088,9 @@ def admin_dashboard():
         }
     )
     
+    metrics.set_page(f"admin/{selected}")
+    display_sync_status(st.session_state.user["id"])
+    
     if selected == "Dashboard":
         display_admin_dashboard()
     elif selected == "Employees":
@@ -280,107 +1099,402 @@ def admin_dashboard():
         view_all_reports()
     elif selected == "Tasks":
         manage_tasks()
+    elif selected == "Analytics":
+        view_analytics()
+    elif selected == "API Keys":
+        manage_api_keys()
+    elif selected == "Audit Log":
+        view_audit_log()
+    elif selected == "Organizations":
+        manage_organizations()
     elif selected == "Logout":
         logout()
 
-# Admin Dashboard Overview
-def display_admin_dashboard():
-    st.markdown('<h2 class="sub-header">Overview</h2>', unsafe_allow_html=True)
-    
-    # Statistics
+# Organizations, for the platform admin
+def load_organizations():
     with engine.connect() as conn:
-        # Total employees
-        result = conn.execute(text('SELECT COUNT(*) FROM employees WHERE is_active = TRUE AND id != 1'))
-        total_employees = result.fetchone()[0]
-        
-        # Total reports
-        result = conn.execute(text('SELECT COUNT(*) FROM daily_reports'))
-        total_reports = result.fetchone()[0]
-        
-        # Total tasks
-        result = conn.execute(text('SELECT COUNT(*) FROM tasks'))
-        total_tasks = result.fetchone()[0]
-        
-        # Completed tasks
-        result = conn.execute(text('SELECT COUNT(*) FROM tasks WHERE is_completed = TRUE'))
-        completed_tasks = result.fetchone()[0]
-        
-        # Recent reports
-        result = conn.execute(text('''
-        SELECT e.full_name, dr.report_date, dr.report_text 
-        FROM daily_reports dr 
-        JOIN employees e ON dr.employee_id = e.id 
-        ORDER BY dr.created_at DESC 
-        LIMIT 5
-        '''))
-        recent_reports = result.fetchall()
+        result = conn.execute(text('SELECT id, name FROM organizations ORDER BY name'))
+        return result.fetchall()
+
+# The platform admin picks the organization the admin pages act on
+def select_organization():
+    organizations = {org[0]: org[1] for org in load_organizations()}
+    org_id = st.sidebar.selectbox(
+        "Organization",
+        list(organizations),
+        index=list(organizations).index(current_org()) if current_org() in organizations else 0,
+        format_func=lambda org: organizations[org],
+        key="platform_org"
+    )
+    st.session_state.user["org_id"] = org_id
+
+def manage_organizations():
+    st.markdown('<h2 class="sub-header">Organizations</h2>', unsafe_allow_html=True)
+    
+    organizations = load_organizations()
+    st.dataframe(pd.DataFrame(organizations, columns=["ID", "Name"]), hide_index=True, use_container_width=True)
+    
+    # A new organization starts with one admin account, who then adds its employees
+    with st.form("add_organization_form"):
+        name = st.text_input("Organization Name")
+        admin_username = st.text_input("Admin Username")
+        admin_password = st.text_input("Admin Password", type="password")
+        admin_full_name = st.text_input("Admin Full Name")
         
-        # Pending tasks
+        submitted = st.form_submit_button("Add Organization")
+        if submitted:
+            if not name or not admin_username or not admin_password or not admin_full_name:
+                st.error("Please fill all required fields")
+            else:
+                try:
+                    with engine.connect() as conn:
+                        org_id = conn.execute(text('INSERT INTO organizations (name) VALUES (:name) RETURNING id'), {'name': name}).scalar()
+                        conn = tenancy.scoped(conn, org_id)
+                        admin_id = conn.execute(text('''
+                        INSERT INTO employees (org_id, username, password, full_name, profile_pic_url, is_active, is_admin, created_at)
+                        VALUES (:org_id, :username, :password, :full_name, :profile_pic_url, TRUE, TRUE, CURRENT_TIMESTAMP)
+                        RETURNING id
+                        '''), {
+                            'username': admin_username,
+                            'password': admin_password,
+                            'full_name': admin_full_name,
+                            'profile_pic_url': "https://www.gravatar.com/avatar/00000000000000000000000000000000?d=mp&f=y"
+                        }).scalar()
+                        record_employee_change(conn, admin_id)
+                        conn.commit()
+                    get_audit_log().record(org_id, *session_actor(), "organization.create", "organization", org_id,
+                                           {'name': name, 'admin_username': admin_username})
+                    st.success(f"Added organization {name} with admin {admin_username}")
+                except IntegrityError:
+                    st.error("An organization with that name or a user with that username already exists")
+    
+    display_session_memory()
+
+# API keys
+# Each key belongs to one organization, and API requests made with it only
+# see that organization's data. Only a hash is stored; the key itself is shown
+# once, when it is created.
+def hash_api_key(key):
+    return hashlib.sha256(key.encode()).hexdigest()
+
+def create_api_key(conn, name):
+    key = "ems_" + secrets.token_urlsafe(32)
+    conn.execute(text('INSERT INTO api_keys (org_id, name, key_hash) VALUES (:org_id, :name, :key_hash)'),
+                 {'name': name, 'key_hash': hash_api_key(key)})
+    return key
+
+def manage_api_keys():
+    st.markdown('<h2 class="sub-header">API Keys</h2>', unsafe_allow_html=True)
+    
+    new_key = st.session_state.pop("new_api_key", None)
+    if new_key:
+        st.success("API key created. Copy it now; it will not be shown again.")
+        st.code(new_key, language=None)
+    
+    with org_connection() as conn:
         result = conn.execute(text('''
-        SELECT e.full_name, t.task_description, t.due_date 
-        FROM tasks t 
-        JOIN employees e ON t.employee_id = e.id 
-        WHERE t.is_completed = FALSE
-        ORDER BY t.due_date ASC 
-        LIMIT 5
+        SELECT id, name, created_at FROM api_keys
+        WHERE org_id = :org_id AND revoked_at IS NULL
+        ORDER BY created_at
         '''))
-        pending_tasks = result.fetchall()
+        keys = result.fetchall()
     
-    # Display statistics
-    col1, col2, col3, col4 = st.columns(4)
+    if not keys:
+        st.info("No API keys yet")
+    for key in keys:
+        col1, col2 = st.columns([4, 1])
+        with col1:
+            st.write(f"**{key[1]}** - created {key[2].strftime('%d %b, %Y')}")
+        with col2:
+            if st.button("Revoke", key=f"revoke_api_key_{key[0]}"):
+                with org_connection() as conn:
+                    conn.execute(text('''
+                    UPDATE api_keys SET revoked_at = CURRENT_TIMESTAMP
+                    WHERE id = :id AND org_id = :org_id
+                    '''), {'id': key[0]})
+                    conn.commit()
+                audit("api_key.revoke", "api_key", key[0], name=key[1])
+                st.rerun()
+    
+    with st.form("add_api_key_form"):
+        name = st.text_input("Key Name", placeholder="e.g. Payroll integration")
+        submitted = st.form_submit_button("Create API Key")
+        if submitted:
+            if not name:
+                st.error("Please enter a name for the key")
+            else:
+                with org_connection() as conn:
+                    st.session_state.new_api_key = create_api_key(conn, name)
+                    conn.commit()
+                audit("api_key.create", "api_key", name=name)
+                st.rerun()
+
+# Audit log viewer
+# Newest first, one page at a time. Pages are keyed on (occurred_at, id) of the
+# last row shown, so every page is an index range scan on
+# (org_id, occurred_at); a target filter uses (org_id, target_type, target_id).
+AUDIT_PAGE_SIZE = 100
+AUDIT_CATEGORIES = ["employee", "task", "report", "api_key", "organization", "import"]
+AUDIT_TARGET_TYPES = ["employee", "task", "report", "api_key", "organization"]
+
+def fetch_audit_page(org_id, start, end, category=None, actor=None, target=None, before=None, limit=AUDIT_PAGE_SIZE):
+    query = '''
+    SELECT id, occurred_at, actor, action, target_type, target_id, details
+    FROM audit_events
+    WHERE org_id = :org_id AND occurred_at >= :start AND occurred_at < :end
+    '''
+    
+    params = {'start': start, 'end': end, 'limit': limit}
+    
+    if category:
+        query += ' AND action LIKE :action'
+        params['action'] = f"{category}.%"
+    
+    if actor:
+        query += ' AND actor = :actor'
+        params['actor'] = actor
+    
+    if target:
+        query += ' AND target_type = :target_type AND target_id = :target_id'
+        params['target_type'], params['target_id'] = target
+    
+    if before is not None:
+        query += ' AND (occurred_at < :before_at OR (occurred_at = :before_at AND id < :before_id))'
+        params['before_at'], params['before_id'] = before
+    
+    query += ' ORDER BY occurred_at DESC, id DESC LIMIT :limit'
+    
+    with tenancy.connect(read_engine(org_id), org_id) as conn:
+        result = conn.execute(text(query), params)
+        return result.fetchall()
+
+def view_audit_log():
+    st.markdown('<h2 class="sub-header">Audit Log</h2>', unsafe_allow_html=True)
     
+    today = datetime.date.today()
+    col1, col2, col3 = st.columns(3)
     with col1:
-        st.markdown('<div class="stat-card">', unsafe_allow_html=True)
-        st.markdown(f'<div class="stat-value">{total_employees}</div>', unsafe_allow_html=True)
-        st.markdown('<div class="stat-label">Active Employees</div>', unsafe_allow_html=True)
-        st.markdown('</div>', unsafe_allow_html=True)
+        start_date = st.date_input("From", today - datetime.timedelta(days=7), key="audit_start_date")
+        end_date = st.date_input("To", today, key="audit_end_date")
+    with col2:
+        category = st.selectbox("Action", ["All"] + AUDIT_CATEGORIES, key="audit_category",
+                                format_func=lambda c: c.replace("_", " ").capitalize())
+        actor = st.text_input("User", key="audit_actor", help="Username of the person who made the change")
+    with col3:
+        target_type = st.selectbox("Target", ["Any"] + AUDIT_TARGET_TYPES, key="audit_target_type",
+                                   format_func=lambda t: t.replace("_", " ").capitalize())
+        target_id = st.number_input("Target ID", min_value=0, step=1, key="audit_target_id", disabled=target_type == "Any")
+    
+    # Cursors of the pages before the current one; a filter change starts again at the newest page
+    filters = (start_date, end_date, category, actor, target_type, target_id)
+    if st.session_state.get("audit_filters") != filters:
+        st.session_state.audit_filters = filters
+        st.session_state.audit_pages = [None]
+    pages = st.session_state.audit_pages
+    
+    events = fetch_audit_page(
+        current_org(),
+        datetime.datetime.combine(start_date, datetime.time.min),
+        datetime.datetime.combine(end_date + datetime.timedelta(days=1), datetime.time.min),
+        category=None if category == "All" else category,
+        actor=actor.strip() or None,
+        target=None if target_type == "Any" else (target_type, int(target_id)),
+        before=pages[-1],
+        limit=AUDIT_PAGE_SIZE + 1,
+    )
+    has_older = len(events) > AUDIT_PAGE_SIZE
+    events = events[:AUDIT_PAGE_SIZE]
     
+    if not events:
+        st.info("No changes recorded for the selected filters")
+    else:
+        st.dataframe(pd.DataFrame([{
+            "Time": event[1].strftime('%d %b %Y, %H:%M:%S'),
+            "User": event[2],
+            "Action": event[3],
+            "Target": f"{event[4]} #{event[5]}" if event[5] is not None else (event[4] or ""),
+            "Details": ", ".join(f"{key}: {value}" for key, value in json.loads(event[6]).items()) if event[6] else "",
+        } for event in events]), hide_index=True, use_container_width=True)
+    
+    col1, col2 = st.columns(2)
+    with col1:
+        if len(pages) > 1 and st.button("Newer", key="audit_newer"):
+            pages.pop()
+            st.rerun()
     with col2:
-        st.markdown('<div class="stat-card">', unsafe_allow_html=True)
-        st.markdown(f'<div class="stat-value">{total_reports}</div>', unsafe_allow_html=True)
-        st.markdown('<div class="stat-label">Total Reports</div>', unsafe_allow_html=True)
-        st.markdown('</div>', unsafe_allow_html=True)
+        if has_older and st.button("Older", key="audit_older"):
+            pages.append((events[-1][1], events[-1][0]))
+            st.rerun()
+
+# Live overview
+# The Overview stat cards and recent lists run as a fragment, so a refresh
+# reruns only that part of the page, not login and schema setup. What the
+# fragment last showed is kept in session state. While no change notification
+# has arrived it does not touch the database at all; after one, it fetches only
+# rows created since the newest row it has seen and rechecks the few rows on
+# screen by id. A reopened task keeps its old created_at, so a reopen (its own
+# "task_reopens" change) reloads the pending list in full, as completing a
+# listed task does. The lists are also reloaded every OVERVIEW_FULL_RELOAD_SECONDS.
+LIVE_REFRESH_SECONDS = 15
+OVERVIEW_FULL_RELOAD_SECONDS = 300
+OVERVIEW_LIST_SIZE = 5
+
+OVERVIEW_REPORTS_SQL = '''
+SELECT dr.id, e.full_name, dr.report_date, dr.report_text, dr.created_at
+FROM daily_reports dr
+JOIN employees e ON dr.employee_id = e.id
+WHERE dr.org_id = :org_id AND {condition}
+ORDER BY dr.created_at DESC
+LIMIT :limit
+'''
+
+OVERVIEW_TASKS_SQL = '''
+SELECT t.id, e.full_name, t.task_description, t.due_date, t.created_at, t.is_completed
+FROM tasks t
+JOIN employees e ON t.employee_id = e.id
+WHERE t.org_id = :org_id AND t.deleted_at IS NULL AND {condition}
+ORDER BY t.due_date ASC NULLS LAST, t.created_at DESC
+LIMIT :limit
+'''
+
+OVERVIEW_STATS_SQL = '''
+SELECT
+    (SELECT COUNT(*) FROM daily_reports WHERE org_id = :org_id),
+    (SELECT COUNT(*) FROM tasks WHERE org_id = :org_id AND deleted_at IS NULL),
+    (SELECT COUNT(*) FROM tasks WHERE org_id = :org_id AND is_completed = TRUE AND deleted_at IS NULL)
+'''
+
+def overview_query(query, condition, params=None, ids=None):
+    statement = text(query.format(condition=condition))
+    params = {'limit': OVERVIEW_LIST_SIZE, **(params or {})}
+    if ids is not None:
+        statement = statement.bindparams(bindparam('ids', expanding=True))
+        params['ids'] = list(ids)
+    return statement, params
+
+def pending_task_order(task):
+    return (task[3] is None, task[3] or datetime.date.min, -task[4].timestamp())
+
+# Bring the overview state up to date, querying only what the change
+# notifications say may have moved. The queries are independent, so they are
+# sent together through the concurrent reader.
+def refresh_overview(state):
+    org_id = current_org()
+    versions = changes.org_versions(org_id, "reports", "tasks", "employees", "task_reopens")
+    full_reload = (
+        not state
+        or state['org_id'] != org_id
+        or versions[2] != state['versions'][2]
+        or time.monotonic() - state['loaded_at'] > OVERVIEW_FULL_RELOAD_SECONDS
+    )
+    metrics.cache_lookups.inc(cache="admin_overview")
+    if not full_reload and versions == state['versions']:
+        return state
+    metrics.cache_misses.inc(cache="admin_overview")
+    
+    reports = [] if full_reload else state['reports']
+    tasks = [] if full_reload else state['tasks']
+    loaded_at = time.monotonic() if full_reload else state['loaded_at']
+    
+    queries = {'stats': (OVERVIEW_STATS_SQL, None)}
+    if full_reload or versions[0] != state['versions'][0]:
+        if reports:
+            # Saving a report resets its created_at, so edits arrive with the new rows
+            queries['new_reports'] = overview_query(OVERVIEW_REPORTS_SQL, 'dr.created_at >= :since', {'since': reports[0][4]})
+        else:
+            queries['reports'] = overview_query(OVERVIEW_REPORTS_SQL, '1 = 1')
+    if full_reload or versions[1] != state['versions'][1]:
+        if tasks and versions[3] == state['versions'][3]:
+            queries['shown_tasks'] = overview_query(OVERVIEW_TASKS_SQL, 't.id IN :ids', ids=[row[0] for row in tasks])
+            queries['new_tasks'] = overview_query(
+                OVERVIEW_TASKS_SQL, 't.is_completed = FALSE AND t.created_at >= :since', {'since': max(row[4] for row in tasks)}
+            )
+        else:
+            queries['tasks'] = overview_query(OVERVIEW_TASKS_SQL, 't.is_completed = FALSE')
+    results = get_reader(org_id).fetch_all(queries, org_id=org_id)
+    
+    if 'reports' in results:
+        reports = results['reports']
+    elif 'new_reports' in results:
+        newer_ids = {row[0] for row in results['new_reports']}
+        reports = (results['new_reports'] + [row for row in reports if row[0] not in newer_ids])[:OVERVIEW_LIST_SIZE]
+    
+    if 'tasks' in results:
+        tasks = results['tasks']
+    elif 'shown_tasks' in results:
+        still_pending = [row for row in results['shown_tasks'] if not row[5]]
+        if len(still_pending) < len(tasks):
+            # A listed task was completed or deleted; something further down moves up
+            tasks = get_reader(org_id).fetch_all({'tasks': overview_query(OVERVIEW_TASKS_SQL, 't.is_completed = FALSE')}, org_id=org_id)['tasks']
+        else:
+            merged = {row[0]: row for row in still_pending + results['new_tasks']}
+            tasks = sorted(merged.values(), key=pending_task_order)[:OVERVIEW_LIST_SIZE]
+    
+    return {
+        'org_id': org_id,
+        'versions': versions,
+        'loaded_at': loaded_at,
+        'stats': results['stats'][0],
+        'reports': reports,
+        'tasks': tasks,
+    }
+
+def stat_card(value, label):
+    return f'<div class="stat-card"><div class="stat-value">{value}</div><div class="stat-label">{label}</div></div>'
+
+# Admin Dashboard Overview
+def display_admin_dashboard():
+    st.markdown('<h2 class="sub-header">Overview</h2>', unsafe_allow_html=True)
     
-    with col3:
-        st.markdown('<div class="stat-card">', unsafe_allow_html=True)
-        st.markdown(f'<div class="stat-value">{total_tasks}</div>', unsafe_allow_html=True)
-        st.markdown('<div class="stat-label">Total Tasks</div>', unsafe_allow_html=True)
-        st.markdown('</div>', unsafe_allow_html=True)
+    live = st.toggle(
+        "Live updates",
+        key="admin_live_mode",
+        help=f"Refresh the figures below every {LIVE_REFRESH_SECONDS} seconds when something has changed",
+    )
+    st.fragment(run_every=LIVE_REFRESH_SECONDS if live else None)(display_admin_overview)()
+
+@metrics.script_run("admin/Dashboard")
+def display_admin_overview():
+    # A live overview left open counts as activity
+    session_memory.touch(st.session_state)
+    if not st.session_state.get('admin_live_mode'):
+        # Reruns only this fragment
+        st.button("Refresh", key="admin_overview_refresh")
     
-    with col4:
-        completion_rate = 0 if total_tasks == 0 else round((completed_tasks / total_tasks) * 100)
-        st.markdown('<div class="stat-card">', unsafe_allow_html=True)
-        st.markdown(f'<div class="stat-value">{completion_rate}%</div>', unsafe_allow_html=True)
-        st.markdown('<div class="stat-label">Task Completion Rate</div>', unsafe_allow_html=True)
-        st.markdown('</div>', unsafe_allow_html=True)
+    state = refresh_overview(st.session_state.get('admin_overview'))
+    st.session_state.admin_overview = state
+    
+    total_employees = len(get_active_employees())
+    total_reports, total_tasks, completed_tasks = state['stats']
+    completion_rate = 0 if total_tasks == 0 else round((completed_tasks / total_tasks) * 100)
+    
+    # Display statistics
+    col1, col2, col3, col4 = st.columns(4)
+    col1.markdown(stat_card(total_employees, "Active Employees"), unsafe_allow_html=True)
+    col2.markdown(stat_card(total_reports, "Total Reports"), unsafe_allow_html=True)
+    col3.markdown(stat_card(total_tasks, "Total Tasks"), unsafe_allow_html=True)
+    col4.markdown(stat_card(f"{completion_rate}%", "Task Completion Rate"), unsafe_allow_html=True)
     
     # Recent activities
     col1, col2 = st.columns(2)
     
     with col1:
         st.markdown('<h3 class="sub-header">Recent Reports</h3>', unsafe_allow_html=True)
-        if recent_reports:
-            for report in recent_reports:
-                st.markdown(f'''
-                <div class="report-item">
-                    <strong>{report[0]}</strong> - {report[1].strftime('%d %b, %Y')}
-                    <p>{report[2][:100]}{'...' if len(report[2]) > 100 else ''}</p>
-                </div>
-                ''', unsafe_allow_html=True)
+        if state['reports']:
+            st.markdown(rendering.join(
+                rendering.report_item(f"{rendering.strong(report[1])} - {report[2].strftime('%d %b, %Y')}", report[3], limit=100)
+                for report in state['reports']
+            ), unsafe_allow_html=True)
         else:
             st.info("No reports available")
     
     with col2:
         st.markdown('<h3 class="sub-header">Pending Tasks</h3>', unsafe_allow_html=True)
-        if pending_tasks:
-            for task in pending_tasks:
-                due_date = task[2].strftime('%d %b, %Y') if task[2] else "No due date"
-                st.markdown(f'''
-                <div class="task-item">
-                    <strong>{task[0]}</strong> - Due: {due_date}
-                    <p>{task[1][:100]}{'...' if len(task[1]) > 100 else ''}</p>
-                </div>
-                ''', unsafe_allow_html=True)
+        if state['tasks']:
+            st.markdown(rendering.join(
+                rendering.task_item(f"{rendering.strong(task[1])} - Due: {format_due_date(task[3])}", task[2], limit=100)
+                for task in state['tasks']
+            ), unsafe_allow_html=True)
         else:
             st.info("No pending tasks")
 
@@ -388,18 +1502,11 @@ def display_admin_dashboard():
 def manage_employees():
     st.markdown('<h2 class="sub-header">Manage Employees</h2>', unsafe_allow_html=True)
     
-    tab1, tab2 = st.tabs(["Employee List", "Add New Employee"])
+    tab1, tab2, tab3 = st.tabs(["Employee List", "Add New Employee", "Bulk Import"])
     
     with tab1:
-        # Fetch and display all employees
-        with engine.connect() as conn:
-            result = conn.execute(text('''
-            SELECT id, username, full_name, profile_pic_url, is_active 
-            FROM employees
-            WHERE id != 1
-            ORDER BY full_name
-            '''))
-            employees = result.fetchall()
+        # Display all employees from the shared directory
+        employees = load_employee_directory()
         
         if not employees:
             st.info("No employees found. Add employees using the 'Add New Employee' tab.")
@@ -420,32 +1527,39 @@ def manage_employees():
                         st.write(f"**Username:** {employee[1]}")
                         st.write(f"**Full Name:** {employee[2]}")
                         st.write(f"**Status:** {'Active' if employee[4] else 'Inactive'}")
+                        st.write(f"**Role:** {'Administrator' if employee[5] else 'Employee'}")
                         
                         # Action buttons
                         col1, col2 = st.columns(2)
                         with col1:
                             if employee[4]:  # If active
                                 if st.button(f"Deactivate", key=f"deactivate_{employee[0]}"):
-                                    with engine.connect() as conn:
-                                        conn.execute(text('UPDATE employees SET is_active = FALSE WHERE id = :id'), {'id': employee[0]})
+                                    with org_connection() as conn:
+                                        conn.execute(text('UPDATE employees SET is_active = FALSE WHERE id = :id AND org_id = :org_id'), {'id': employee[0]})
+                                        record_employee_change(conn, employee[0])
                                         conn.commit()
+                                    audit("employee.deactivate", "employee", employee[0], username=employee[1])
                                     st.success(f"Deactivated employee: {employee[2]}")
                                     st.rerun()
                             else:  # If inactive
                                 if st.button(f"Activate", key=f"activate_{employee[0]}"):
-                                    with engine.connect() as conn:
-                                        conn.execute(text('UPDATE employees SET is_active = TRUE WHERE id = :id'), {'id': employee[0]})
+                                    with org_connection() as conn:
+                                        conn.execute(text('UPDATE employees SET is_active = TRUE WHERE id = :id AND org_id = :org_id'), {'id': employee[0]})
+                                        refresh_missing_reports(conn, employee[0], [datetime.date.today()])
+                                        record_employee_change(conn, employee[0])
                                         conn.commit()
+                                    audit("employee.activate", "employee", employee[0], username=employee[1])
                                     st.success(f"Activated employee: {employee[2]}")
                                     st.rerun()
                         
                         with col2:
                             if st.button(f"Reset Password", key=f"reset_{employee[0]}"):
                                 new_password = "password123"  # Default reset password
-                                with engine.connect() as conn:
-                                    conn.execute(text('UPDATE employees SET password = :password WHERE id = :id'), 
+                                with org_connection() as conn:
+                                    conn.execute(text('UPDATE employees SET password = :password WHERE id = :id AND org_id = :org_id'), 
                                                 {'id': employee[0], 'password': new_password})
                                     conn.commit()
+                                audit("employee.reset_password", "employee", employee[0], username=employee[1])
                                 st.success(f"Password reset to '{new_password}' for {employee[2]}")
     
     with tab2:
@@ -455,15 +1569,16 @@ def manage_employees():
             password = st.text_input("Password", type="password", help="Initial password")
             full_name = st.text_input("Full Name")
             profile_pic_url = st.text_input("Profile Picture URL", help="Link to employee profile picture")
+            is_admin = st.checkbox("Administrator", help="Administrators manage this organization and do not submit reports")
             
             submitted = st.form_submit_button("Add Employee")
             if submitted:
                 if not username or not password or not full_name:
                     st.error("Please fill all required fields")
                 else:
-                    # Check if username already exists
-                    with engine.connect() as conn:
-                        result = conn.execute(text('SELECT COUNT(*) FROM employees WHERE username = :username'), 
+                    # Check if username already exists; usernames are unique across organizations
+                    with org_connection() as conn:
+                        result = conn.unscoped.execute(text('SELECT COUNT(*) FROM employees WHERE username = :username'), 
                                              {'username': username})
                         count = result.fetchone()[0]
                         
@@ -472,36 +1587,318 @@ def manage_employees():
                         else:
                             # Insert new employee
                             try:
-                                conn.execute(text('''
-                                INSERT INTO employees (username, password, full_name, profile_pic_url, is_active)
-                                VALUES (:username, :password, :full_name, :profile_pic_url, TRUE)
+                                result = conn.execute(text('''
+                                INSERT INTO employees (org_id, username, password, full_name, profile_pic_url, is_active, is_admin, created_at)
+                                VALUES (:org_id, :username, :password, :full_name, :profile_pic_url, TRUE, :is_admin, CURRENT_TIMESTAMP)
+                                RETURNING id
                                 '''), {
+                                    'is_admin': is_admin,
                                     'username': username,
                                     'password': password,
                                     'full_name': full_name,
                                     'profile_pic_url': profile_pic_url if profile_pic_url else "https://www.gravatar.com/avatar/00000000000000000000000000000000?d=mp&f=y"
                                 })
+                                new_employee_id = result.fetchone()[0]
+                                refresh_missing_reports(conn, new_employee_id, [datetime.date.today()])
+                                record_employee_change(conn, new_employee_id)
                                 conn.commit()
+                                audit("employee.create", "employee", new_employee_id, username=username, is_admin=is_admin)
                                 st.success(f"Successfully added employee: {full_name}")
                             except Exception as e:
                                 st.error(f"Error adding employee: {e}")
+    
+    with tab3:
+        bulk_import_form()
+
+# Bulk import of employees, tasks and historical reports from CSV or XLSX.
+# Rows are validated and loaded by bulk_import; the summary tables are then
+# brought up to date with set-based statements for the whole organization.
+def run_bulk_import(kind, valid, progress=None):
+    org_id = current_org()
+    with org_connection() as conn:
+        if kind == "reports":
+            for day in set(valid["report_date"]):
+                report_storage.prepare_write(conn, day)
+        imported = bulk_import.load(conn, db, kind, valid, org_id, progress)
+        
+        if kind in ("reports", "tasks"):
+            rebuild_daily_stats(conn, org_id)
+        if kind == "reports":
+            conn.execute(text('''
+            DELETE FROM missing_reports
+            WHERE org_id = :org_id AND EXISTS (
+                SELECT 1 FROM daily_reports dr
+                WHERE dr.employee_id = missing_reports.employee_id AND dr.report_date = missing_reports.report_date
+            )
+            '''))
+        elif kind == "employees":
+            # New employees owe today's report, as when added one at a time
+            conn.execute(text('''
+            INSERT INTO missing_reports (org_id, employee_id, report_date)
+            SELECT e.org_id, e.id, cd.report_date
+            FROM employees e
+            JOIN compliance_days cd ON cd.report_date = :today
+            WHERE e.org_id = :org_id AND e.is_active = TRUE AND e.is_admin = FALSE
+            AND NOT EXISTS (
+                SELECT 1 FROM daily_reports dr
+                WHERE dr.employee_id = e.id AND dr.report_date = cd.report_date
+            )
+            ON CONFLICT DO NOTHING
+            '''), {'today': datetime.date.today()})
+        
+        changes.notify(conn, kind, org=org_id)
+        conn.commit()
+    audit(f"import.{kind}", rows=imported)
+    return imported
+
+def bulk_import_form():
+    kind = st.selectbox("Import", list(bulk_import.IMPORT_KINDS), format_func=str.capitalize, key="bulk_import_kind")
+    spec = bulk_import.IMPORT_KINDS[kind]
+    st.caption(
+        f"Required columns: {', '.join(spec['required'])}"
+        + (f". Optional: {', '.join(spec['optional'])}" if spec['optional'] else "")
+        + ". Employees are matched by username; dates are YYYY-MM-DD."
+    )
+    st.download_button("Download Template", bulk_import.template_csv(kind), f"{kind}_template.csv", "text/csv", key="bulk_import_template")
+    
+    uploaded = st.file_uploader("CSV or Excel file", type=["csv", "xlsx"], key=f"bulk_import_file_{kind}")
+    if not uploaded:
+        return
+    
+    try:
+        frame = bulk_import.read_import_file(uploaded, uploaded.name)
+        archived_before = report_storage.archive.live_from() if report_storage.archive else None
+        with org_connection() as conn:
+            valid, errors = bulk_import.validate(conn, kind, frame, current_org(), archived_before)
+    except (ValueError, ImportError) as e:
+        st.error(str(e))
+        return
+    
+    st.write(f"{len(valid)} of {len(frame)} rows are valid")
+    if len(errors):
+        st.warning(f"{len(errors)} problems found; those rows will be skipped")
+        st.dataframe(errors, hide_index=True, use_container_width=True)
+        st.download_button("Download Errors", errors.to_csv(index=False), "import_errors.csv", "text/csv", key="bulk_import_errors")
+    
+    if len(valid) and st.button(f"Import {len(valid)} {kind.capitalize()}", key="bulk_import_run"):
+        progress_bar = st.progress(0.0, text="Loading rows...")
+        
+        def progress(done, total):
+            progress_bar.progress(done / total, text=f"Loaded {done} of {total} rows")
+        
+        try:
+            imported = run_bulk_import(kind, valid, progress)
+        except Exception as e:
+            st.error(f"Import failed, nothing was imported: {e}")
+        else:
+            progress_bar.progress(1.0, text="Done")
+            st.success(f"Imported {imported} {kind}")
+            if kind == "employees" and imported < len(valid):
+                st.warning(f"{len(valid) - imported} usernames were taken while importing and were skipped")
+
+# Report list loading
+# Fetched rows are grouped by month and rendered to HTML once per set of filter
+# values. Reruns that leave the filters unchanged, such as clicking Edit, reuse
+# the cached result. The change versions in the cache keys retire an entry as
+# soon as a report it covers is written.
+REPORT_CACHE_TTL = 300
+
+# Reports arrive ordered by date, so consecutive rows share a month
+def group_reports_by_month(reports, date_index=1):
+    groups = []
+    current_month = None
+    for report in reports:
+        report_date = report[date_index]
+        month = (report_date.year, report_date.month)
+        if month != current_month:
+            groups.append((report_date.strftime('%B %Y'), []))
+            current_month = month
+        groups[-1][1].append(report)
+    return groups
+
+def load_report_sections(employee_name, start_date, end_date):
+    org_id = current_org()
+    metrics.cache_lookups.inc(cache="report_sections")
+    return fetch_report_sections(org_id, employee_name, start_date, end_date, changes.org_versions(org_id, "reports", "employees"))
+
+@st.cache_data(ttl=REPORT_CACHE_TTL, max_entries=256, show_spinner=False)
+def fetch_report_sections(org_id, employee_name, start_date, end_date, version):
+    metrics.cache_misses.inc(cache="report_sections")
+    query = '''
+    SELECT e.full_name, dr.report_date, dr.report_text, dr.id, e.id as employee_id
+    FROM daily_reports dr
+    JOIN employees e ON dr.employee_id = e.id
+    WHERE dr.org_id = :org_id AND dr.report_date BETWEEN :start_date AND :end_date
+    '''
+    
+    params = {'start_date': start_date, 'end_date': end_date}
+    
+    if employee_name:
+        query += ' AND e.full_name = :employee_name'
+        params['employee_name'] = employee_name
+    
+    query += ' ORDER BY dr.report_date DESC, e.full_name'
+    
+    with tenancy.connect(read_engine(org_id), org_id) as conn:
+        result = conn.execute(text(query), params)
+        reports = [tuple(row) for row in result.fetchall()]
+    
+    # Older periods may live in the report archive
+    if report_storage.archive:
+        directory = fetch_employee_directory(org_id, changes.org_versions(org_id, "employees"))
+        employee_ids = [emp[0] for emp in directory if not employee_name or emp[2] == employee_name]
+        names = {emp[0]: emp[2] for emp in directory}
+        archived = report_storage.search_archive(start_date, end_date, employee_ids)
+        reports += [(names[row[1]], row[2], row[3], row[0], row[1]) for row in archived if row[1] in names]
+        reports.sort(key=lambda report: (-report[1].toordinal(), report[0]))
+    
+    employee_reports = {}
+    for report in reports:
+        employee_reports.setdefault(report[0], []).append(report)
+    
+    sections = {}
+    for name, rows in employee_reports.items():
+        sections[name] = (len(rows), rendering.join(
+            rendering.section_title(period) + rendering.join(
+                rendering.report_item(rendering.muted(rendering.long_date(report[1])), report[2])
+                for report in period_reports
+            )
+            for period, period_reports in group_reports_by_month(rows)
+        ))
+    return reports, sections
+
+# One page of reports for the API, newest first. before is the (report_date,
+# id) of the last report on the previous page. Archived periods follow the
+# live rows once those run out.
+def fetch_report_page(org_id, start_date, end_date, employee_id=None, before=None, limit=100):
+    query = '''
+    SELECT dr.id, dr.employee_id, e.full_name, dr.report_date, dr.report_text
+    FROM daily_reports dr
+    JOIN employees e ON dr.employee_id = e.id
+    WHERE dr.org_id = :org_id AND dr.report_date BETWEEN :start_date AND :end_date
+    '''
+    
+    params = {'start_date': start_date, 'end_date': end_date, 'limit': limit}
+    
+    if employee_id is not None:
+        query += ' AND dr.employee_id = :employee_id'
+        params['employee_id'] = employee_id
+    
+    if before is not None:
+        query += ' AND (dr.report_date < :before_date OR (dr.report_date = :before_date AND dr.id < :before_id))'
+        params['before_date'], params['before_id'] = before
+    
+    query += ' ORDER BY dr.report_date DESC, dr.id DESC LIMIT :limit'
+    
+    with tenancy.connect(read_engine(org_id), org_id) as conn:
+        result = conn.execute(text(query), params)
+        reports = [tuple(row) for row in result.fetchall()]
+    
+    if len(reports) < limit and report_storage.archive:
+        directory = fetch_employee_directory(org_id, changes.org_versions(org_id, "employees"))
+        names = {emp[0]: emp[2] for emp in directory if employee_id is None or emp[0] == employee_id}
+        archived = sorted((
+            (row[0], row[1], names[row[1]], row[2], row[3])
+            for row in report_storage.search_archive(start_date, end_date, list(names))
+            if row[1] in names and (before is None or (row[2], row[0]) < tuple(before))
+        ), key=lambda report: (report[3], report[0]), reverse=True)
+        reports += archived[:limit - len(reports)]
+    return reports
+
+# Per-session report cache for My Reports
+# An employee's reports are loaded once per session and kept in session state,
+# so changing the date range or clicking Edit does not touch the database.
+# When the change bus reports a write to this employee's reports, only rows
+# with created_at at or after the newest cached one are fetched and merged by
+# id; saving a report resets its created_at, so edits arrive the same way.
+# created_at is the writing transaction's start time, and a transaction that
+# started earlier can commit later, so the fetch reaches back
+# MY_REPORTS_SYNC_OVERLAP before the newest cached row. Rendered sections are
+# kept for the last MY_REPORTS_CACHED_RANGES date ranges until the rows change.
+MY_REPORTS_SYNC_OVERLAP = datetime.timedelta(minutes=5)
+MY_REPORTS_CACHED_RANGES = 4
+
+def my_reports_cache(employee_id):
+    cache = st.session_state.get('my_reports_cache')
+    if cache is None or cache['employee_id'] != employee_id:
+        cache = {'employee_id': employee_id, 'rows': {}, 'synced_at': None, 'version': None, 'sections': {}}
+        st.session_state.my_reports_cache = cache
+    
+    version = changes.version("reports", employee_id)
+    metrics.cache_lookups.inc(cache="my_reports")
+    if cache['version'] != version:
+        metrics.cache_misses.inc(cache="my_reports")
+        query = 'SELECT id, report_date, report_text, created_at FROM daily_reports WHERE org_id = :org_id AND employee_id = :employee_id'
+        params = {'employee_id': employee_id}
+        if cache['synced_at'] is not None:
+            query += ' AND created_at >= :since'
+            params['since'] = cache['synced_at'] - MY_REPORTS_SYNC_OVERLAP
+        with org_connection(read=True) as conn:
+            rows = conn.execute(text(query), params).fetchall()
+        for row in rows:
+            cache['rows'][row[0]] = tuple(row)
+            created_at = as_datetime(row[3])
+            if cache['synced_at'] is None or created_at > cache['synced_at']:
+                cache['synced_at'] = created_at
+        if rows:
+            cache['sections'].clear()
+        cache['version'] = version
+    return cache
+
+# Apply a successful edit to the session cache. If the only change since the
+# cache was synced is this write, the cache is current and the next rerun skips
+# the delta query; otherwise the delta query still runs and picks up the rest.
+def merge_my_report_edit(employee_id, report_id, report_date, report_text, version_before):
+    cache = st.session_state.get('my_reports_cache')
+    if cache is None or cache['employee_id'] != employee_id or report_id not in cache['rows']:
+        return
+    created_at = cache['rows'][report_id][3]
+    cache['rows'][report_id] = (report_id, report_date, report_text, created_at)
+    cache['sections'].clear()
+    if cache['version'] == version_before and changes.version("reports", employee_id) == version_before + 1:
+        cache['version'] = version_before + 1
+
+def load_my_report_sections(employee_id, start_date, end_date):
+    cache = my_reports_cache(employee_id)
+    if (start_date, end_date) not in cache['sections']:
+        reports = sorted(
+            (row for row in cache['rows'].values() if start_date <= row[1] <= end_date),
+            key=lambda row: row[1],
+            reverse=True
+        )
+        sections = [
+            (period, len(period_reports), rendering.join(
+                rendering.report_item(rendering.strong(rendering.long_date(report[1])), report[2])
+                for report in period_reports
+            ))
+            for period, period_reports in group_reports_by_month(reports)
+        ]
+        cache['sections'][(start_date, end_date)] = (reports, sections)
+        # Dicts keep insertion order; the oldest range goes first
+        while len(cache['sections']) > MY_REPORTS_CACHED_RANGES:
+            del cache['sections'][next(iter(cache['sections']))]
+    return cache['sections'][(start_date, end_date)]
 
 # View All Reports
 def view_all_reports():
     st.markdown('<h2 class="sub-header">Employee Reports</h2>', unsafe_allow_html=True)
     
+    tab1, tab2 = st.tabs(["All Reports", "Missing Reports"])
+    
+    with tab1:
+        browse_all_reports()
+    
+    with tab2:
+        view_missing_reports()
+
+# Browse submitted reports with filters
+def browse_all_reports():
     # Filters
     col1, col2, col3 = st.columns(3)
     
     with col1:
         # Employee filter
-        with engine.connect() as conn:
-            result = conn.execute(text('''
-            SELECT id, full_name FROM employees 
-            WHERE is_active = TRUE AND id != 1
-            ORDER BY full_name
-            '''))
-            employees = result.fetchall()
+        employees = get_active_employees()
         
         employee_options = ["All Employees"] + [emp[1] for emp in employees]
         employee_filter = st.selectbox("Select Employee", employee_options, key="reports_employee_filter")
@@ -542,26 +1939,11 @@ def view_all_reports():
                 start_date = datetime.date(2000, 1, 1)
                 end_date = today
     
-    # Build query based on filters
-    query = '''
-    SELECT e.full_name, dr.report_date, dr.report_text, dr.id, e.id as employee_id
-    FROM daily_reports dr
-    JOIN employees e ON dr.employee_id = e.id
-    WHERE dr.report_date BETWEEN :start_date AND :end_date
-    '''
-    
-    params = {'start_date': start_date, 'end_date': end_date}
-    
-    if employee_filter != "All Employees":
-        query += ' AND e.full_name = :employee_name'
-        params['employee_name'] = employee_filter
-    
-    query += ' ORDER BY dr.report_date DESC, e.full_name'
-    
-    # Execute query
-    with engine.connect() as conn:
-        result = conn.execute(text(query), params)
-        reports = result.fetchall()
+    reports, sections = load_report_sections(
+        None if employee_filter == "All Employees" else employee_filter,
+        start_date,
+        end_date
+    )
     
     # Display reports
     if not reports:
@@ -569,53 +1951,115 @@ def view_all_reports():
     else:
         st.write(f"Found {len(reports)} reports")
         
-        # Group by employee for export
-        employee_reports = {}
-        for report in reports:
-            if report[0] not in employee_reports:
-                employee_reports[report[0]] = []
-            employee_reports[report[0]].append(report)
-        
         # Export options
         col1, col2 = st.columns([3, 1])
         with col2:
-            if employee_filter != "All Employees" and len(employee_reports) == 1:
-                if st.button("Export as PDF"):
-                    pdf = create_report_pdf(reports)
-                    st.download_button(
-                        label="Download PDF",
-                        data=pdf,
-                        file_name=f"{employee_filter}_reports_{start_date}_to_{end_date}.pdf",
-                        mime="application/pdf"
-                    )
+            if employee_filter != "All Employees" and len(sections) == 1:
+                # Built when clicked, on a separate thread from the script run
+                st.download_button(
+                    label="Export as PDF",
+                    data=lambda: create_report_pdf(reports),
+                    file_name=f"{employee_filter}_reports_{start_date}_to_{end_date}.pdf",
+                    mime="application/pdf"
+                )
         
-        # Display reports
-        for employee_name, emp_reports in employee_reports.items():
-            with st.expander(f"Reports by {employee_name} ({len(emp_reports)})", expanded=True):
-                # Group by month/year for better organization
-                reports_by_period = {}
-                for report in emp_reports:
-                    period = report[1].strftime('%B %Y')
-                    if period not in reports_by_period:
-                        reports_by_period[period] = []
-                    reports_by_period[period].append(report)
-                
-                for period, period_reports in reports_by_period.items():
-                    st.markdown(f"##### {period}")
-                    for report in period_reports:
-                        st.markdown(f'''
-                        <div class="report-item">
-                            <span style="color: #777;">{report[1].strftime('%A, %d %b %Y')}</span>
-                            <p>{report[2]}</p>
-                        </div>
-                        ''', unsafe_allow_html=True)
+        # Display reports, one pre-rendered element per employee
+        for employee_name, (report_count, section_html) in sections.items():
+            with st.expander(f"Reports by {employee_name} ({report_count})", expanded=True):
+                st.markdown(section_html, unsafe_allow_html=True)
+
+# Missing Reports
+# Reads the incrementally maintained missing_reports summary instead of
+# anti-joining employees against daily_reports on every render
+def view_missing_reports():
+    today = datetime.date.today()
+    
+    col1, col2 = st.columns(2)
+    with col1:
+        period_options = ["Today", "Specific Date", "This Week", "Last 30 Days", "Last 365 Days"]
+        period = st.selectbox("Period", period_options, key="missing_reports_period")
+    with col2:
+        if period == "Specific Date":
+            start_date = end_date = st.date_input(
+                "Date", today, key="missing_reports_date",
+                min_value=today - datetime.timedelta(days=COMPLIANCE_WINDOW_DAYS), max_value=today
+            )
+        elif period == "This Week":
+            start_date, end_date = today - datetime.timedelta(days=today.weekday()), today
+        elif period == "Last 30 Days":
+            start_date, end_date = today - datetime.timedelta(days=29), today
+        elif period == "Last 365 Days":
+            start_date, end_date = today - datetime.timedelta(days=COMPLIANCE_WINDOW_DAYS - 1), today
+        else:  # Today
+            start_date = end_date = today
+    
+    # Materialize any working days not yet in the summary (normally just today)
+    with engine.connect() as conn:
+        if sync_missing_reports(conn, today):
+            conn.commit()
+    
+    with org_connection() as conn:
+        if start_date == end_date:
+            result = conn.execute(text('''
+            SELECT e.full_name, e.username
+            FROM missing_reports mr
+            JOIN employees e ON mr.employee_id = e.id
+            WHERE mr.org_id = :org_id AND mr.report_date = :report_date AND e.is_active = TRUE
+            ORDER BY e.full_name
+            '''), {'report_date': start_date})
+        else:
+            result = conn.execute(text('''
+            SELECT e.full_name, e.username, COUNT(*) AS missing_days, MAX(mr.report_date) AS last_missing
+            FROM missing_reports mr
+            JOIN employees e ON mr.employee_id = e.id
+            WHERE mr.org_id = :org_id AND mr.report_date BETWEEN :start_date AND :end_date AND e.is_active = TRUE
+            GROUP BY e.id, e.full_name, e.username
+            ORDER BY missing_days DESC, e.full_name
+            '''), {'start_date': start_date, 'end_date': end_date})
+        missing = result.fetchall()
+    
+    active_employees = len(get_active_employees())
+    
+    working_days = sum(
+        1 for i in range((end_date - start_date).days + 1)
+        if is_compliance_day(start_date + datetime.timedelta(days=i))
+    )
+    
+    if working_days == 0:
+        st.info("Reports are not expected on weekends")
+        return
+    
+    if start_date == end_date:
+        st.write(f"{len(missing)} of {active_employees} active employees have not submitted a report for {start_date.strftime('%A, %d %b %Y')}")
+        if missing:
+            st.dataframe(
+                pd.DataFrame(missing, columns=["Employee", "Username"]),
+                hide_index=True,
+                use_container_width=True
+            )
+        else:
+            st.success("Everyone has submitted their report")
+    else:
+        missing_days = sum(row[2] for row in missing)
+        expected = active_employees * working_days
+        compliance = 100 if expected == 0 else round((1 - missing_days / expected) * 100)
+        st.write(f"{len(missing)} employees missed at least one report between {start_date.strftime('%d %b %Y')} and {end_date.strftime('%d %b %Y')} ({compliance}% submitted)")
+        if missing:
+            st.dataframe(
+                pd.DataFrame(
+                    [(row[0], row[1], row[2], as_date(row[3]).strftime('%d %b %Y')) for row in missing],
+                    columns=["Employee", "Username", f"Missing Days (of {working_days})", "Last Missing"]
+                ),
+                hide_index=True,
+                use_container_width=True
+            )
+        else:
+            st.success("No missing reports in this period")
 
 # Create PDF for reports
-def create_report_pdf(reports):
-    buffer = io.BytesIO()
-    doc = SimpleDocTemplate(buffer, pagesize=letter)
+# Paragraph styles shared by the report export and the digests
+def report_pdf_styles():
     styles = getSampleStyleSheet()
-    elements = []
     
     # Title
     title_style = ParagraphStyle(
@@ -625,8 +2069,6 @@ def create_report_pdf(reports):
         alignment=1,
         spaceAfter=12
     )
-    elements.append(Paragraph(f"Work Reports: {reports[0][0]}", title_style))
-    elements.append(Spacer(1, 12))
     
     # Date range
     date_style = ParagraphStyle(
@@ -636,57 +2078,100 @@ def create_report_pdf(reports):
         alignment=1,
         textColor=colors.gray
     )
-    min_date = min(report[1] for report in reports).strftime('%d %b %Y')
-    max_date = max(report[1] for report in reports).strftime('%d %b %Y')
-    elements.append(Paragraph(f"Period: {min_date} to {max_date}", date_style))
-    elements.append(Spacer(1, 20))
-    
-    # Group reports by month
-    reports_by_month = {}
-    for report in reports:
-        month_year = report[1].strftime('%B %Y')
-        if month_year not in reports_by_month:
-            reports_by_month[month_year] = []
-        reports_by_month[month_year].append(report)
     
-    # Add each month's reports
-    for month, month_reports in reports_by_month.items():
+    # Styles for the month sections
+    month_style = ParagraphStyle(
+        'Month',
+        parent=styles['Heading2'],
+        fontSize=14,
+        spaceAfter=10
+    )
+    report_date_style = ParagraphStyle(
+        'Date',
+        parent=styles['Normal'],
+        fontSize=11,
+        textColor=colors.blue
+    )
+    text_style = ParagraphStyle(
+        'ReportText',
+        parent=styles['Normal'],
+        fontSize=10,
+        leftIndent=10
+    )
+    return {
+        'base': styles,
+        'title': title_style,
+        'date_range': date_style,
+        'month': month_style,
+        'report_date': report_date_style,
+        'text': text_style,
+    }
+
+# One employee's reports, ordered by date, as one list of flowables per month.
+# Paragraph parses its text as markup, so report text is escaped like in the HTML views.
+def report_pdf_months(reports, styles):
+    for month, month_reports in group_reports_by_month(reports):
         # Month header
-        month_style = ParagraphStyle(
-            'Month',
-            parent=styles['Heading2'],
-            fontSize=14,
-            spaceAfter=10
-        )
-        elements.append(Paragraph(month, month_style))
+        elements = [Paragraph(rendering.escape(month), styles['month'])]
         
         # Reports for the month
         for report in month_reports:
-            # Date
-            date_style = ParagraphStyle(
-                'Date',
-                parent=styles['Normal'],
-                fontSize=11,
-                textColor=colors.blue
-            )
-            elements.append(Paragraph(report[1].strftime('%A, %d %b %Y'), date_style))
-            
-            # Report text
-            text_style = ParagraphStyle(
-                'ReportText',
-                parent=styles['Normal'],
-                fontSize=10,
-                leftIndent=10
-            )
-            elements.append(Paragraph(report[2], text_style))
+            elements.append(Paragraph(rendering.escape(rendering.long_date(report[1])), styles['report_date']))
+            elements.append(Paragraph(rendering.escape(report[2]), styles['text']))
             elements.append(Spacer(1, 12))
         
         elements.append(Spacer(1, 10))
-    
-    # Build PDF
-    doc.build(elements)
-    buffer.seek(0)
-    return buffer.getvalue()
+        yield elements
+
+# Streaming PDF builds
+# doc.build normally receives the whole story, so every Paragraph of a
+# multi-year export is alive until the last page is laid out. ChunkedStory
+# hands the story over one chunk (one month) at a time: build() checks len()
+# before each flowable, and only then is the next chunk created, so finished
+# months are laid out, drawn and released. Builds run one or two at a time
+# per process and write to a temporary file instead of a growing BytesIO.
+PDF_BUILD_SLOTS = threading.BoundedSemaphore(2)
+
+class ChunkedStory(list):
+    def __init__(self, chunks):
+        super().__init__()
+        self._chunks = iter(chunks)
+    
+    def __len__(self):
+        while not super().__len__():
+            chunk = next(self._chunks, None)
+            if chunk is None:
+                return 0
+            self.extend(chunk)
+        return super().__len__()
+
+def build_pdf(chunks):
+    output = tempfile.TemporaryFile(buffering=0)
+    try:
+        with PDF_BUILD_SLOTS, metrics.pdf_seconds.time():
+            doc = SimpleDocTemplate(output, pagesize=letter)
+            doc.build(ChunkedStory(chunks))
+    except Exception:
+        output.close()
+        raise
+    output.seek(0)
+    return output
+
+def report_pdf_chunks(reports, styles):
+    min_date = min(report[1] for report in reports).strftime('%d %b %Y')
+    max_date = max(report[1] for report in reports).strftime('%d %b %Y')
+    yield [
+        Paragraph(f"Work Reports: {rendering.escape(reports[0][0])}", styles['title']),
+        Spacer(1, 12),
+        Paragraph(f"Period: {min_date} to {max_date}", styles['date_range']),
+        Spacer(1, 20),
+    ]
+    yield from report_pdf_months(reports, styles)
+
+# The PDF's bytes; the temporary file is closed as soon as it has been read
+def create_report_pdf(reports):
+    with build_pdf(report_pdf_chunks(reports, report_pdf_styles())) as output:
+        return output.read()
 
 # Manage Tasks
 def manage_tasks():
@@ -700,102 +2185,26 @@ def manage_tasks():
         
         with col1:
             # Employee filter
-            with engine.connect() as conn:
-                result = conn.execute(text('''
-                SELECT id, full_name FROM employees 
-                WHERE is_active = TRUE AND id != 1
-                ORDER BY full_name
-                '''))
-                employees = result.fetchall()
+            employees = get_active_employees()
             
             employee_options = ["All Employees"] + [emp[1] for emp in employees]
             employee_filter = st.selectbox("Select Employee", employee_options, key="task_employee_filter")
         
-        with col2:
-            # Status filter
-            status_options = ["All Tasks", "Pending", "Completed"]
-            status_filter = st.selectbox("Task Status", status_options, key="admin_task_status_filter")
-        
-        # Build query based on filters
-        query = '''
-        SELECT t.id, e.full_name, t.task_description, t.due_date, t.is_completed, t.created_at, e.id as employee_id
-        FROM tasks t
-        JOIN employees e ON t.employee_id = e.id
-        WHERE 1=1
-        '''
-        
-        params = {}
-        
-        if employee_filter != "All Employees":
-            query += ' AND e.full_name = :employee_name'
-            params['employee_name'] = employee_filter
-        
-        if status_filter == "Pending":
-            query += ' AND t.is_completed = FALSE'
-        elif status_filter == "Completed":
-            query += ' AND t.is_completed = TRUE'
-        
-        query += ' ORDER BY t.due_date ASC NULLS LAST, t.created_at DESC'
-        
-        # Execute query
-        with engine.connect() as conn:
-            result = conn.execute(text(query), params)
-            tasks = result.fetchall()
-        
-        # Display tasks
-        if not tasks:
-            st.info("No tasks found for the selected criteria")
-        else:
-            st.write(f"Found {len(tasks)} tasks")
-            
-            for task in tasks:
-                task_id = task[0]
-                employee_name = task[1]
-                task_description = task[2]
-                due_date = task[3].strftime('%d %b, %Y') if task[3] else "No due date"
-                is_completed = task[4]
-                created_at = task[5].strftime('%d %b, %Y')
-                
-                # Display the task with status-based styling
-                status_class = "completed" if is_completed else ""
-                st.markdown(f'''
-                <div class="task-item {status_class}">
-                    <strong>{employee_name}</strong> - Due: {due_date}
-                    <p>{task_description}</p>
-                    <div style="display: flex; justify-content: space-between; align-items: center;">
-                        <span style="color: #777; font-size: 0.8rem;">Created: {created_at}</span>
-                        <span style="font-weight: 600; color: {'#9e9e9e' if is_completed else '#4CAF50'};">
-                            {"Completed" if is_completed else "Pending"}
-                        </span>
-                    </div>
-                </div>
-                ''', unsafe_allow_html=True)
-                
-                # Action buttons
-                col1, col2 = st.columns(2)
-                with col1:
-                    if not is_completed:
-                        if st.button(f"Mark as Completed", key=f"complete_{task_id}"):
-                            with engine.connect() as conn:
-                                conn.execute(text('UPDATE tasks SET is_completed = TRUE WHERE id = :id'), {'id': task_id})
-                                conn.commit()
-                            st.success("Task marked as completed")
-                            st.rerun()
-                    else:
-                        if st.button(f"Reopen Task", key=f"reopen_{task_id}"):
-                            with engine.connect() as conn:
-                                conn.execute(text('UPDATE tasks SET is_completed = FALSE WHERE id = :id'), {'id': task_id})
-                                conn.commit()
-                            st.success("Task reopened")
-                            st.rerun()
-                
-                with col2:
-                    if st.button(f"Delete Task", key=f"delete_{task_id}"):
-                        with engine.connect() as conn:
-                            conn.execute(text('DELETE FROM tasks WHERE id = :id'), {'id': task_id})
-                            conn.commit()
-                        st.success("Task deleted")
-                        st.rerun()
+        with col2:
+            # Status filter
+            status_options = ["All Tasks", "Pending", "Completed"]
+            status_filter = st.selectbox("Task Status", status_options, key="admin_task_status_filter")
+        
+        task_view(
+            "admin_task",
+            employee_name=None if employee_filter == "All Employees" else employee_filter,
+            status=status_filter,
+            show_employee=True,
+            footer="status",
+            allow_reopen=True,
+            allow_delete=True,
+            empty_message="No tasks found for the selected criteria"
+        )
     
     with tab2:
         # Form to assign new task
@@ -815,20 +2224,171 @@ def manage_tasks():
                 else:
                     # Insert new task
                     try:
-                        with engine.connect() as conn:
-                            conn.execute(text('''
-                            INSERT INTO tasks (employee_id, task_description, due_date, is_completed)
-                            VALUES (:employee_id, :task_description, :due_date, FALSE)
-                            '''), {
-                                'employee_id': employee_map[employee],
-                                'task_description': task_description,
-                                'due_date': due_date
-                            })
+                        with org_connection() as conn:
+                            task_id = create_task(conn, current_org(), employee_map[employee], task_description, due_date)
                             conn.commit()
+                        audit("task.create", "task", task_id, employee_id=employee_map[employee], due_date=due_date)
                         st.success(f"Successfully assigned task to {employee}")
                     except Exception as e:
                         st.error(f"Error assigning task: {e}")
 
+# Report Analytics
+# Charts read the pre-aggregated report_daily_stats rollup; turnaround is an
+# index range scan over the completion times of the period
+def view_analytics():
+    st.markdown('<h2 class="sub-header">Analytics</h2>', unsafe_allow_html=True)
+    
+    # Backfill the rollup the first time analytics are opened on an existing database
+    with engine.connect() as conn:
+        has_stats = conn.execute(text('SELECT 1 FROM report_daily_stats LIMIT 1')).fetchone()
+        has_activity = conn.execute(text('SELECT 1 FROM daily_reports UNION ALL SELECT 1 FROM tasks LIMIT 1')).fetchone()
+        if not has_stats and has_activity:
+            rebuild_daily_stats(conn)
+            conn.commit()
+    
+    col1, col2 = st.columns([3, 1])
+    with col1:
+        weeks = st.selectbox("Period", [4, 12, 26, 52], index=1, format_func=lambda w: f"Last {w} weeks", key="analytics_weeks")
+    with col2:
+        st.write("")
+        if st.button("Rebuild Statistics", key="rebuild_daily_stats"):
+            with org_connection() as conn:
+                rebuild_daily_stats(conn, current_org())
+                conn.commit()
+            st.success("Statistics rebuilt")
+    
+    today = datetime.date.today()
+    current_week = today - datetime.timedelta(days=today.weekday())
+    start_date = current_week - datetime.timedelta(weeks=weeks - 1)
+    
+    employees = get_active_employees()
+    
+    with org_connection(read=True) as conn:
+        result = conn.execute(text(f'''
+        SELECT s.employee_id, {db.week_start('s.stat_date')} AS week_start,
+            SUM(CASE WHEN s.reports_submitted > 0 THEN 1 ELSE 0 END) AS days_reported,
+            SUM(s.tasks_created) AS tasks_created,
+            SUM(s.tasks_due) AS tasks_due,
+            SUM(s.tasks_completed) AS tasks_completed
+        FROM report_daily_stats s
+        WHERE s.org_id = :org_id AND s.stat_date BETWEEN :start_date AND :end_date
+        GROUP BY s.employee_id, week_start
+        '''), {'start_date': start_date, 'end_date': today})
+        weekly = pd.DataFrame(result.fetchall(), columns=list(result.keys()))
+        
+        result = conn.execute(text('''
+        SELECT employee_id, SUM(tasks_due - tasks_completed) AS overdue
+        FROM report_daily_stats
+        WHERE org_id = :org_id AND stat_date < :today AND tasks_due > tasks_completed
+        GROUP BY employee_id
+        '''), {'today': today})
+        overdue = dict(result.fetchall())
+        
+        # Tasks completed in the period, from assignment to completion
+        result = conn.execute(text(f'''
+        SELECT employee_id, COUNT(*) AS completed,
+            AVG({db.epoch_seconds('completed_at')} - {db.epoch_seconds('created_at')}) / 86400.0 AS turnaround_days,
+            SUM(CASE WHEN due_date IS NULL OR {db.to_date('completed_at')} <= due_date THEN 1 ELSE 0 END) AS on_time
+        FROM tasks
+        WHERE org_id = :org_id AND completed_at IS NOT NULL AND deleted_at IS NULL
+        AND completed_at >= :start_date AND completed_at < :end_date
+        GROUP BY employee_id
+        '''), {'start_date': start_date, 'end_date': today + datetime.timedelta(days=1)})
+        turnaround = pd.DataFrame(result.fetchall(), columns=list(result.keys()))
+    
+    if not employees:
+        st.info("No active employees found")
+        return
+    
+    employee_names = {emp[0]: emp[1] for emp in employees}
+    week_starts = [start_date + datetime.timedelta(weeks=i) for i in range(weeks)]
+    week_labels = [week.strftime('%d %b') for week in week_starts]
+    
+    # Working days (Mon-Fri) that could have had a report, capped at today
+    def working_days(week_start):
+        return sum(1 for i in range(5) if week_start + datetime.timedelta(days=i) <= today)
+    
+    if weekly.empty:
+        weekly = pd.DataFrame(columns=['employee_id', 'week_start', 'days_reported', 'tasks_created', 'tasks_due', 'tasks_completed'])
+    weekly = weekly[weekly['employee_id'].isin(employee_names.keys())]
+    weekly['week_start'] = pd.to_datetime(weekly['week_start']).dt.date
+    
+    # Submission rate per employee and week
+    grid = pd.MultiIndex.from_product([list(employee_names), week_starts], names=['employee_id', 'week_start'])
+    days_reported = (
+        weekly.groupby(['employee_id', 'week_start'])['days_reported'].sum()
+        .reindex(grid, fill_value=0)
+        .unstack('week_start')
+    )
+    expected_days = pd.Series([working_days(week) for week in week_starts], index=week_starts)
+    submission_rate = (days_reported.astype(float).div(expected_days.replace(0, float('nan')), axis=1).clip(upper=1) * 100).round()
+    submission_rate.index = [employee_names[emp_id] for emp_id in submission_rate.index]
+    submission_rate.columns = week_labels
+    
+    average_rate = submission_rate.stack().mean()
+    total_overdue = int(sum(overdue.get(emp_id, 0) for emp_id in employee_names))
+    col1, col2 = st.columns(2)
+    with col1:
+        st.markdown('<div class="stat-card">', unsafe_allow_html=True)
+        st.markdown(f'<div class="stat-value">{0 if pd.isna(average_rate) else round(average_rate)}%</div>', unsafe_allow_html=True)
+        st.markdown('<div class="stat-label">Average Submission Rate</div>', unsafe_allow_html=True)
+        st.markdown('</div>', unsafe_allow_html=True)
+    with col2:
+        st.markdown('<div class="stat-card">', unsafe_allow_html=True)
+        st.markdown(f'<div class="stat-value">{total_overdue}</div>', unsafe_allow_html=True)
+        st.markdown('<div class="stat-label">Overdue Tasks</div>', unsafe_allow_html=True)
+        st.markdown('</div>', unsafe_allow_html=True)
+    
+    st.markdown('<h3 class="sub-header">Report Submission Rate</h3>', unsafe_allow_html=True)
+    fig = px.imshow(
+        submission_rate,
+        color_continuous_scale="Blues",
+        zmin=0,
+        zmax=100,
+        aspect="auto",
+        labels={"x": "Week of", "y": "Employee", "color": "Submitted %"}
+    )
+    fig.update_layout(height=max(300, 28 * len(submission_rate)), margin=dict(l=0, r=0, t=10, b=0))
+    st.plotly_chart(fig, use_container_width=True)
+    
+    # Task completion trend by due week
+    st.markdown('<h3 class="sub-header">Task Completion Trend</h3>', unsafe_allow_html=True)
+    trend = (
+        weekly.groupby('week_start')[['tasks_created', 'tasks_due', 'tasks_completed']].sum()
+        .reindex(week_starts, fill_value=0)
+    )
+    trend.index = week_labels
+    trend = trend.rename(columns={'tasks_created': 'Assigned', 'tasks_due': 'Due', 'tasks_completed': 'Completed'})
+    fig = px.line(trend, markers=True, labels={"index": "Week of", "value": "Tasks", "variable": ""})
+    fig.update_layout(height=350, margin=dict(l=0, r=0, t=10, b=0))
+    st.plotly_chart(fig, use_container_width=True)
+    
+    # Overdue tasks per employee
+    st.markdown('<h3 class="sub-header">Overdue Tasks</h3>', unsafe_allow_html=True)
+    overdue_counts = pd.DataFrame(
+        [(name, int(overdue.get(emp_id, 0))) for emp_id, name in employee_names.items() if overdue.get(emp_id, 0)],
+        columns=['Employee', 'Overdue']
+    )
+    if overdue_counts.empty:
+        st.info("No overdue tasks")
+    else:
+        fig = px.bar(overdue_counts.sort_values('Overdue', ascending=False), x='Employee', y='Overdue')
+        fig.update_layout(height=350, margin=dict(l=0, r=0, t=10, b=0))
+        st.plotly_chart(fig, use_container_width=True)
+    
+    # Time from assignment to completion, for tasks completed in the period
+    st.markdown('<h3 class="sub-header">Task Turnaround</h3>', unsafe_allow_html=True)
+    turnaround = turnaround[turnaround['employee_id'].isin(employee_names.keys())]
+    if turnaround.empty:
+        st.info("No tasks completed in this period")
+    else:
+        st.dataframe(pd.DataFrame({
+            'Employee': turnaround['employee_id'].map(employee_names),
+            'Completed': turnaround['completed'].astype(int),
+            'Average Days to Complete': turnaround['turnaround_days'].astype(float).round(1),
+            'Completed on Time': (turnaround['on_time'] / turnaround['completed'] * 100).round().astype(int).astype(str) + '%',
+        }).sort_values('Average Days to Complete'), hide_index=True, use_container_width=True)
+
 # Employee Dashboard
 def employee_dashboard():
     st.markdown('<h1 class="main-header">Employee Dashboard</h1>', unsafe_allow_html=True)
@@ -874,6 +2434,9 @@ def employee_dashboard():
         # First time setting the section
         st.session_state.current_section = selected
     
+    metrics.set_page(f"employee/{selected}")
+    display_sync_status(st.session_state.user["id"])
+    
     # Display the selected section
     if selected == "Dashboard":
         display_employee_dashboard()
@@ -894,49 +2457,31 @@ def display_employee_dashboard():
     
     employee_id = st.session_state.user["id"]
     
-    # Statistics
-    with engine.connect() as conn:
-        # Total reports
-        result = conn.execute(text('SELECT COUNT(*) FROM daily_reports WHERE employee_id = :employee_id'), 
-                             {'employee_id': employee_id})
-        total_reports = result.fetchone()[0]
-        
-        # Reports this month
-        today = datetime.date.today()
-        first_day_of_month = today.replace(day=1)
-        result = conn.execute(text('''
+    # Statistics, fetched concurrently
+    today = datetime.date.today()
+    params = {'employee_id': employee_id}
+    results = get_reader(current_org()).fetch_all({
+        'total_reports': ('SELECT COUNT(*) FROM daily_reports WHERE org_id = :org_id AND employee_id = :employee_id', params),
+        'reports_this_month': ('''
         SELECT COUNT(*) FROM daily_reports 
-        WHERE employee_id = :employee_id AND report_date >= :first_day
-        '''), {'employee_id': employee_id, 'first_day': first_day_of_month})
-        reports_this_month = result.fetchone()[0]
-        
-        # Total tasks
-        result = conn.execute(text('SELECT COUNT(*) FROM tasks WHERE employee_id = :employee_id'), 
-                             {'employee_id': employee_id})
-        total_tasks = result.fetchone()[0]
-        
-        # Pending tasks
-        result = conn.execute(text('''
+        WHERE org_id = :org_id AND employee_id = :employee_id AND report_date >= :first_day
+        ''', {**params, 'first_day': today.replace(day=1)}),
+        'total_tasks': ('SELECT COUNT(*) FROM tasks WHERE org_id = :org_id AND employee_id = :employee_id AND deleted_at IS NULL', params),
+        'pending_tasks': ('''
         SELECT COUNT(*) FROM tasks 
-        WHERE employee_id = :employee_id AND is_completed = FALSE
-        '''), {'employee_id': employee_id})
-        pending_tasks = result.fetchone()[0]
-        
-        # Recent reports
-        result = conn.execute(text('''
+        WHERE org_id = :org_id AND employee_id = :employee_id AND is_completed = FALSE AND deleted_at IS NULL
+        ''', params),
+        'recent_reports': ('''
         SELECT report_date, report_text FROM daily_reports 
-        WHERE employee_id = :employee_id 
+        WHERE org_id = :org_id AND employee_id = :employee_id 
         ORDER BY report_date DESC LIMIT 3
-        '''), {'employee_id': employee_id})
-        recent_reports = result.fetchall()
-        
-        # Pending tasks details
-        result = conn.execute(text('''
-        SELECT id, task_description, due_date FROM tasks 
-        WHERE employee_id = :employee_id AND is_completed = FALSE 
-        ORDER BY due_date ASC NULLS LAST LIMIT 5
-        '''), {'employee_id': employee_id})
-        pending_task_details = result.fetchall()
+        ''', params),
+    }, org_id=current_org())
+    total_reports = results['total_reports'][0][0]
+    reports_this_month = results['reports_this_month'][0][0]
+    total_tasks = results['total_tasks'][0][0]
+    pending_tasks = results['pending_tasks'][0][0]
+    recent_reports = results['recent_reports']
     
     # Display statistics
     col1, col2, col3, col4 = st.columns(4)
@@ -971,13 +2516,10 @@ def display_employee_dashboard():
     with col1:
         st.markdown('<h3 class="sub-header">My Recent Reports</h3>', unsafe_allow_html=True)
         if recent_reports:
-            for report in recent_reports:
-                st.markdown(f'''
-                <div class="report-item">
-                    <strong>{report[0].strftime('%d %b, %Y')}</strong>
-                    <p>{report[1][:100]}{'...' if len(report[1]) > 100 else ''}</p>
-                </div>
-                ''', unsafe_allow_html=True)
+            st.markdown(rendering.join(
+                rendering.report_item(rendering.strong(report[0].strftime('%d %b, %Y')), report[1], limit=100)
+                for report in recent_reports
+            ), unsafe_allow_html=True)
         else:
             st.info("No reports submitted yet")
         
@@ -987,78 +2529,87 @@ def display_employee_dashboard():
     
     with col2:
         st.markdown('<h3 class="sub-header">My Pending Tasks</h3>', unsafe_allow_html=True)
-        if pending_task_details:
-            for task in pending_task_details:
-                due_date = task[2].strftime('%d %b, %Y') if task[2] else "No due date"
-                st.markdown(f'''
-                <div class="task-item">
-                    <strong>Due: {due_date}</strong>
-                    <p>{task[1][:100]}{'...' if len(task[1]) > 100 else ''}</p>
-                </div>
-                ''', unsafe_allow_html=True)
-                
-                if st.button(f"Mark as Completed", key=f"quick_complete_employee_{task[0]}_{task[2].strftime('%Y%m%d') if task[2] else 'nodate'}"):
-                    with engine.connect() as conn:
-                        conn.execute(text('UPDATE tasks SET is_completed = TRUE WHERE id = :id'), {'id': task[0]})
-                        conn.commit()
-                    st.success("Task marked as completed")
-                    st.rerun()
-        else:
-            st.info("No pending tasks")
+        task_view(
+            "quick_complete_employee",
+            employee_id=employee_id,
+            status="Pending",
+            limit=5,
+            preview_limit=100,
+            empty_message="No pending tasks"
+        )
 
 # Submit Report
 def submit_report():
     st.markdown('<h2 class="sub-header">Submit Daily Report</h2>', unsafe_allow_html=True)
     
     employee_id = st.session_state.user["id"]
+    drafts = get_draft_store()
     
-    with st.form("submit_report_form"):
-        report_date = st.date_input("Report Date", datetime.date.today())
-        
-        # Check if a report already exists for this date
-        with engine.connect() as conn:
+    report_date = st.date_input("Report Date", datetime.date.today(), key="submit_report_date")
+    draft_key = (employee_id, report_date)
+    text_key = f"submit_report_text_{report_date.isoformat()}"
+    
+    # Look up an existing report only when the selected date changes
+    existing_key = (employee_id, report_date)
+    if st.session_state.get("submit_report_existing_key") != existing_key:
+        with org_connection() as conn:
             result = conn.execute(text('''
-            SELECT id FROM daily_reports 
-            WHERE employee_id = :employee_id AND report_date = :report_date
+            SELECT 1 FROM daily_reports 
+            WHERE org_id = :org_id AND employee_id = :employee_id AND report_date = :report_date
             '''), {'employee_id': employee_id, 'report_date': report_date})
-            existing_report = result.fetchone()
-        
-        if existing_report:
-            st.warning(f"You already have a report for {report_date.strftime('%d %b, %Y')}. Submitting will update your existing report.")
-        
-        report_text = st.text_area("What did you work on today?", height=200)
-        
-        submitted = st.form_submit_button("Submit Report")
-        if submitted:
-            if not report_text:
-                st.error("Please enter your report")
+            st.session_state.submit_report_existing = result.fetchone() is not None
+        st.session_state.submit_report_existing_key = existing_key
+    
+    existing_report = st.session_state.submit_report_existing
+    
+    if existing_report:
+        st.warning(f"You already have a report for {report_date.strftime('%d %b, %Y')}. Submitting will update your existing report.")
+    
+    # Restore an unsent draft for this date
+    if text_key not in st.session_state and draft_key in drafts:
+        st.session_state[text_key] = drafts[draft_key]['text']
+    
+    def save_draft():
+        drafts[draft_key] = {'text': st.session_state[text_key], 'saved_at': datetime.datetime.now()}
+    
+    report_text = st.text_area("What did you work on today?", height=200, key=text_key, on_change=save_draft)
+    
+    if draft_key in drafts:
+        st.caption(f"Draft saved at {drafts[draft_key]['saved_at'].strftime('%H:%M:%S')}")
+    
+    if st.button("Submit Report", key="submit_report_button"):
+        if not report_text:
+            st.error("Please enter your report")
+        else:
+            save_draft()
+            ticket = get_write_queue().submit(
+                "report",
+                {'employee_id': employee_id, 'report_date': report_date, 'report_text': report_text},
+                owner=employee_id
+            )
+            
+            audit_log, actor, org_id = get_audit_log(), session_actor(), current_org()
+            
+            # Keep the draft until the write lands; a newer edit is never discarded
+            def report_written(ticket):
+                if ticket.status != "done":
+                    return
+                audit_log.record(org_id, *actor, "report.update" if existing_report else "report.submit",
+                                 "report", ticket.result, {'employee_id': employee_id, 'report_date': report_date})
+                if drafts.get(draft_key, {}).get('text') == report_text:
+                    drafts.pop(draft_key, None)
+            ticket.add_done_callback(report_written)
+            
+            # Confirmed only once the write has landed; during an outage it stays queued
+            ticket.wait(WRITE_WAIT_SECONDS)
+            if ticket.status == "done":
+                st.session_state.submit_report_existing = True
+                st.success("Report updated successfully" if existing_report else "Report submitted successfully")
+            elif ticket.status == "failed":
+                st.error(f"Your report was not saved: {ticket.error}")
             else:
-                try:
-                    with engine.connect() as conn:
-                        if existing_report:
-                            # Update existing report
-                            conn.execute(text('''
-                            UPDATE daily_reports 
-                            SET report_text = :report_text, created_at = CURRENT_TIMESTAMP
-                            WHERE id = :id
-                            '''), {'report_text': report_text, 'id': existing_report[0]})
-                            success_message = "Report updated successfully"
-                        else:
-                            # Insert new report
-                            conn.execute(text('''
-                            INSERT INTO daily_reports (employee_id, report_date, report_text)
-                            VALUES (:employee_id, :report_date, :report_text)
-                            '''), {
-                                'employee_id': employee_id,
-                                'report_date': report_date,
-                                'report_text': report_text
-                            })
-                            success_message = "Report submitted successfully"
-                        
-                        conn.commit()
-                    st.success(success_message)
-                except Exception as e:
-                    st.error(f"Error submitting report: {e}")
+                st.session_state.submit_report_existing = True
+                st.info("Your report is queued and will be saved as soon as the database is reachable. Your draft is kept until then.")
 
 # View My Reports
 def view_my_reports():
@@ -1100,16 +2651,7 @@ def view_my_reports():
                 start_date = datetime.date(2000, 1, 1)
                 end_date = today
     
-    # Fetch reports
-    with engine.connect() as conn:
-        result = conn.execute(text('''
-        SELECT id, report_date, report_text
-        FROM daily_reports
-        WHERE employee_id = :employee_id
-        AND report_date BETWEEN :start_date AND :end_date
-        ORDER BY report_date DESC
-        '''), {'employee_id': employee_id, 'start_date': start_date, 'end_date': end_date})
-        reports = result.fetchall()
+    reports, sections = load_my_report_sections(employee_id, start_date, end_date)
     
     # Display reports
     if not reports:
@@ -1117,38 +2659,29 @@ def view_my_reports():
     else:
         st.write(f"Found {len(reports)} reports")
         
-        # Group by month/year for better organization
-        reports_by_period = {}
-        for report in reports:
-            period = report[1].strftime('%B %Y')
-            if period not in reports_by_period:
-                reports_by_period[period] = []
-            reports_by_period[period].append(report)
+        # A single edit control instead of an Edit button on every report
+        reports_by_id = {report[0]: report for report in reports}
+        col1, col2 = st.columns([3, 1])
+        with col1:
+            edit_id = st.selectbox(
+                "Edit a report",
+                list(reports_by_id),
+                format_func=lambda report_id: rendering.long_date(reports_by_id[report_id][1]),
+                key="edit_report_select"
+            )
+        with col2:
+            st.write("")
+            if st.button("Edit", key="edit_report_button"):
+                st.session_state.edit_report = {
+                    'id': edit_id,
+                    'date': reports_by_id[edit_id][1],
+                    'text': reports_by_id[edit_id][2]
+                }
+                st.rerun()
         
-        for period, period_reports in reports_by_period.items():
-            with st.expander(f"{period} ({len(period_reports)} reports)", expanded=True):
-                for report in period_reports:
-                    report_id = report[0]
-                    report_date = report[1]
-                    report_text = report[2]
-                    
-                    col1, col2 = st.columns([3, 1])
-                    with col1:
-                        st.markdown(f'''
-                        <div class="report-item">
-                            <strong>{report_date.strftime('%A, %d %b %Y')}</strong>
-                            <p>{report_text}</p>
-                        </div>
-                        ''', unsafe_allow_html=True)
-                    
-                    with col2:
-                        if st.button("Edit", key=f"edit_{report_id}"):
-                            st.session_state.edit_report = {
-                                'id': report_id,
-                                'date': report_date,
-                                'text': report_text
-                            }
-                            st.rerun()
+        for period, report_count, section_html in sections:
+            with st.expander(f"{period} ({report_count} reports)", expanded=True):
+                st.markdown(section_html, unsafe_allow_html=True)
         
     # Edit report if selected
     if hasattr(st.session_state, 'edit_report'):
@@ -1169,20 +2702,34 @@ def view_my_reports():
                     st.error("Please enter your report")
                 else:
                     try:
-                        with engine.connect() as conn:
-                            conn.execute(text('''
-                            UPDATE daily_reports 
-                            SET report_text = :report_text, report_date = :report_date, created_at = CURRENT_TIMESTAMP
-                            WHERE id = :id
-                            '''), {
-                                'report_text': report_text, 
-                                'report_date': report_date, 
-                                'id': st.session_state.edit_report['id']
-                            })
+                        version_before = changes.version("reports", employee_id)
+                        with org_connection() as conn:
+                            if report_date == st.session_state.edit_report['date']:
+                                upsert_report(conn, employee_id, report_date, report_text)
+                            else:
+                                # Moving to another day; the unique index rejects a day that already has a report
+                                report_storage.prepare_write(conn, report_date)
+                                conn.execute(text('''
+                                UPDATE daily_reports 
+                                SET report_text = :report_text, report_date = :report_date, created_at = CURRENT_TIMESTAMP
+                                WHERE id = :id AND org_id = :org_id AND employee_id = :employee_id
+                                '''), {
+                                    'report_text': report_text, 
+                                    'report_date': report_date, 
+                                    'id': st.session_state.edit_report['id'],
+                                    'employee_id': employee_id
+                                })
+                                record_report_change(conn, employee_id, [st.session_state.edit_report['date'], report_date])
                             conn.commit()
+                        audit("report.edit", "report", st.session_state.edit_report['id'],
+                              report_date=report_date, previous_date=st.session_state.edit_report['date'])
+                        merge_my_report_edit(employee_id, st.session_state.edit_report['id'], report_date, report_text, version_before)
+                        st.session_state.pop("submit_report_existing_key", None)
                         st.success("Report updated successfully")
                         del st.session_state.edit_report
                         st.rerun()
+                    except IntegrityError:
+                        st.error(f"You already have a report for {report_date.strftime('%d %b, %Y')}. Edit that report instead.")
                     except Exception as e:
                         st.error(f"Error updating report: {e}")
             
@@ -1190,284 +2737,22 @@ def view_my_reports():
                 del st.session_state.edit_report
                 st.rerun()
 
-# View My Tasks function - completely separated from profile management
+# View My Tasks
 def view_my_tasks():
     st.markdown('<h2 class="sub-header">My Tasks</h2>', unsafe_allow_html=True)
     
-    employee_id = st.session_state.user["id"]
-    
     # Task status filter
     status_options = ["All Tasks", "Pending", "Completed"]
     status_filter = st.selectbox("Show", status_options, key="employee_task_status_filter")
     
-    # Build query based on filter
-    query = '''
-    SELECT id, task_description, due_date, is_completed, created_at
-    FROM tasks
-    WHERE employee_id = :employee_id
-    '''
-    
-    params = {'employee_id': employee_id}
-    
-    if status_filter == "Pending":
-        query += ' AND is_completed = FALSE'
-    elif status_filter == "Completed":
-        query += ' AND is_completed = TRUE'
-    
-    query += ' ORDER BY due_date ASC NULLS LAST, created_at DESC'
-    
-    # Fetch tasks
-    with engine.connect() as conn:
-        result = conn.execute(text(query), params)
-        tasks = result.fetchall()
-    
-    # Display tasks
-    if not tasks:
-        st.info("No tasks found")
-    else:
-        st.write(f"Found {len(tasks)} tasks")
-        
-        # Separate into pending and completed for better organization
-        pending_tasks = [task for task in tasks if not task[3]]
-        completed_tasks = [task for task in tasks if task[3]]
-        
-        # Display pending tasks first
-        if pending_tasks and status_filter != "Completed":
-            st.markdown('<h3 class="sub-header">Pending Tasks</h3>', unsafe_allow_html=True)
-            
-            for task in pending_tasks:
-                task_id = task[0]
-                task_description = task[1]
-                due_date = task[2].strftime('%d %b, %Y') if task[2] else "No due date"
-                created_at = task[4].strftime('%d %b, %Y')
-                task_date_str = task[2].strftime('%Y%m%d') if task[2] else 'nodate'
-                
-                st.markdown(f'''
-                <div class="task-item">
-                    <strong>Due: {due_date}</strong>
-                    <p>{task_description}</p>
-                    <div style="text-align: right; color: #777; font-size: 0.8rem;">
-                        Created: {created_at}
-                    </div>
-                </div>
-                ''', unsafe_allow_html=True)
-                
-                if st.button(f"Mark as Completed", key=f"employee_complete_{task_id}_{task_date_str}"):
-                    with engine.connect() as conn:
-                        conn.execute(text('UPDATE tasks SET is_completed = TRUE WHERE id = :id'), {'id': task_id})
-                        conn.commit()
-                    st.success("Task marked as completed")
-                    st.rerun()
-        
-        # Display completed tasks
-        if completed_tasks and status_filter != "Pending":
-            st.markdown('<h3 class="sub-header">Completed Tasks</h3>', unsafe_allow_html=True)
-            
-            for task in completed_tasks:
-                task_id = task[0]
-                task_description = task[1]
-                due_date = task[2].strftime('%d %b, %Y') if task[2] else "No due date"
-                created_at = task[4].strftime('%d %b, %Y')
-                
-                st.markdown(f'''
-                <div class="task-item completed">
-                    <strong>Due: {due_date}</strong>
-                    <p>{task_description}</p>
-                    <div style="text-align: right; color: #777; font-size: 0.8rem;">
-                        Created: {created_at}
-                    </div>
-                </div>
-                ''', unsafe_allow_html=True)
-    
-    # Fetch current employee data
-    with engine.connect() as conn:
-        result = conn.execute(text('''
-        SELECT username, full_name, profile_pic_url
-        FROM employees
-        WHERE id = :employee_id
-        '''), {'employee_id': employee_id})
-        employee_data = result.fetchone()
-    
-    if not employee_data:
-        st.error("Could not retrieve your profile information. Please try again later.")
-        return
-    
-    username, current_full_name, current_pic_url = employee_data
-    
-    # Display current profile picture
-    col1, col2 = st.columns([1, 2])
-    with col1:
-        st.markdown("<p>Current Profile Picture:</p>", unsafe_allow_html=True)
-        try:
-            st.image(current_pic_url, width=150, use_container_width=False)
-        except:
-            st.image("https://www.gravatar.com/avatar/00000000000000000000000000000000?d=mp&f=y", width=150, use_container_width=False)
-    
-    with col2:
-        st.markdown(f"<p><strong>Username:</strong> {username}</p>", unsafe_allow_html=True)
-        st.info("Username cannot be changed as it is used for login purposes.")
-  
-#shuvo
-    # Form for updating profile
-    with st.form("update_profile_form"):
-        st.subheader("Update Your Information")
-        
-        # Full name update
-        new_full_name = st.text_input("Full Name", value=current_full_name)
-        
-        # Profile picture URL update
-        new_profile_pic_url = st.text_input("Profile Picture URL", value=current_pic_url or "")
-        
-        # Password update section
-        st.subheader("Change Password")
-        current_password = st.text_input("Current Password", type="password")
-        new_password = st.text_input("New Password", type="password")
-        confirm_password = st.text_input("Confirm New Password", type="password")
-        
-        submitted = st.form_submit_button("Update Profile")
-        if submitted:
-            updates_made = False
-            
-            # Check if any changes were made to name or picture URL
-            if new_full_name != current_full_name or new_profile_pic_url != current_pic_url:
-                with engine.connect() as conn:
-                    conn.execute(text('''
-                    UPDATE employees
-                    SET full_name = :full_name, profile_pic_url = :profile_pic_url
-                    WHERE id = :employee_id
-                    '''), {
-                        'full_name': new_full_name,
-                        'profile_pic_url': new_profile_pic_url,
-                        'employee_id': employee_id
-                    })
-                    conn.commit()
-                
-                # Update session state with new values
-                st.session_state.user["full_name"] = new_full_name
-                st.session_state.user["profile_pic_url"] = new_profile_pic_url
-                
-                updates_made = True
-                st.success("Profile information updated successfully.")
-            
-            # Handle password change if attempted
-            if current_password or new_password or confirm_password:
-                if not current_password:
-                    st.error("Please enter your current password to change it.")
-                elif not new_password:
-                    st.error("Please enter a new password.")
-                elif new_password != confirm_password:
-                    st.error("New passwords do not match.")
-                else:
-                    # Verify current password
-                    with engine.connect() as conn:
-                        result = conn.execute(text('''
-                        SELECT COUNT(*)
-                        FROM employees
-                        WHERE id = :employee_id AND password = :current_password
-                        '''), {'employee_id': employee_id, 'current_password': current_password})
-                        is_valid = result.fetchone()[0] > 0
-                    
-                    if not is_valid:
-                        st.error("Current password is incorrect.")
-                    else:
-                        # Update password
-                        with engine.connect() as conn:
-                            conn.execute(text('''
-                            UPDATE employees
-                            SET password = :new_password
-                            WHERE id = :employee_id
-                            '''), {'new_password': new_password, 'employee_id': employee_id})
-                            conn.commit()
-                        
-                        updates_made = True
-                        st.success("Password updated successfully.")
-            
-            if updates_made:
-                time.sleep(1)  # Give the user time to read the success message
-                st.rerun()
- 
-    # Task status filter
-    status_options = ["All Tasks", "Pending", "Completed"]
-    status_filter = st.selectbox("Show", status_options)
-   
-    # Build query based on filter
-    query = '''
-    SELECT id, task_description, due_date, is_completed, created_at
-    FROM tasks
-    WHERE employee_id = :employee_id
-    '''
-    
-    params = {'employee_id': employee_id}
-    
-    if status_filter == "Pending":
-        query += ' AND is_completed = FALSE'
-    elif status_filter == "Completed":
-        query += ' AND is_completed = TRUE'
-    
-    query += ' ORDER BY due_date ASC NULLS LAST, created_at DESC'
-    
-    # Fetch tasks
-    with engine.connect() as conn:
-        result = conn.execute(text(query), params)
-        tasks = result.fetchall()
-    
-    # Display tasks
-    if not tasks:
-        st.info("No tasks found")
-    else:
-        st.write(f"Found {len(tasks)} tasks")
-        
-        # Separate into pending and completed for better organization
-        pending_tasks = [task for task in tasks if not task[3]]
-        completed_tasks = [task for task in tasks if task[3]]
-        
-        # Display pending tasks first
-        if pending_tasks and status_filter != "Completed":
-            st.markdown('<h3 class="sub-header">Pending Tasks</h3>', unsafe_allow_html=True)
-            
-            for task in pending_tasks:
-                task_id = task[0]
-                task_description = task[1]
-                due_date = task[2].strftime('%d %b, %Y') if task[2] else "No due date"
-                created_at = task[4].strftime('%d %b, %Y')
-                
-                st.markdown(f'''
-                <div class="task-item">
-                    <strong>Due: {due_date}</strong>
-                    <p>{task_description}</p>
-                    <div style="text-align: right; color: #777; font-size: 0.8rem;">
-                        Created: {created_at}
-                    </div>
-                </div>
-                ''', unsafe_allow_html=True)
-                
-                if st.button(f"Mark as Completed", key=f"complete_{task_id}"):
-                    with engine.connect() as conn:
-                        conn.execute(text('UPDATE tasks SET is_completed = TRUE WHERE id = :id'), {'id': task_id})
-                        conn.commit()
-                    st.success("Task marked as completed")
-                    st.rerun()
-        
-        # Display completed tasks
-        if completed_tasks and status_filter != "Pending":
-            st.markdown('<h3 class="sub-header">Completed Tasks</h3>', unsafe_allow_html=True)
-            
-            for task in completed_tasks:
-                task_id = task[0]
-                task_description = task[1]
-                due_date = task[2].strftime('%d %b, %Y') if task[2] else "No due date"
-                created_at = task[4].strftime('%d %b, %Y')
-                
-                st.markdown(f'''
-                <div class="task-item completed">
-                    <strong>Due: {due_date}</strong>
-                    <p>{task_description}</p>
-                    <div style="text-align: right; color: #777; font-size: 0.8rem;">
-                        Created: {created_at}
-                    </div>
-                </div>
-                ''', unsafe_allow_html=True)
- 
+    task_view(
+        "employee_complete",
+        employee_id=st.session_state.user["id"],
+        status=status_filter,
+        group_by_status=True,
+        footer="created"
+    )
+
 # Edit My Profile
 def edit_my_profile():
     st.markdown('<h2 class="sub-header">My Profile</h2>', unsafe_allow_html=True)
@@ -1475,11 +2760,11 @@ def edit_my_profile():
     employee_id = st.session_state.user["id"]
     
     # Fetch current employee data
-    with engine.connect() as conn:
+    with org_connection() as conn:
         result = conn.execute(text('''
         SELECT username, full_name, profile_pic_url
         FROM employees
-        WHERE id = :employee_id
+        WHERE id = :employee_id AND org_id = :org_id
         '''), {'employee_id': employee_id})
         employee_data = result.fetchone()
     
@@ -1524,17 +2809,19 @@ def edit_my_profile():
             
             # Check if any changes were made to name or picture URL
             if new_full_name != current_full_name or new_profile_pic_url != current_pic_url:
-                with engine.connect() as conn:
+                with org_connection() as conn:
                     conn.execute(text('''
                     UPDATE employees
                     SET full_name = :full_name, profile_pic_url = :profile_pic_url
-                    WHERE id = :employee_id
+                    WHERE id = :employee_id AND org_id = :org_id
                     '''), {
                         'full_name': new_full_name,
                         'profile_pic_url': new_profile_pic_url,
                         'employee_id': employee_id
                     })
+                    record_employee_change(conn, employee_id)
                     conn.commit()
+                audit("employee.update_profile", "employee", employee_id)
                 
                 # Update session state with new values
                 st.session_state.user["full_name"] = new_full_name
@@ -1553,11 +2840,11 @@ def edit_my_profile():
                     st.error("New passwords do not match.")
                 else:
                     # Verify current password
-                    with engine.connect() as conn:
+                    with org_connection() as conn:
                         result = conn.execute(text('''
                         SELECT COUNT(*)
                         FROM employees
-                        WHERE id = :employee_id AND password = :current_password
+                        WHERE id = :employee_id AND org_id = :org_id AND password = :current_password
                         '''), {'employee_id': employee_id, 'current_password': current_password})
                         is_valid = result.fetchone()[0] > 0
                     
@@ -1565,13 +2852,14 @@ def edit_my_profile():
                         st.error("Current password is incorrect.")
                     else:
                         # Update password
-                        with engine.connect() as conn:
+                        with org_connection() as conn:
                             conn.execute(text('''
                             UPDATE employees
                             SET password = :new_password
-                            WHERE id = :employee_id
+                            WHERE id = :employee_id AND org_id = :org_id
                             '''), {'new_password': new_password, 'employee_id': employee_id})
                             conn.commit()
+                        audit("employee.change_password", "employee", employee_id)
                         
                         updates_made = True
                         st.success("Password updated successfully.")
@@ -1580,24 +2868,41 @@ def edit_my_profile():
                 time.sleep(1)  # Give the user time to read the success message
                 st.rerun()
 
-# Main function
-def main():
-    global engine
-    engine = init_connection()
+# Connect and set up the shared services; used by main() and by the API
+def init_services():
+    global engine, db, changes, report_storage
+    db = init_connection()
+    engine = db.engine if db else None
     
     if engine:
+        changes = get_change_bus()
+        report_storage = get_report_storage()
+        
         # Initialize database tables
         init_db()
+        maintain_report_storage()
+    return engine is not None
+
+# Main function
+def main():
+    setup_page()
+    
+    if init_services():
+        get_session_monitor()
+        session_memory.touch(st.session_state)
         
         # Check if user is logged in
         if "user" not in st.session_state:
-            display_login()
+            with metrics.script_run("login"):
+                display_login()
         else:
             # Show appropriate dashboard based on user type
             if st.session_state.user.get("is_admin", False):
-                admin_dashboard()
+                with metrics.script_run("admin"):
+                    admin_dashboard()
             else:
-                employee_dashboard()
+                with metrics.script_run("employee"):
+                    employee_dashboard()
     else:
         st.error("Failed to connect to the database. Please check your database configuration.")
 
@@ -0,0 +1,97 @@
+import asyncio
+import contextvars
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from sqlalchemy import text
+
+import tenancy
+
+
+# Concurrent reads
+# A page often needs several independent queries (counts, recent rows, pending
+# tasks). Sent one after another, the page waits for the sum of the round trips;
+# sent together, it waits for the slowest one. fetch_all takes a dict of
+# name -> (query, params) and returns name -> list of row tuples. The queries
+# run with the caller's context variables (the page label of query metrics).
+# Given an organization, every query is scoped to it as on tenancy's connections.
+def as_statement(query):
+    return text(query) if isinstance(query, str) else query
+
+
+def scoped_queries(queries, org_id):
+    if org_id is None:
+        return queries
+    scoped = {}
+    for name, (query, params) in queries.items():
+        statement = as_statement(query)
+        scoped[name] = (statement, tenancy.scope(statement, params, org_id))
+    return scoped
+
+
+# Runs the queries on a SQLAlchemy AsyncEngine (asyncpg or aiosqlite). Streamlit
+# scripts run in plain threads, so one event loop lives in a background thread
+# for the life of the process and owns the async connection pool.
+class AsyncReader:
+    def __init__(self, backend):
+        self.engine = backend.create_async_engine()
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name="async-reads", daemon=True)
+        self._thread.start()
+
+    async def _fetch(self, query, params):
+        async with self.engine.connect() as conn:
+            result = await conn.execute(as_statement(query), params or {})
+            return [tuple(row) for row in result.fetchall()]
+
+    async def _gather(self, queries, context):
+        for var, value in context.items():
+            var.set(value)
+        results = await asyncio.gather(*(self._fetch(query, params) for query, params in queries.values()))
+        return dict(zip(queries, results))
+
+    def fetch_all(self, queries, timeout=None, org_id=None):
+        queries = scoped_queries(queries, org_id)
+        context = contextvars.copy_context()
+        return asyncio.run_coroutine_threadsafe(self._gather(queries, context), self._loop).result(timeout)
+
+
+# Same interface over the regular engine, for when the async drivers are not
+# installed: each query runs on its own pooled connection from a worker thread
+class ThreadedReader:
+    def __init__(self, engine, max_workers=8):
+        self.engine = engine
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="reads")
+
+    def _fetch(self, query, params):
+        with self.engine.connect() as conn:
+            result = conn.execute(as_statement(query), params or {})
+            return [tuple(row) for row in result.fetchall()]
+
+    def fetch_all(self, queries, timeout=None, org_id=None):
+        queries = scoped_queries(queries, org_id)
+        futures = {
+            name: self._executor.submit(contextvars.copy_context().run, self._fetch, query, params)
+            for name, (query, params) in queries.items()
+        }
+        return {name: future.result(timeout) for name, future in futures.items()}
+
+
+# An in-memory SQLite database is a single shared connection, so its queries
+# run one after another on that connection
+class SequentialReader(ThreadedReader):
+    def __init__(self, engine):
+        self.engine = engine
+
+    def fetch_all(self, queries, timeout=None, org_id=None):
+        queries = scoped_queries(queries, org_id)
+        return {name: self._fetch(query, params) for name, (query, params) in queries.items()}
+
+
+def create_reader(backend):
+    if getattr(backend, "in_memory", False):
+        return SequentialReader(backend.engine)
+    try:
+        return AsyncReader(backend)
+    except ImportError:
+        return ThreadedReader(backend.engine)
@@ -0,0 +1,61 @@
+import datetime
+import json
+import uuid
+
+from sqlalchemy import text
+
+from write_queue import WriteBehindQueue
+
+
+# Audit log
+# Every change made through the app or the API is recorded in audit_events:
+# the organization, who made it, when, the action, the row it touched and a
+# few details. Recording an event only queues it in the process; a background
+# thread inserts whatever has queued up in one multi-row statement, so the
+# click that caused it never waits on the audit table. An event is lost only
+# if the process dies in the second or so before its batch is written.
+#
+# audit_events is append-only: nothing in the app updates or deletes it, and
+# the database rejects UPDATE and DELETE on it (see the backends). Each event
+# carries a random key, so a batch replayed after a lost commit acknowledgement
+# is not recorded twice.
+AUDIT_BATCH_SIZE = 500
+AUDIT_FLUSH_SECONDS = 1.0
+
+AUDIT_INSERT_SQL = '''
+INSERT INTO audit_events (event_key, org_id, occurred_at, actor_id, actor, action, target_type, target_id, details)
+VALUES (:event_key, :org_id, :occurred_at, :actor_id, :actor, :action, :target_type, :target_id, :details)
+ON CONFLICT (event_key) DO NOTHING
+'''
+
+
+def insert_audit_event(conn, **event):
+    conn.execute(text(AUDIT_INSERT_SQL), event)
+
+
+class AuditLog(WriteBehindQueue):
+    def __init__(self, engine, batch_size=AUDIT_BATCH_SIZE, flush_interval=AUDIT_FLUSH_SECONDS):
+        super().__init__(engine, {"audit_event": insert_audit_event}, batch_size=batch_size, flush_interval=flush_interval)
+
+    # actor_id is the employee who acted, None for the platform admin and API
+    # keys; actor is the name shown in the log
+    def record(self, org_id, actor_id, actor, action, target_type=None, target_id=None, details=None):
+        return self.submit("audit_event", {
+            'event_key': uuid.uuid4().hex,
+            'org_id': org_id,
+            'occurred_at': datetime.datetime.now(),
+            'actor_id': actor_id,
+            'actor': actor,
+            'action': action,
+            'target_type': target_type,
+            'target_id': target_id,
+            'details': json.dumps(details, default=str) if details else None,
+        })
+
+    # The whole batch in one executemany
+    def _flush(self, batch):
+        with self.engine.begin() as conn:
+            conn.execute(text(AUDIT_INSERT_SQL), [ticket.params for ticket in batch])
+        self._committed(batch)
+        for ticket in batch:
+            self._complete(ticket, "done")
@@ -0,0 +1,215 @@
+import csv
+import datetime
+import io
+import sqlite3
+
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.engine import make_url
+from sqlalchemy.pool import StaticPool
+
+
+# Database backends
+# The app talks to the database through SQLAlchemy text() queries. A backend
+# wraps the engine and supplies the few SQL fragments that differ between
+# dialects, so the same schema and queries run on Postgres in production and
+# on SQLite for local development, benchmarks and CI.
+class PostgresBackend:
+    name = "postgresql"
+    serial_primary_key = "SERIAL PRIMARY KEY"
+
+    def __init__(self, url, **engine_options):
+        self.url = url
+        self.engine = create_engine(url, pool_pre_ping=True, **engine_options)
+
+    # Raises ImportError when the asyncio extension or asyncpg is not installed
+    def create_async_engine(self):
+        from sqlalchemy.ext.asyncio import create_async_engine
+        url = make_url(self.url).set(drivername="postgresql+asyncpg")
+        # asyncpg takes "ssl" where libpq takes "sslmode"
+        if "sslmode" in url.query:
+            url = url.update_query_dict({"ssl": url.query["sslmode"]}).difference_update_query(["sslmode"])
+        return create_async_engine(url, pool_pre_ping=True)
+
+    def to_date(self, expr):
+        return f"CAST({expr} AS DATE)"
+
+    def week_start(self, expr):
+        return f"CAST(date_trunc('week', {expr}) AS DATE)"
+
+    def epoch_seconds(self, expr):
+        return f"EXTRACT(EPOCH FROM {expr})"
+
+    def month_start(self, expr):
+        return f"CAST(date_trunc('month', {expr}) AS DATE)"
+
+    def index_exists(self, conn, name):
+        return conn.execute(text('SELECT to_regclass(:name) IS NOT NULL'), {'name': name}).scalar()
+
+    def add_column(self, conn, table, column, definition, references=None):
+        if references:
+            definition += f" REFERENCES {references}"
+        conn.execute(text(f'ALTER TABLE {table} ADD COLUMN IF NOT EXISTS {column} {definition}'))
+
+    # Bulk load through COPY on the connection's own transaction
+    def copy_rows(self, conn, table, columns, rows):
+        buffer = io.StringIO()
+        csv.writer(buffer).writerows(rows)
+        buffer.seek(0)
+        cursor = conn.connection.cursor()
+        try:
+            cursor.copy_expert(f"COPY {table} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)", buffer)
+        finally:
+            cursor.close()
+
+    # A trigger rejects UPDATE and DELETE on the table
+    def make_append_only(self, conn, table):
+        conn.execute(text('''
+        CREATE OR REPLACE FUNCTION reject_append_only_change() RETURNS trigger AS $$
+        BEGIN
+            RAISE EXCEPTION '% is append-only', TG_TABLE_NAME;
+        END
+        $$ LANGUAGE plpgsql
+        '''))
+        exists = conn.execute(text('SELECT 1 FROM pg_trigger WHERE tgname = :name AND tgrelid = to_regclass(:table)'),
+                              {'name': f'{table}_append_only', 'table': table}).scalar()
+        if not exists:
+            conn.execute(text(f'''
+            CREATE TRIGGER {table}_append_only BEFORE UPDATE OR DELETE ON {table}
+            FOR EACH ROW EXECUTE FUNCTION reject_append_only_change()
+            '''))
+
+    def explain(self, conn, query, params=None):
+        result = conn.execute(text(f'EXPLAIN {query}'), params or {})
+        return [row[0] for row in result.fetchall()]
+
+    # Seconds a streaming replica is behind, 0 when it has replayed everything
+    # it received, None on a primary
+    def replication_lag(self, conn):
+        return conn.execute(text('''
+        SELECT CASE
+            WHEN NOT pg_is_in_recovery() THEN NULL
+            WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+            ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp())
+        END
+        ''')).scalar()
+
+
+class SqliteBackend:
+    name = "sqlite"
+    serial_primary_key = "INTEGER PRIMARY KEY AUTOINCREMENT"
+
+    def __init__(self, url, **engine_options):
+        self.url = url
+        self.in_memory = url in ("sqlite://", "sqlite:///:memory:")
+        # DATE and TIMESTAMP columns come back as date/datetime objects, as with psycopg2
+        connect_args = {"detect_types": sqlite3.PARSE_DECLTYPES, "check_same_thread": False}
+        if self.in_memory:
+            # One shared connection, so every session and the background writer see the same database
+            engine_options.setdefault("poolclass", StaticPool)
+        self.engine = create_engine(url, connect_args=connect_args, **engine_options)
+        event.listen(self.engine, "connect", self._configure_connection)
+
+    # Raises ImportError when the asyncio extension or aiosqlite is not installed
+    def create_async_engine(self):
+        from sqlalchemy.ext.asyncio import create_async_engine
+        engine = create_async_engine(
+            make_url(self.url).set(drivername="sqlite+aiosqlite"),
+            connect_args={"detect_types": sqlite3.PARSE_DECLTYPES},
+        )
+        event.listen(engine.sync_engine, "connect", self._configure_connection)
+        return engine
+
+    def _configure_connection(self, dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA foreign_keys = ON")
+        cursor.execute("PRAGMA busy_timeout = 5000")
+        if not self.in_memory:
+            cursor.execute("PRAGMA journal_mode = WAL")
+            cursor.execute("PRAGMA synchronous = NORMAL")
+        cursor.close()
+
+    def to_date(self, expr):
+        return f"date({expr})"
+
+    def week_start(self, expr):
+        # Monday of the week, matching date_trunc('week', ...) in Postgres
+        return f"date({expr}, '-6 days', 'weekday 1')"
+
+    def epoch_seconds(self, expr):
+        return f"((julianday({expr}) - 2440587.5) * 86400)"
+
+    def month_start(self, expr):
+        return f"date({expr}, 'start of month')"
+
+    def index_exists(self, conn, name):
+        result = conn.execute(text("SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = :name"), {'name': name})
+        return result.fetchone() is not None
+
+    # SQLite cannot add a REFERENCES column with a non-NULL default while
+    # foreign keys are enforced, so the reference is left to new tables
+    def add_column(self, conn, table, column, definition, references=None):
+        columns = {row[1] for row in conn.execute(text(f'PRAGMA table_info({table})')).fetchall()}
+        if column not in columns:
+            conn.execute(text(f'ALTER TABLE {table} ADD COLUMN {column} {definition}'))
+
+    # No COPY; one executemany over the rows
+    def copy_rows(self, conn, table, columns, rows):
+        conn.execute(
+            text(f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join(':' + column for column in columns)})"),
+            [dict(zip(columns, row)) for row in rows]
+        )
+
+    def make_append_only(self, conn, table):
+        for operation in ("UPDATE", "DELETE"):
+            conn.execute(text(f'''
+            CREATE TRIGGER IF NOT EXISTS {table}_no_{operation.lower()} BEFORE {operation} ON {table}
+            BEGIN SELECT RAISE(ABORT, '{table} is append-only'); END
+            '''))
+
+    def explain(self, conn, query, params=None):
+        result = conn.execute(text(f'EXPLAIN QUERY PLAN {query}'), params or {})
+        return [row[-1] for row in result.fetchall()]
+
+    # SQLite has no replication; a reachable file counts as current
+    def replication_lag(self, conn):
+        conn.execute(text('SELECT 1'))
+        return None
+
+
+BACKENDS = {
+    "postgresql": PostgresBackend,
+    "postgres": PostgresBackend,
+    "sqlite": SqliteBackend,
+}
+
+
+def create_backend(url, **engine_options):
+    # Older configs use the "postgres://" scheme, which SQLAlchemy no longer accepts
+    if url.startswith("postgres://"):
+        url = "postgresql://" + url[len("postgres://"):]
+    scheme = url.split(":", 1)[0].split("+", 1)[0]
+    if scheme not in BACKENDS:
+        raise ValueError(f"Unsupported database URL scheme: {scheme}")
+    return BACKENDS[scheme](url, **engine_options)
+
+
+# Split a schema script into statements, since SQLite executes one at a time
+def split_statements(script):
+    return [statement.strip() for statement in script.split(';') if statement.strip()]
+
+
+# Ensure aggregated values such as MAX(report_date) are dates on every backend
+def as_date(value):
+    if value is None or hasattr(value, "strftime"):
+        return value
+    return datetime.date.fromisoformat(str(value)[:10])
+
+
+# Same for timestamps, as naive datetimes in the database's time zone;
+# SQLite returns CURRENT_TIMESTAMP and MAX(...) as text
+def as_datetime(value):
+    if value is None:
+        return None
+    if isinstance(value, datetime.datetime):
+        return value.replace(tzinfo=None)
+    return datetime.datetime.fromisoformat(str(value))
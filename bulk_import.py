@@ -0,0 +1,210 @@
+import io
+import os
+
+import pandas as pd
+from sqlalchemy import bindparam, text
+
+import tenancy
+
+
+# Bulk import
+# Employees, tasks and historical reports can be loaded for one organization
+# from a CSV or XLSX file. The whole file is validated at once with pandas
+# column operations; failing rows are reported with their line number and
+# reason and the remaining rows are loaded. Valid rows are copied into a
+# temporary staging table (COPY on Postgres) and merged into the real table
+# with a single INSERT ... SELECT, so a 2,000-row file costs a few statements
+# rather than one round trip per row.
+IMPORT_CHUNK_SIZE = 5000
+DEFAULT_PROFILE_PIC = "https://www.gravatar.com/avatar/00000000000000000000000000000000?d=mp&f=y"
+
+BOOLEAN_VALUES = {
+    "": None, "true": True, "yes": True, "y": True, "1": True,
+    "false": False, "no": False, "n": False, "0": False,
+}
+
+# Per kind: file columns, staging table columns and the merge into the real table
+IMPORT_KINDS = {
+    "employees": {
+        "required": ["username", "password", "full_name"],
+        "optional": ["profile_pic_url", "is_active", "is_admin"],
+        "stage": {
+            "username": "VARCHAR(50)",
+            "password": "VARCHAR(255)",
+            "full_name": "VARCHAR(100)",
+            "profile_pic_url": "TEXT",
+            "is_active": "BOOLEAN",
+            "is_admin": "BOOLEAN",
+        },
+        # A username taken between validation and the merge is skipped
+        "merge": '''
+        INSERT INTO employees (org_id, username, password, full_name, profile_pic_url, is_active, is_admin, created_at)
+        SELECT :org_id, username, password, full_name, profile_pic_url, is_active, is_admin, CURRENT_TIMESTAMP
+        FROM import_stage WHERE TRUE
+        ON CONFLICT (username) DO NOTHING
+        ''',
+    },
+    "tasks": {
+        "required": ["username", "task_description"],
+        "optional": ["due_date", "is_completed"],
+        "stage": {
+            "employee_id": "INTEGER",
+            "task_description": "TEXT",
+            "due_date": "DATE",
+            "is_completed": "BOOLEAN",
+        },
+        "merge": '''
+        INSERT INTO tasks (org_id, employee_id, task_description, due_date, is_completed)
+        SELECT :org_id, employee_id, task_description, due_date, is_completed
+        FROM import_stage
+        ''',
+    },
+    "reports": {
+        "required": ["username", "report_date", "report_text"],
+        "optional": [],
+        "stage": {
+            "employee_id": "INTEGER",
+            "report_date": "DATE",
+            "report_text": "TEXT",
+        },
+        # Same rule as a submitted report: the file replaces an existing report for the day
+        "merge": '''
+        INSERT INTO daily_reports (org_id, employee_id, report_date, report_text)
+        SELECT :org_id, employee_id, report_date, report_text
+        FROM import_stage WHERE TRUE
+        ON CONFLICT (employee_id, report_date) DO UPDATE
+        SET report_text = EXCLUDED.report_text, created_at = CURRENT_TIMESTAMP
+        ''',
+    },
+}
+
+
+# Every cell is read as text; validate() does the typing
+def read_import_file(file, filename):
+    extension = os.path.splitext(filename)[1].lower()
+    if extension == ".csv":
+        frame = pd.read_csv(file, dtype=str, keep_default_na=False)
+    elif extension == ".xlsx":
+        try:
+            frame = pd.read_excel(file, engine="openpyxl", dtype=str, keep_default_na=False)
+        except ImportError:
+            raise ImportError("Reading .xlsx files needs the openpyxl package")
+    else:
+        raise ValueError(f"Unsupported file type: {extension or filename}")
+    frame.columns = [str(column).strip().lower() for column in frame.columns]
+    return frame
+
+
+def as_python(series):
+    return series.astype(object).where(series.notna(), None)
+
+
+# Returns (valid, errors): valid holds the typed staging columns plus the file
+# line of each row, errors one row per problem with line, column and message
+def validate(conn, kind, frame, org_id, archived_before=None):
+    spec = IMPORT_KINDS[kind]
+    missing = [column for column in spec["required"] if column not in frame.columns]
+    if missing:
+        raise ValueError(f"Missing columns: {', '.join(missing)}")
+
+    data = pd.DataFrame({
+        column: frame[column].astype(str).str.strip() if column in frame.columns else ""
+        for column in spec["required"] + spec["optional"]
+    }, index=frame.index)
+    # Line 1 is the header
+    data["line"] = frame.index + 2
+    conn = tenancy.scoped(conn, org_id)
+    problems = []
+
+    def fail(mask, column, message):
+        if mask.any():
+            problems.append(pd.DataFrame({"line": data.loc[mask, "line"], "column": column, "message": message}))
+
+    for column in spec["required"]:
+        fail(data[column] == "", column, "is required")
+
+    for column in ("is_active", "is_admin", "is_completed"):
+        if column in data:
+            values = data[column].str.lower()
+            fail(~values.isin(list(BOOLEAN_VALUES)), column, "must be true or false")
+            data[column] = values.map(BOOLEAN_VALUES)
+
+    for column in ("due_date", "report_date"):
+        if column in data:
+            parsed = pd.to_datetime(data[column], format="ISO8601", errors="coerce")
+            fail((data[column] != "") & parsed.isna(), column, "must be a date (YYYY-MM-DD)")
+            data[column] = as_python(parsed.dt.date)
+
+    if kind == "employees":
+        fail(data["username"].str.len() > 50, "username", "is longer than 50 characters")
+        fail(data["full_name"].str.len() > 100, "full_name", "is longer than 100 characters")
+        fail((data["username"] != "") & data["username"].duplicated(), "username", "appears more than once in the file")
+        # Usernames are unique across all organizations
+        names = data["username"][data["username"] != ""].unique().tolist()
+        taken = set()
+        if names:
+            result = conn.unscoped.execute(
+                text('SELECT username FROM employees WHERE username IN :names').bindparams(bindparam('names', expanding=True)),
+                {'names': names}
+            )
+            taken = {row[0] for row in result.fetchall()}
+        fail(data["username"].isin(taken), "username", "already exists")
+        data["profile_pic_url"] = data["profile_pic_url"].mask(data["profile_pic_url"] == "", DEFAULT_PROFILE_PIC)
+        data["is_active"] = data["is_active"].fillna(True)
+        data["is_admin"] = data["is_admin"].fillna(False)
+    else:
+        result = conn.execute(text('SELECT username, id, is_admin FROM employees WHERE org_id = :org_id'))
+        employees = {row[0]: (row[1], row[2]) for row in result.fetchall()}
+        known = data["username"].isin(list(employees))
+        fail((data["username"] != "") & ~known, "username", "is not an employee of this organization")
+        data["employee_id"] = data["username"].map({name: employee[0] for name, employee in employees.items()})
+
+        if kind == "tasks":
+            data["is_completed"] = data["is_completed"].fillna(False)
+        else:
+            admins = [name for name, employee in employees.items() if employee[1]]
+            fail(data["username"].isin(admins), "username", "is an administrator; administrators do not submit reports")
+            fail(data.duplicated(["username", "report_date"]) & known & data["report_date"].notna(), "report_date",
+                 "appears more than once for this employee")
+            if archived_before is not None:
+                fail(data["report_date"].map(lambda day: day is not None and day < archived_before), "report_date",
+                     f"is in the archived period before {archived_before.isoformat()}")
+
+    errors = (pd.concat(problems).sort_values("line", kind="stable").reset_index(drop=True)
+              if problems else pd.DataFrame(columns=["line", "column", "message"]))
+    valid = data[~data["line"].isin(errors["line"])]
+    valid = valid[list(spec["stage"]) + ["line"]]
+    if "employee_id" in valid:
+        valid = valid.astype({"employee_id": int})
+    return valid, errors
+
+
+# Loads validated rows in the caller's transaction. progress(done, total) is
+# called after each chunk reaches the staging table. Returns the number of
+# rows written to the real table.
+def load(conn, db, kind, valid, org_id, progress=None):
+    spec = IMPORT_KINDS[kind]
+    conn = tenancy.scoped(conn, org_id)
+    columns = list(spec["stage"])
+    rows = list(zip(*(as_python(valid[column]).tolist() for column in columns)))
+
+    conn.execute(text('DROP TABLE IF EXISTS import_stage'))
+    conn.execute(text(f'''
+    CREATE TEMPORARY TABLE import_stage ({", ".join(f"{column} {column_type}" for column, column_type in spec["stage"].items())})
+    '''))
+    for start in range(0, len(rows), IMPORT_CHUNK_SIZE):
+        db.copy_rows(conn, "import_stage", columns, rows[start:start + IMPORT_CHUNK_SIZE])
+        if progress:
+            progress(min(start + IMPORT_CHUNK_SIZE, len(rows)), len(rows))
+
+    result = conn.execute(text(spec["merge"]))
+    conn.execute(text('DROP TABLE import_stage'))
+    return result.rowcount
+
+
+# Header-only template for the download button
+def template_csv(kind):
+    spec = IMPORT_KINDS[kind]
+    buffer = io.StringIO()
+    pd.DataFrame(columns=spec["required"] + spec["optional"]).to_csv(buffer, index=False)
+    return buffer.getvalue()
@@ -0,0 +1,246 @@
+import contextlib
+import contextvars
+import threading
+import time
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# Metrics
+# Counters, histograms and gauges for the load the app is under, served in the
+# Prometheus text format by server.py at /metrics. They live in this module
+# rather than in app.py, which "streamlit run app.py" re-executes on every
+# rerun, so they count for the whole process. Each process reports its own
+# figures; Prometheus adds them up across replicas.
+#
+# Query latency is recorded for every statement on every engine and labelled
+# with the page whose script run issued it; statements from background threads
+# (write queues, the audit log, workers) are labelled "background".
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+PAGE_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+PDF_BUCKETS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+BACKGROUND = "background"
+current_run = contextvars.ContextVar("metrics_run", default=None)
+
+
+def escape_label(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def format_labels(names, values):
+    if not names:
+        return ""
+    return "{" + ",".join(f'{name}="{escape_label(value)}"' for name, value in zip(names, values)) + "}"
+
+
+def format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels[name] for name in self.labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            values = dict(self._values)
+        for key, value in sorted(values.items()):
+            yield self.name + "_total", self.labels, key, value
+
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labels=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets) + (float("inf"),)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(labels[name] for name in self.labels)
+        with self._lock:
+            counts, total = self._values.get(key) or ([0] * len(self.buckets), 0.0)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+                    break
+            self._values[key] = (counts, total + value)
+
+    @contextlib.contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    # Bucket counts are cumulative in the exposition format
+    def samples(self):
+        with self._lock:
+            values = {key: (list(counts), total) for key, (counts, total) in self._values.items()}
+        names = self.labels + ("le",)
+        for key, (counts, total) in sorted(values.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                yield self.name + "_bucket", names, key + (format_value(bound),), cumulative
+            yield self.name + "_sum", self.labels, key, total
+            yield self.name + "_count", self.labels, key, cumulative
+
+
+# A gauge read when the metrics are scraped: collect() returns
+# {label values: value}
+class Gauge:
+    kind = "gauge"
+
+    def __init__(self, name, documentation, collect, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self.collect = collect
+
+    def samples(self):
+        for key, value in sorted(self.collect().items()):
+            yield self.name, self.labels, key, value
+
+
+REGISTRY = []
+
+
+def register(metric):
+    REGISTRY.append(metric)
+    return metric
+
+
+def render():
+    lines = []
+    for metric in REGISTRY:
+        lines.append(f"# HELP {metric.name} {metric.documentation}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        for name, label_names, label_values, value in metric.samples():
+            lines.append(f"{name}{format_labels(label_names, label_values)} {format_value(value)}")
+    return "\n".join(lines) + "\n"
+
+
+script_runs = register(Counter("ems_script_runs", "Script runs (reruns) by page", ["page"]))
+page_seconds = register(Histogram("ems_page_seconds", "Time to run a page's script", ["page"], PAGE_BUCKETS))
+script_errors = register(Counter("ems_script_errors", "Script runs that raised an exception"))
+query_seconds = register(Histogram("ems_query_seconds", "Database statement latency by page", ["page"]))
+pdf_seconds = register(Histogram("ems_pdf_build_seconds", "Time to build a report PDF", buckets=PDF_BUCKETS))
+cache_lookups = register(Counter("ems_cache_lookups", "Lookups in the app's caches", ["cache"]))
+cache_misses = register(Counter("ems_cache_misses", "Cache lookups that had to read the database", ["cache"]))
+
+
+# A script run, labelled with its page. main() starts one per rerun under the
+# user's role and the dashboard narrows it to the page picked from the menu,
+# so queries made before the menu is drawn still count toward the page. Also a
+# decorator, for fragments, which rerun without main(); inside a run it only
+# sets the page.
+@contextlib.contextmanager
+def script_run(name):
+    if current_run.get() is not None:
+        set_page(name)
+        yield
+        return
+    run = {"page": name}
+    token = current_run.set(run)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        current_run.reset(token)
+        script_runs.inc(page=run["page"])
+        page_seconds.observe(time.perf_counter() - start, page=run["page"])
+
+
+def set_page(name):
+    run = current_run.get()
+    if run is not None:
+        run["page"] = name
+
+
+def current_page():
+    run = current_run.get()
+    return run["page"] if run else BACKGROUND
+
+
+# Statement timing, for every engine in the process
+@event.listens_for(Engine, "before_cursor_execute")
+def start_query_timer(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def stop_query_timer(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info.get("query_started")
+    if started:
+        query_seconds.observe(time.perf_counter() - started.pop(), page=current_page())
+
+
+# A failed statement has no after_cursor_execute
+@event.listens_for(Engine, "handle_error")
+def drop_query_timer(context):
+    started = context.connection.info.get("query_started") if context.connection is not None else None
+    if started:
+        started.pop()
+
+
+# Connection pools
+# Pools are tracked by name ("primary", "replica_1", ...); an engine created
+# again under the same name, e.g. after its cache was cleared, replaces the old
+# one.
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def track_pool(name, engine):
+    with _pools_lock:
+        _pools[name] = engine.pool
+
+
+# (in use, capacity) per pool; pools without a fixed size (SQLite in memory)
+# report only the connections in use
+def pool_usage():
+    with _pools_lock:
+        pools = dict(_pools)
+    usage = {}
+    for name, pool in pools.items():
+        in_use = pool.checkedout() if hasattr(pool, "checkedout") else 0
+        if hasattr(pool, "size") and hasattr(pool, "_max_overflow") and pool._max_overflow >= 0:
+            capacity = pool.size() + pool._max_overflow
+        else:
+            capacity = float("inf")
+        usage[name] = (in_use, capacity)
+    return usage
+
+
+register(Gauge(
+    "ems_db_pool_in_use", "Database connections checked out of the pool",
+    lambda: {(name,): in_use for name, (in_use, capacity) in pool_usage().items()}, ["pool"],
+))
+register(Gauge(
+    "ems_db_pool_capacity", "Connections the pool can hand out, overflow included",
+    lambda: {(name,): capacity for name, (in_use, capacity) in pool_usage().items() if capacity != float("inf")}, ["pool"],
+))
+register(Gauge(
+    "ems_db_pool_saturation", "Share of the pool's capacity in use",
+    lambda: {(name,): in_use / capacity for name, (in_use, capacity) in pool_usage().items()
+             if capacity and capacity != float("inf")}, ["pool"],
+))
@@ -0,0 +1,179 @@
+import abc
+import json
+import select
+import threading
+import time
+import uuid
+from collections import defaultdict
+
+from sqlalchemy import event, text
+
+
+# Change notifications
+# Write paths call notify(conn, topic, key) inside their transaction. Once the
+# transaction commits, every process serving the app hears about the change:
+# counters for the topic and for the topic/key pair go up, and subscribers run.
+# Caches put those counters in their keys, so a change to one employee's reports
+# only invalidates that employee's cached views. Changes tagged with an org also
+# count per organization, so one tenant's writes leave other tenants' caches warm.
+CHANNEL = "ems_changes"
+
+
+# Versions, waiting and subscriber dispatch; subclasses deliver the changes
+class ChangeBus(abc.ABC):
+    def __init__(self):
+        self._versions = defaultdict(int)
+        self._subscribers = []
+        self._changed = threading.Condition()
+
+    def version(self, topic, key=None):
+        return self._versions[(topic, key)]
+
+    def versions(self, *topics):
+        return tuple(self._versions[(topic, None)] for topic in topics)
+
+    def org_versions(self, org, *topics):
+        return tuple(self._versions[(topic, ("org", org))] for topic in topics)
+
+    def subscribe(self, callback, topics=None):
+        self._subscribers.append((callback, set(topics) if topics else None))
+
+    # Block until any of the topics changes or the timeout passes; returns the
+    # new versions so callers can tell whether anything happened
+    def wait_for_change(self, topics, since, timeout):
+        deadline = time.monotonic() + timeout
+        with self._changed:
+            while self.versions(*topics) == since:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._changed.wait(remaining)
+            return self.versions(*topics)
+
+    # Stages a change on the writer's connection, delivered once it commits
+    @abc.abstractmethod
+    def notify(self, conn, topic, key=None, **data):
+        pass
+
+    def _dispatch(self, change):
+        topic, key, org = change.get("topic"), change.get("key"), change.get("org")
+        with self._changed:
+            self._versions[(topic, None)] += 1
+            if key is not None:
+                self._versions[(topic, key)] += 1
+            if org is not None:
+                self._versions[(topic, ("org", org))] += 1
+            else:
+                # Not tied to one organization, so every organization's view is stale
+                for version_key in list(self._versions):
+                    if version_key[0] == topic and isinstance(version_key[1], tuple):
+                        self._versions[version_key] += 1
+            self._changed.notify_all()
+        for callback, topics in self._subscribers:
+            if topics is None or topic in topics:
+                try:
+                    callback(change)
+                except Exception:
+                    pass
+
+    # Something may have been missed, e.g. while the listener was reconnecting;
+    # treat every known topic and key as changed
+    def _resync(self):
+        with self._changed:
+            for version_key in list(self._versions):
+                self._versions[version_key] += 1
+            self._changed.notify_all()
+        for callback, topics in self._subscribers:
+            try:
+                callback({"topic": None, "key": None, "resync": True})
+            except Exception:
+                pass
+
+
+# In-process bus for the SQLite backend and single-process deployments.
+# Changes are staged on the connection and dispatched when the connection goes
+# back to the pool, which is after commit; rolled-back changes are dropped.
+class LocalChangeBus(ChangeBus):
+    def __init__(self, engine):
+        super().__init__()
+        event.listen(engine, "commit", self._on_commit)
+        event.listen(engine, "rollback", self._on_rollback)
+        event.listen(engine.pool, "checkin", self._on_checkin)
+
+    def notify(self, conn, topic, key=None, **data):
+        conn.info.setdefault("staged_changes", []).append({"topic": topic, "key": key, **data})
+
+    def _on_commit(self, conn):
+        staged = conn.info.pop("staged_changes", [])
+        conn.info.setdefault("committed_changes", []).extend(staged)
+
+    def _on_rollback(self, conn):
+        conn.info.pop("staged_changes", None)
+
+    def _on_checkin(self, dbapi_connection, connection_record):
+        if connection_record is None:
+            return
+        connection_record.info.pop("staged_changes", None)
+        for change in connection_record.info.pop("committed_changes", []):
+            self._dispatch(change)
+
+
+# Postgres LISTEN/NOTIFY bus. pg_notify runs inside the writer's transaction, so
+# Postgres only delivers it on commit, and every app process receives it on a
+# dedicated listening connection. The writing process also dispatches locally
+# after commit so its own next rerun never reads a stale cache; payloads carry
+# the bus's id so the listener skips the ones it already dispatched.
+class PostgresChangeBus(LocalChangeBus):
+    def __init__(self, engine, poll_timeout=5.0):
+        super().__init__(engine)
+        self.engine = engine
+        self.poll_timeout = poll_timeout
+        self.source = uuid.uuid4().hex
+        self._thread = threading.Thread(target=self._listen, name="change-listener", daemon=True)
+        self._thread.start()
+
+    def notify(self, conn, topic, key=None, **data):
+        payload = json.dumps({"topic": topic, "key": key, **data, "source": self.source}, default=str)
+        conn.execute(text("SELECT pg_notify(:channel, :payload)"), {"channel": CHANNEL, "payload": payload})
+        super().notify(conn, topic, key, **data)
+
+    def _listen(self):
+        backoff = 1.0
+        while True:
+            connection = None
+            try:
+                connection = self.engine.raw_connection()
+                connection.detach()
+                dbapi_connection = connection.driver_connection
+                dbapi_connection.autocommit = True
+                with dbapi_connection.cursor() as cursor:
+                    cursor.execute(f"LISTEN {CHANNEL}")
+                self._resync()
+                backoff = 1.0
+                while True:
+                    if select.select([dbapi_connection], [], [], self.poll_timeout) == ([], [], []):
+                        continue
+                    dbapi_connection.poll()
+                    while dbapi_connection.notifies:
+                        notification = dbapi_connection.notifies.pop(0)
+                        try:
+                            change = json.loads(notification.payload)
+                        except ValueError:
+                            continue
+                        if change.pop("source", None) != self.source:
+                            self._dispatch(change)
+            except Exception:
+                time.sleep(backoff)
+                backoff = min(backoff * 2, 30.0)
+            finally:
+                if connection is not None:
+                    try:
+                        connection.close()
+                    except Exception:
+                        pass
+
+
+def create_change_bus(backend):
+    if backend.name == "postgresql" and backend.engine.dialect.driver == "psycopg2":
+        return PostgresChangeBus(backend.engine)
+    return LocalChangeBus(backend.engine)
@@ -0,0 +1,286 @@
+import argparse
+import datetime
+import json
+import logging
+import os
+import time
+from urllib.parse import unquote, urlparse
+
+from sqlalchemy import bindparam, text
+
+import app as ems
+from backends import as_date
+
+# The app's caches warn on every call made outside a Streamlit script run
+logging.getLogger("streamlit.runtime.scriptrunner_utils.script_run_context").setLevel(logging.ERROR)
+logger = logging.getLogger("reminders")
+
+
+# Task reminders
+# A worker process reminds employees of open tasks that are due soon or
+# overdue, and tells an organization's admins about tasks still open
+# REMINDER_ESCALATE_AFTER_DAYS after their due date. Each employee gets one
+# notification per run listing all of their tasks, and each organization one
+# escalation. The stage sent for a task is recorded in task_reminders, so a
+# task is reminded once per stage.
+#
+# Runs are incremental. A task only changes stage when the date moves past a
+# point fixed by its due date, so the tasks that may have changed since the
+# previous run are those due inside a window starting from that run's date,
+# plus tasks created since then. Both are read in one query through the
+# partial index of open tasks with a due date; a run reads the tasks that
+# became due since the last one, not every overdue task on record. A task
+# reopened after its reminder window has passed is not reminded again.
+#     python reminders.py          (checks every REMINDER_CHECK_SECONDS)
+#     python reminders.py --once   (from cron)
+# Settings: [reminders] notifier (REMINDER_NOTIFIER), due_soon_days
+# (REMINDER_DUE_SOON_DAYS) and escalate_after_days (REMINDER_ESCALATE_AFTER_DAYS).
+REMINDER_CHECK_SECONDS = 900
+REMINDER_DUE_SOON_DAYS = 1
+REMINDER_ESCALATE_AFTER_DAYS = 3
+DEFAULT_NOTIFIER = "log:"
+
+DUE_SOON, OVERDUE, ESCALATED = 1, 2, 3
+
+
+# Notifiers
+# A notifier delivers one notification and is chosen by URL, like the digest
+# sinks:
+#     log:                            (the worker's log)
+#     file:///var/lib/ems/reminders   (appends JSON lines to reminders.jsonl)
+class LogNotifier:
+    def __init__(self, url):
+        pass
+
+    def notify(self, notification):
+        logger.info("%s: %s\n%s", notification['recipients'], notification['subject'], notification['body'])
+
+
+class FileNotifier:
+    def __init__(self, url):
+        parsed = urlparse(url)
+        directory = unquote(parsed.netloc + parsed.path)
+        os.makedirs(directory, exist_ok=True)
+        self.path = os.path.join(directory, "reminders.jsonl")
+
+    def notify(self, notification):
+        with open(self.path, "a", encoding="utf-8") as file:
+            file.write(json.dumps(notification, default=str) + "\n")
+
+
+NOTIFIERS = {
+    "log": LogNotifier,
+    "file": FileNotifier,
+}
+
+
+def create_notifier(url):
+    scheme = url.split(":", 1)[0]
+    if scheme not in NOTIFIERS:
+        raise ValueError(f"Unsupported reminder notifier: {scheme}")
+    return NOTIFIERS[scheme](url)
+
+
+# Open tasks of active employees whose stage is past the one last sent for
+# them, with the stage they are at now and the one sent before (0 for none).
+# Deleted tasks are skipped. A reminder sent for an earlier due date does not count.
+DUE_TASKS_SQL = '''
+SELECT id, org_id, employee_id, username, full_name, task_description, due_date, stage, sent_stage
+FROM (
+    SELECT t.id, t.org_id, t.employee_id, e.username, e.full_name, t.task_description, t.due_date,
+        CASE WHEN t.due_date < :escalate_before THEN 3 WHEN t.due_date < :today THEN 2 ELSE 1 END AS stage,
+        CASE WHEN r.due_date = t.due_date THEN r.stage ELSE 0 END AS sent_stage
+    FROM tasks t
+    JOIN employees e ON t.employee_id = e.id
+    LEFT JOIN task_reminders r ON r.task_id = t.id
+    WHERE t.id IN (
+        SELECT id FROM tasks
+        WHERE is_completed = FALSE AND due_date IS NOT NULL AND deleted_at IS NULL
+        AND due_date >= :window_start AND due_date <= :due_soon
+        UNION
+        SELECT id FROM tasks WHERE id > :last_task_id
+    )
+    AND t.is_completed = FALSE AND t.due_date <= :due_soon AND t.deleted_at IS NULL AND e.is_active = TRUE
+) due
+WHERE stage > sent_stage
+ORDER BY org_id, employee_id, due_date
+'''
+
+
+def task_line(task):
+    return f"- {task['task_description']} (due {ems.format_due_date(task['due_date'])})"
+
+
+def employee_notification(employee, tasks):
+    overdue = [task for task in tasks if task['stage'] >= OVERDUE]
+    due_soon = [task for task in tasks if task['stage'] == DUE_SOON]
+    parts = []
+    if overdue:
+        parts.append("Overdue:\n" + "\n".join(task_line(task) for task in overdue))
+    if due_soon:
+        parts.append("Due soon:\n" + "\n".join(task_line(task) for task in due_soon))
+    return {
+        'org_id': employee['org_id'],
+        'recipients': [employee['username']],
+        'subject': f"{employee['full_name']}: {len(overdue)} overdue and {len(due_soon)} upcoming tasks",
+        'body': "\n\n".join(parts),
+        'task_ids': [task['id'] for task in tasks],
+    }
+
+
+def escalation_notification(org_id, admins, tasks, escalate_after_days):
+    employees = {}
+    for task in tasks:
+        employees.setdefault(task['full_name'], []).append(task)
+    return {
+        'org_id': org_id,
+        'recipients': admins,
+        'subject': f"{len(tasks)} tasks more than {escalate_after_days} days overdue",
+        'body': "\n\n".join(
+            f"{name}:\n" + "\n".join(task_line(task) for task in employee_tasks)
+            for name, employee_tasks in employees.items()
+        ),
+        'task_ids': [task['id'] for task in tasks],
+    }
+
+
+class ReminderScheduler:
+    def __init__(self, notifier, due_soon_days=REMINDER_DUE_SOON_DAYS, escalate_after_days=REMINDER_ESCALATE_AFTER_DAYS):
+        self.notifier = notifier
+        self.due_soon_days = due_soon_days
+        self.escalate_after_days = escalate_after_days
+
+    # Send every reminder that is due; returns the number of notifications sent
+    def run_due(self):
+        with ems.engine.connect() as conn:
+            if ems.db.name == "postgresql":
+                # One worker sends reminders at a time
+                if not conn.execute(text("SELECT pg_try_advisory_lock(hashtext('ems_reminders'))")).scalar():
+                    return 0
+            try:
+                return self.send_reminders(conn)
+            finally:
+                if ems.db.name == "postgresql":
+                    # A failed run leaves the transaction aborted; the session-level
+                    # lock outlives it and has to be released on this connection
+                    conn.rollback()
+                    conn.execute(text("SELECT pg_advisory_unlock(hashtext('ems_reminders'))"))
+                    conn.commit()
+
+    def send_reminders(self, conn, today=None):
+        today = today or datetime.date.today()
+        last_run = conn.execute(text('SELECT run_date, last_task_id FROM reminder_runs ORDER BY id DESC LIMIT 1')).fetchone()
+        last_task_id = conn.execute(text('SELECT COALESCE(MAX(id), 0) FROM tasks')).scalar()
+        # Stage changes since the last run: escalations of tasks due from
+        # escalate_after_days before it, up to reminders for tasks due soon
+        if last_run:
+            window_start = as_date(last_run[0]) - datetime.timedelta(days=self.escalate_after_days + 1)
+            window_task_id = last_run[1]
+        else:
+            window_start = datetime.date.min
+            window_task_id = 0
+        result = conn.execute(text(DUE_TASKS_SQL), {
+            'today': today,
+            'due_soon': today + datetime.timedelta(days=self.due_soon_days),
+            'escalate_before': today - datetime.timedelta(days=self.escalate_after_days),
+            'window_start': window_start,
+            'last_task_id': window_task_id,
+        })
+        tasks = [row._asdict() for row in result.fetchall()]
+        for task in tasks:
+            task['due_date'] = as_date(task['due_date'])
+        conn.commit()
+
+        # Employees hear about a task once, when it is due soon and again when
+        # it is overdue; admins when it is escalated
+        employees = {}
+        escalations = {}
+        for task in tasks:
+            if task['sent_stage'] < OVERDUE:
+                employees.setdefault(task['employee_id'], []).append(task)
+            if task['stage'] == ESCALATED:
+                escalations.setdefault(task['org_id'], []).append(task)
+
+        sent = 0
+        failed = False
+        for employee_tasks in employees.values():
+            notification = employee_notification(employee_tasks[0], employee_tasks)
+            failed |= not self.deliver(conn, notification, [
+                (task, min(task['stage'], OVERDUE)) for task in employee_tasks
+            ])
+            sent += 1
+
+        if escalations:
+            result = conn.execute(text('''
+            SELECT org_id, username FROM employees
+            WHERE is_admin = TRUE AND is_active = TRUE AND org_id IN :org_ids
+            ORDER BY username
+            ''').bindparams(bindparam('org_ids', expanding=True)), {'org_ids': list(escalations)})
+            admins = {}
+            for org_id, username in result.fetchall():
+                admins.setdefault(org_id, []).append(username)
+            conn.commit()
+            for org_id, org_tasks in escalations.items():
+                notification = escalation_notification(org_id, admins.get(org_id, []), org_tasks, self.escalate_after_days)
+                failed |= not self.deliver(conn, notification, [(task, ESCALATED) for task in org_tasks])
+                sent += 1
+
+        # A run with failed deliveries leaves the window where it was, so the
+        # next run retries them; the delivered ones are already recorded
+        if not failed:
+            conn.execute(text('''
+            INSERT INTO reminder_runs (run_date, last_task_id, notifications)
+            VALUES (:run_date, :last_task_id, :notifications)
+            '''), {'run_date': today, 'last_task_id': last_task_id, 'notifications': sent})
+            conn.commit()
+        return sent
+
+    # Delivers one notification and records the stage sent for its tasks
+    def deliver(self, conn, notification, stages):
+        try:
+            self.notifier.notify(notification)
+        except Exception:
+            logger.exception("Reminder to %s failed", notification['recipients'])
+            return False
+        conn.execute(text('''
+        INSERT INTO task_reminders (task_id, due_date, stage, sent_at)
+        VALUES (:task_id, :due_date, :stage, CURRENT_TIMESTAMP)
+        ON CONFLICT (task_id) DO UPDATE
+        SET due_date = EXCLUDED.due_date, stage = EXCLUDED.stage, sent_at = EXCLUDED.sent_at
+        '''), [{'task_id': task['id'], 'due_date': task['due_date'], 'stage': stage} for task, stage in stages])
+        conn.commit()
+        return True
+
+    def run_forever(self, check_seconds=REMINDER_CHECK_SECONDS):
+        while True:
+            try:
+                sent = self.run_due()
+                if sent:
+                    logger.info("Sent %d task reminders", sent)
+            except Exception:
+                logger.exception("Reminder run failed")
+            time.sleep(check_seconds)
+
+
+def create_scheduler():
+    return ReminderScheduler(
+        create_notifier(ems.get_setting("reminders", "notifier", env="REMINDER_NOTIFIER") or DEFAULT_NOTIFIER),
+        due_soon_days=int(ems.get_setting("reminders", "due_soon_days", env="REMINDER_DUE_SOON_DAYS") or REMINDER_DUE_SOON_DAYS),
+        escalate_after_days=int(ems.get_setting("reminders", "escalate_after_days", env="REMINDER_ESCALATE_AFTER_DAYS")
+                                or REMINDER_ESCALATE_AFTER_DAYS),
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Send task due-date reminders and overdue escalations")
+    parser.add_argument("--once", action="store_true", help="send the reminders that are due and exit")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    if not ems.init_services():
+        raise SystemExit("Failed to connect to the database. Please check your database configuration.")
+    scheduler = create_scheduler()
+    if args.once:
+        scheduler.run_due()
+    else:
+        scheduler.run_forever()
@@ -0,0 +1,79 @@
+import functools
+import html
+from string import Template
+
+
+# HTML fragments for report and task lists
+# A whole list section is rendered into one string and sent with a single
+# st.markdown call instead of one call (and one browser delta) per row. All
+# user-supplied text is escaped here. Items are joined without blank lines so
+# the fragment stays one HTML block that markdown leaves untouched.
+REPORT_ITEM = Template('<div class="report-item">$header<p>$body</p></div>')
+TASK_ITEM = Template('<div class="task-item$status_class">$header<p>$body</p>$footer</div>')
+SECTION_TITLE = Template('<h5 style="margin: 1rem 0 0.5rem 0;">$title</h5>')
+TASK_STATUS_FOOTER = Template(
+    '<div style="display: flex; justify-content: space-between; align-items: center;">'
+    '<span style="color: #777; font-size: 0.8rem;">Created: $created</span>'
+    '<span style="font-weight: 600; color: $color;">$status</span>'
+    '</div>'
+)
+TASK_CREATED_FOOTER = Template('<div style="text-align: right; color: #777; font-size: 0.8rem;">Created: $created</div>')
+
+
+def escape(value):
+    return html.escape(str(value)) if value is not None else ""
+
+
+# Escaped body text with line breaks kept, optionally shortened for previews
+def body_text(value, limit=None):
+    value = value or ""
+    if limit and len(value) > limit:
+        value = value[:limit] + "..."
+    return escape(value).replace("\r\n", "\n").replace("\n", "<br>")
+
+
+# Report dates repeat across pages and reruns, so their labels are memoized
+@functools.lru_cache(maxsize=4096)
+def long_date(day):
+    return day.strftime('%A, %d %b %Y')
+
+
+def strong(value):
+    return f"<strong>{escape(value)}</strong>"
+
+
+def muted(value):
+    return f'<span style="color: #777;">{escape(value)}</span>'
+
+
+def section_title(title):
+    return SECTION_TITLE.substitute(title=escape(title))
+
+
+def report_item(header, text, limit=None):
+    return REPORT_ITEM.substitute(header=header, body=body_text(text, limit))
+
+
+def task_item(header, text, footer="", completed=False, limit=None):
+    return TASK_ITEM.substitute(
+        header=header,
+        body=body_text(text, limit),
+        footer=footer,
+        status_class=" completed" if completed else "",
+    )
+
+
+def task_status_footer(created, is_completed):
+    return TASK_STATUS_FOOTER.substitute(
+        created=escape(created),
+        color="#9e9e9e" if is_completed else "#4CAF50",
+        status="Completed" if is_completed else "Pending",
+    )
+
+
+def task_created_footer(created):
+    return TASK_CREATED_FOOTER.substitute(created=escape(created))
+
+
+def join(items):
+    return "".join(items)
@@ -0,0 +1,80 @@
+import itertools
+import threading
+import time
+
+from sqlalchemy import event
+
+
+# Read replicas
+# Read-only queries that can tolerate a little lag go to a replica, picked
+# round-robin among the replicas that passed their last health check; writes
+# and everything else stay on the primary. Replication is asynchronous, so
+# reads fall back to the primary for read_your_writes seconds after a commit
+# by the same owner (usually the logged-in user) and after a change notification
+# for the reader's organization (or for every organization). Otherwise a write,
+# or a cache filled just after one, could come from a replica that has not
+# applied it yet. Other organizations' writes leave the replicas in use.
+class ReplicaSet:
+    def __init__(self, primary, replicas, read_your_writes=5.0, health_interval=10.0, max_lag=30.0, owner=None):
+        self.primary = primary
+        self.replicas = list(replicas)
+        self.read_your_writes = read_your_writes
+        self.health_interval = health_interval
+        self.max_lag = max_lag
+        self.owner = owner
+        self._healthy = list(self.replicas)
+        self._next = itertools.count()
+        self._last_write = {}
+        self._last_change = {}
+        self._lock = threading.Lock()
+        event.listen(primary.engine, "commit", self._on_commit)
+        if self.replicas:
+            self._thread = threading.Thread(target=self._check_health, name="replica-health", daemon=True)
+            self._thread.start()
+
+    # Engine for a read-only query on behalf of owner, in organization org
+    def read_engine(self, owner=None, org=None):
+        return self.read_backend(owner, org).engine
+
+    # The primary or replica backend read_engine's engine belongs to
+    def read_backend(self, owner=None, org=None):
+        with self._lock:
+            healthy = self._healthy
+            now = time.monotonic()
+            last_change = max(self._last_change.get(None, 0.0), self._last_change.get(org, 0.0))
+            fresh = now - last_change < self.read_your_writes
+            if owner is not None and now - self._last_write.get(owner, 0.0) < self.read_your_writes:
+                fresh = True
+        if not healthy or fresh:
+            return self.primary
+        return healthy[next(self._next) % len(healthy)]
+
+    def record_write(self, owner):
+        if owner is None:
+            return
+        with self._lock:
+            self._last_write[owner] = time.monotonic()
+
+    # Change bus subscriber; changes without an organization concern them all
+    def record_change(self, change):
+        with self._lock:
+            self._last_change[change.get("org")] = time.monotonic()
+
+    def _on_commit(self, conn):
+        if self.owner:
+            self.record_write(self.owner())
+
+    def _check_health(self):
+        while True:
+            healthy = [replica for replica in self.replicas if self._is_healthy(replica)]
+            with self._lock:
+                self._healthy = healthy
+            time.sleep(self.health_interval)
+
+    def _is_healthy(self, replica):
+        try:
+            with replica.engine.connect() as conn:
+                lag = replica.replication_lag(conn)
+            return lag is None or lag <= self.max_lag
+        except Exception:
+            return False
@@ -0,0 +1,285 @@
+import datetime
+import os
+import re
+
+import pandas as pd
+from sqlalchemy import text
+
+from backends import as_date
+
+
+# Report storage tiers
+# daily_reports grows by employees x working days forever. Two optional tiers
+# keep the live table bounded:
+# - partitioning (Postgres): daily_reports becomes a table partitioned by range
+#   of report_date, one partition per month or year, created ahead of time and
+#   on demand, so date-bounded queries only scan the partitions they touch;
+# - archive: periods older than archive_after_months are written to compressed
+#   Parquet files, one per period, and removed from the database (dropping
+#   the whole partition when partitioned). The archive stays searchable.
+#   A period's file is staged next to its final name and only published once
+#   the transaction removing its rows has committed, so a failed commit never
+#   leaves rows both archived and live.
+INTERVALS = ("monthly", "yearly")
+PARTITION_LOOKAHEAD = 3
+
+
+def period_start(day, interval):
+    return day.replace(day=1) if interval == "monthly" else day.replace(month=1, day=1)
+
+
+def next_period(start, interval):
+    if interval == "yearly":
+        return start.replace(year=start.year + 1)
+    return (start.replace(day=28) + datetime.timedelta(days=4)).replace(day=1)
+
+
+def period_suffix(start, interval):
+    return start.strftime('%Y_%m' if interval == "monthly" else '%Y')
+
+
+def add_months(day, months):
+    month = day.year * 12 + day.month - 1 + months
+    return datetime.date(month // 12, month % 12 + 1, 1)
+
+
+# Declarative range partitions of daily_reports on Postgres
+class ReportPartitions:
+    def __init__(self, interval):
+        if interval not in INTERVALS:
+            raise ValueError(f"Unknown partitioning interval: {interval}")
+        self.interval = interval
+        self._known = set()
+
+    def name(self, start):
+        return f"daily_reports_{period_suffix(start, self.interval)}"
+
+    def is_partitioned(self, conn):
+        result = conn.execute(text("SELECT relkind = 'p' FROM pg_class WHERE oid = to_regclass('daily_reports')"))
+        return bool(result.scalar())
+
+    # Rebuild an existing daily_reports as a partitioned table, in the caller's transaction
+    def convert(self, conn):
+        sequence = conn.execute(text("SELECT pg_get_serial_sequence('daily_reports', 'id')")).scalar()
+        conn.execute(text('ALTER TABLE daily_reports RENAME TO daily_reports_unpartitioned'))
+        conn.execute(text('ALTER INDEX IF EXISTS uq_daily_reports_employee_date RENAME TO uq_daily_reports_unpartitioned'))
+        conn.execute(text('ALTER INDEX IF EXISTS daily_reports_pkey RENAME TO daily_reports_unpartitioned_pkey'))
+        conn.execute(text('ALTER INDEX IF EXISTS idx_daily_reports_org_date RENAME TO idx_daily_reports_unpartitioned_org_date'))
+        # The primary key of a partitioned table has to include the partition key
+        conn.execute(text(f'''
+        CREATE TABLE daily_reports (
+            id INTEGER NOT NULL DEFAULT nextval('{sequence}'),
+            org_id INTEGER NOT NULL DEFAULT 1 REFERENCES organizations(id),
+            employee_id INTEGER REFERENCES employees(id),
+            report_date DATE NOT NULL,
+            report_text TEXT NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (id, report_date)
+        ) PARTITION BY RANGE (report_date)
+        '''))
+        conn.execute(text('CREATE UNIQUE INDEX uq_daily_reports_employee_date ON daily_reports (employee_id, report_date)'))
+        conn.execute(text('CREATE INDEX idx_daily_reports_org_date ON daily_reports (org_id, report_date)'))
+
+        first, last = conn.execute(text('SELECT MIN(report_date), MAX(report_date) FROM daily_reports_unpartitioned')).fetchone()
+        start = period_start(as_date(first) or datetime.date.today(), self.interval)
+        last = max(as_date(last) or start, datetime.date.today())
+        while start <= last:
+            self.ensure(conn, start)
+            start = next_period(start, self.interval)
+
+        conn.execute(text('''
+        INSERT INTO daily_reports (id, org_id, employee_id, report_date, report_text, created_at)
+        SELECT id, org_id, employee_id, report_date, report_text, created_at FROM daily_reports_unpartitioned
+        '''))
+        conn.execute(text(f'ALTER SEQUENCE {sequence} OWNED BY daily_reports.id'))
+        conn.execute(text('DROP TABLE daily_reports_unpartitioned'))
+
+    def ensure(self, conn, day):
+        start = period_start(day, self.interval)
+        if start in self._known:
+            return
+        # Bounds come from date objects, so inlining them is safe; DDL takes no parameters
+        conn.execute(text(f'''
+        CREATE TABLE IF NOT EXISTS {self.name(start)} PARTITION OF daily_reports
+        FOR VALUES FROM ('{start.isoformat()}') TO ('{next_period(start, self.interval).isoformat()}')
+        '''))
+        self._known.add(start)
+
+    def ensure_upcoming(self, conn, today):
+        start = period_start(today, self.interval)
+        for _ in range(PARTITION_LOOKAHEAD + 1):
+            self.ensure(conn, start)
+            start = next_period(start, self.interval)
+
+    def drop(self, conn, start):
+        conn.execute(text(f'DROP TABLE IF EXISTS {self.name(start)}'))
+        self._known.discard(start)
+
+
+# Parquet files holding archived periods, e.g. daily_reports_2023_04.parquet
+class ReportArchive:
+    COLUMNS = ["id", "employee_id", "report_date", "report_text", "created_at"]
+
+    def __init__(self, directory, interval="monthly"):
+        self.directory = directory
+        self.interval = interval
+        self._pattern = re.compile(r"^daily_reports_(\d{4})(?:_(\d{2}))?(\.parquet(?:\.staged)?)$")
+        os.makedirs(directory, exist_ok=True)
+
+    def path(self, start):
+        return os.path.join(self.directory, f"daily_reports_{period_suffix(start, self.interval)}.parquet")
+
+    def staged_path(self, start):
+        return self.path(start) + ".staged"
+
+    def periods(self, suffix=".parquet"):
+        periods = []
+        for name in os.listdir(self.directory):
+            match = self._pattern.match(name)
+            if match and match.group(3) == suffix:
+                periods.append(datetime.date(int(match.group(1)), int(match.group(2) or 1), 1))
+        return sorted(periods)
+
+    # First date still in the database, or None when nothing is archived
+    def live_from(self):
+        periods = self.periods()
+        return next_period(periods[-1], self.interval) if periods else None
+
+    # Periods written but not yet published
+    def staged(self):
+        return self.periods(suffix=".parquet.staged")
+
+    # Writes the period's file under its staged name; publish() makes it part of the archive
+    def stage(self, start, rows):
+        frame = pd.DataFrame(rows, columns=self.COLUMNS)
+        path = self.path(start)
+        if os.path.exists(path):
+            # Rows archived for this period earlier are kept
+            frame = pd.concat([pd.read_parquet(path), frame]).drop_duplicates("id", keep="last")
+        temporary = path + ".tmp"
+        frame.to_parquet(temporary, compression="zstd", index=False)
+        os.replace(temporary, self.staged_path(start))
+
+    def publish(self, start):
+        os.replace(self.staged_path(start), self.path(start))
+
+    def discard(self, start):
+        if os.path.exists(self.staged_path(start)):
+            os.remove(self.staged_path(start))
+
+    # Archived rows as (id, employee_id, report_date, report_text), reading only
+    # the files whose period overlaps the range
+    def search(self, start_date, end_date, employee_ids=None):
+        rows = []
+        for start in self.periods():
+            if next_period(start, self.interval) <= start_date or start > end_date:
+                continue
+            filters = [("report_date", ">=", start_date), ("report_date", "<=", end_date)]
+            if employee_ids is not None:
+                filters.append(("employee_id", "in", list(employee_ids)))
+            frame = pd.read_parquet(self.path(start), columns=self.COLUMNS[:4], filters=filters)
+            rows.extend(
+                (int(row.id), int(row.employee_id), as_date(row.report_date), row.report_text)
+                for row in frame.itertuples(index=False)
+            )
+        return rows
+
+
+class ReportStorage:
+    def __init__(self, backend, partitioning=None, archive_dir=None, archive_after_months=24):
+        self.backend = backend
+        self.partitions = None
+        if partitioning and backend.name == "postgresql":
+            self.partitions = ReportPartitions(partitioning)
+        interval = self.partitions.interval if self.partitions else "monthly"
+        self.archive = ReportArchive(archive_dir, interval) if archive_dir else None
+        # Keep every day the missing-reports summary still looks at in the database
+        self.archive_after_months = max(int(archive_after_months), 13)
+
+    # Run from init_db, after daily_reports exists
+    def setup(self, conn):
+        if self.partitions:
+            if not self.partitions.is_partitioned(conn):
+                self.partitions.convert(conn)
+            self.partitions.ensure_upcoming(conn, datetime.date.today())
+
+    # Run inside every transaction that writes a report for report_date
+    def prepare_write(self, conn, report_date):
+        if self.archive:
+            live_from = self.archive.live_from()
+            if live_from and report_date < live_from:
+                raise ValueError(f"Reports before {live_from.strftime('%d %b, %Y')} are archived and read-only")
+        if self.partitions:
+            self.partitions.ensure(conn, report_date)
+
+    # First date whose reports are in the database, or None when nothing is archived
+    def live_from(self):
+        return self.archive.live_from() if self.archive else None
+
+    # Periodic upkeep: create upcoming partitions and archive old periods.
+    # Returns the archived period starts; the caller commits and then calls
+    # publish() with them, or discard() if the commit fails.
+    def maintain(self, conn, today=None):
+        today = today or datetime.date.today()
+        if self.backend.name == "postgresql":
+            # One process does the upkeep at a time
+            if not conn.execute(text("SELECT pg_try_advisory_xact_lock(hashtext('daily_reports_storage'))")).scalar():
+                return []
+        if self.partitions:
+            self.partitions.ensure_upcoming(conn, today)
+        if not self.archive:
+            return []
+        self.recover(conn)
+
+        cutoff = period_start(add_months(today, -self.archive_after_months), self.archive.interval)
+        oldest = as_date(conn.execute(
+            text('SELECT MIN(report_date) FROM daily_reports WHERE report_date < :cutoff'), {'cutoff': cutoff}
+        ).scalar())
+        archived = []
+        start = period_start(oldest, self.archive.interval) if oldest else cutoff
+        while start < cutoff:
+            end = next_period(start, self.archive.interval)
+            result = conn.execute(text('''
+            SELECT id, employee_id, report_date, report_text, created_at
+            FROM daily_reports
+            WHERE report_date >= :start AND report_date < :end
+            '''), {'start': start, 'end': end})
+            rows = [tuple(row) for row in result.fetchall()]
+            if rows:
+                self.archive.stage(start, rows)
+                archived.append(start)
+            if self.partitions:
+                self.partitions.drop(conn, start)
+            elif rows:
+                conn.execute(text('DELETE FROM daily_reports WHERE report_date >= :start AND report_date < :end'), {'start': start, 'end': end})
+            start = end
+        return archived
+
+    def publish(self, archived):
+        for start in archived:
+            self.archive.publish(start)
+
+    def discard(self, archived):
+        for start in archived:
+            self.archive.discard(start)
+
+    # A staged file left by a process that stopped between commit and publish:
+    # if its period's rows are gone from the database the commit went through
+    def recover(self, conn):
+        for start in self.archive.staged():
+            end = next_period(start, self.archive.interval)
+            live_rows = conn.execute(text(
+                'SELECT 1 FROM daily_reports WHERE report_date >= :start AND report_date < :end LIMIT 1'
+            ), {'start': start, 'end': end}).fetchone()
+            if live_rows:
+                self.archive.discard(start)
+            else:
+                self.archive.publish(start)
+
+    def search_archive(self, start_date, end_date, employee_ids=None):
+        if not self.archive:
+            return []
+        live_from = self.archive.live_from()
+        if not live_from or start_date >= live_from:
+            return []
+        return self.archive.search(start_date, min(end_date, live_from - datetime.timedelta(days=1)), employee_ids)
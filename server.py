@@ -0,0 +1,117 @@
+import contextlib
+import logging
+import os
+
+import streamlit as st
+from sqlalchemy import text
+from starlette.concurrency import run_in_threadpool
+from starlette.responses import JSONResponse, Response
+from starlette.routing import Route
+from streamlit.runtime import Runtime
+
+import app as ems
+import metrics
+
+# The app's caches warn on every call made outside a Streamlit script run
+logging.getLogger("streamlit.runtime.scriptrunner_utils.script_run_context").setLevel(logging.ERROR)
+logger = logging.getLogger("server")
+
+# Server with health and metrics endpoints
+# Serves the Streamlit app together with endpoints for the orchestrator and
+# Prometheus, in place of "streamlit run app.py":
+#     uvicorn server:app --port 8501
+# /healthz   liveness: the process is up and serving requests
+# /readyz    readiness: the database answers through the pool, no pool is out
+#            of connections and the schema is at the newest migration;
+#            503 with the failing checks otherwise
+# /metrics   script runs and page time by page, query latency by page, PDF
+#            build time, cache lookups and misses, pool use and saturation,
+#            and browser sessions
+# The script is streamlit_app.py, which imports app like this module does, so
+# the checks and metrics see the same engines and pools that serve the pages.
+APP_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "streamlit_app.py")
+METRICS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+# Sessions are not listed publicly; see session_memory
+def session_counts():
+    if not Runtime.exists():
+        return {}
+    session_mgr = getattr(Runtime.instance(), "_session_mgr", None)
+    sessions = session_mgr.list_sessions() if session_mgr else []
+    connected = sum(1 for session_info in sessions if session_info.client is not None)
+    return {("connected",): connected, ("disconnected",): len(sessions) - connected}
+
+
+metrics.register(metrics.Gauge("ems_sessions", "Browser sessions held by the server", session_counts, ["state"]))
+
+
+# Failed checks map to a reason. A saturated pool is reported without waiting
+# for a connection from it.
+def check_readiness():
+    checks = {}
+    try:
+        if not ems.init_services():
+            return {"database": "not configured"}
+    except Exception as e:
+        return {"database": f"migrations failed: {e}"}
+
+    saturated = [name for name, (in_use, capacity) in metrics.pool_usage().items() if in_use >= capacity]
+    if saturated:
+        checks["pool"] = f"no free connections: {', '.join(saturated)}"
+        return checks
+    checks["pool"] = "ok"
+
+    try:
+        with ems.engine.connect() as conn:
+            conn.execute(text('SELECT 1'))
+            checks["database"] = "ok"
+            schema_current = ems.db.index_exists(conn, ems.LATEST_SCHEMA_INDEX)
+            checks["schema"] = "ok" if schema_current else f"missing {ems.LATEST_SCHEMA_INDEX}"
+    except Exception as e:
+        checks["database"] = f"unavailable: {e}"
+    return checks
+
+
+async def healthz(request):
+    return JSONResponse({"status": "ok"})
+
+
+async def readyz(request):
+    checks = await run_in_threadpool(check_readiness)
+    ready = all(result == "ok" for result in checks.values())
+    return JSONResponse({"status": "ready" if ready else "not ready", "checks": checks}, status_code=200 if ready else 503)
+
+
+async def metrics_endpoint(request):
+    return Response(metrics.render(), media_type=METRICS_CONTENT_TYPE)
+
+
+# Counted and then shown as usual
+def count_script_error(exception):
+    metrics.script_errors.inc()
+    return None
+
+
+# Migrations run before the first session; its first page load finds them done.
+# A database that is down at startup leaves the server running but not ready;
+# the readiness probe retries them.
+@contextlib.asynccontextmanager
+async def lifespan(app):
+    try:
+        await run_in_threadpool(ems.init_services)
+    except Exception:
+        logger.exception("Database initialization failed")
+    yield
+
+
+app = st.App(
+    APP_SCRIPT,
+    routes=[
+        Route("/healthz", healthz),
+        Route("/readyz", readyz),
+        Route("/metrics", metrics_endpoint),
+    ],
+    lifespan=lifespan,
+    on_script_error=count_script_error,
+)
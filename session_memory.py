@@ -0,0 +1,166 @@
+import logging
+import sys
+import threading
+import time
+
+import pandas as pd
+from streamlit.runtime import Runtime
+
+logger = logging.getLogger("session_memory")
+
+
+# Session memory accounting
+# Streamlit keeps every browser session's st.session_state in the server
+# process until the session ends. The monitor walks the sessions every
+# sweep_seconds, estimates the size of each session's state and counts its
+# widgets, and applies an eviction policy:
+# - entries listed as evictable (caches the app can rebuild from the database)
+#   are dropped from sessions idle for idle_evict_seconds, and from any session
+#   once they grow past large_entry_bytes and have sat unused for a sweep;
+# - sessions idle for idle_logout_seconds lose all their state, which logs the
+#   user out; the next interaction starts at the login page.
+# Activity is the time the app last ran a script for the session, recorded
+# with touch(). Disconnected sessions are closed by Streamlit itself after
+# server.disconnectedSessionTTL.
+ACTIVITY_KEY = "last_active"
+
+
+# Approximate deep size in bytes; shared objects are counted once
+def deep_size(value, seen=None):
+    seen = set() if seen is None else seen
+    if id(value) in seen:
+        return 0
+    seen.add(id(value))
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(deep=True).sum())
+    if isinstance(value, pd.Series):
+        return int(value.memory_usage(deep=True))
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        size += sum(deep_size(key, seen) + deep_size(item, seen) for key, item in value.items())
+    elif isinstance(value, (list, tuple, set, frozenset)):
+        size += sum(deep_size(item, seen) for item in value)
+    elif hasattr(value, "__dict__") and not isinstance(value, type):
+        size += deep_size(vars(value), seen)
+    return size
+
+
+class SessionMonitor:
+    def __init__(self, evictable, sweep_seconds=60, idle_evict_seconds=900,
+                 idle_logout_seconds=8 * 3600, large_entry_bytes=5 * 1024 * 1024):
+        self.evictable = set(evictable)
+        self.sweep_seconds = sweep_seconds
+        self.idle_evict_seconds = idle_evict_seconds
+        self.idle_logout_seconds = idle_logout_seconds
+        self.large_entry_bytes = large_entry_bytes
+        self._lock = threading.Lock()
+        self._snapshot = []
+        self._large_seen = {}
+        self._first_seen = {}
+        self.evicted_entries = 0
+        self.logged_out_sessions = 0
+        self._thread = threading.Thread(target=self._run, name="session-monitor", daemon=True)
+        self._thread.start()
+
+    # Per-session sizes from the last sweep, largest first
+    def snapshot(self):
+        with self._lock:
+            return list(self._snapshot)
+
+    def _run(self):
+        while True:
+            time.sleep(self.sweep_seconds)
+            try:
+                self.sweep()
+            except Exception:
+                logger.exception("Session sweep failed")
+
+    # The session list is not exposed publicly; without a running server
+    # (tests, bare mode) there is nothing to do
+    def _sessions(self):
+        if not Runtime.exists():
+            return []
+        session_mgr = getattr(Runtime.instance(), "_session_mgr", None)
+        return session_mgr.list_sessions() if session_mgr else []
+
+    def sweep(self, now=None):
+        now = now or time.time()
+        snapshot = []
+        live_ids = set()
+        for session_info in self._sessions():
+            session = session_info.session
+            live_ids.add(session.id)
+            # Leave sessions alone while their script is running
+            if getattr(getattr(session, "_state", None), "name", "") == "APP_IS_RUNNING":
+                continue
+            try:
+                stats = self._account(session.id, session.session_state, now)
+            except RuntimeError:
+                # The state changed while it was being walked; measured next sweep
+                continue
+            # Connected sessions are listed as ActiveSessionInfo, which has no is_active()
+            stats["connected"] = session_info.client is not None
+            snapshot.append(stats)
+
+        for session_id in list(self._first_seen):
+            if session_id not in live_ids:
+                del self._first_seen[session_id]
+        for key in list(self._large_seen):
+            if key[0] not in live_ids:
+                del self._large_seen[key]
+
+        snapshot.sort(key=lambda stats: stats["bytes"], reverse=True)
+        with self._lock:
+            self._snapshot = snapshot
+        total = sum(stats["bytes"] for stats in snapshot)
+        logger.debug("%d sessions, %.1f MB of session state", len(snapshot), total / 1e6)
+        return snapshot
+
+    def _account(self, session_id, state, now):
+        entries = state.filtered_state
+        self._first_seen.setdefault(session_id, now)
+        last_active = entries.get(ACTIVITY_KEY) or self._first_seen[session_id]
+        idle = now - last_active
+        user = entries.get("user") or {}
+
+        if idle > self.idle_logout_seconds and entries:
+            for key in entries:
+                self._drop(state, key)
+            self.logged_out_sessions += 1
+            entries = {}
+
+        sizes = {key: deep_size(value) for key, value in entries.items()}
+        for key, size in list(sizes.items()):
+            if key not in self.evictable:
+                continue
+            # A large entry is dropped once it has gone a whole sweep without a script run
+            large_since = self._large_seen.get((session_id, key)) if size > self.large_entry_bytes else None
+            if idle > self.idle_evict_seconds or (large_since and last_active < large_since):
+                self._drop(state, key)
+                self.evicted_entries += 1
+                del sizes[key]
+                self._large_seen.pop((session_id, key), None)
+            elif size > self.large_entry_bytes:
+                self._large_seen.setdefault((session_id, key), now)
+
+        largest = max(sizes, key=sizes.get) if sizes else None
+        return {
+            "session_id": session_id,
+            "user": user.get("username"),
+            "idle_seconds": int(idle),
+            "bytes": sum(sizes.values()),
+            "entries": len(sizes),
+            "widgets": len(state.get_widget_states()),
+            "largest_entry": largest,
+            "largest_bytes": sizes[largest] if largest else 0,
+        }
+
+    def _drop(self, state, key):
+        try:
+            del state[key]
+        except KeyError:
+            pass
+
+
+def touch(session_state):
+    session_state[ACTIVITY_KEY] = time.time()
@@ -0,0 +1,7 @@
+# Entry script for server.py
+# Streamlit executes its script as a fresh __main__ on every rerun. Importing
+# the app instead means the script and server.py's endpoints share one app
+# module, and so one set of engines, caches, queues and background threads.
+import app
+
+app.main()
@@ -0,0 +1,97 @@
+import contextlib
+import re
+import threading
+
+from sqlalchemy import text
+
+
+# Organization scoping
+# Every tenant table carries org_id. Queries on them run on a connection scoped
+# to one organization: it binds :org_id itself and refuses a statement on a
+# tenant table that does not use :org_id, so a query can neither leave out the
+# organization filter nor be handed another organization's id. The few lookups
+# that have to run before the organization is known (login, API keys, an
+# employee's organization) and the maintenance jobs that cover every
+# organization use the plain connection instead.
+TENANT_TABLES = (
+    "employees", "daily_reports", "tasks", "report_daily_stats", "missing_reports",
+    "digests", "audit_events", "api_keys",
+)
+TENANT_TABLE_PATTERN = re.compile(
+    r"\b(?:FROM|JOIN|INTO|UPDATE)\s+(" + "|".join(TENANT_TABLES) + r")\b", re.IGNORECASE
+)
+
+
+class OrgScopeError(Exception):
+    pass
+
+
+# Parameters for a statement run in the organization; raises OrgScopeError for
+# a statement that would read or write across organizations
+def scope(statement, params, org_id):
+    sql = str(statement)
+    uses_org = ":org_id" in sql
+    if not uses_org:
+        table = TENANT_TABLE_PATTERN.search(sql)
+        if table:
+            raise OrgScopeError(f"Query on {table.group(1)} is not scoped to an organization")
+    if isinstance(params, (list, tuple)):
+        return [scope_params(entry, org_id, uses_org) for entry in params]
+    return scope_params(params, org_id, uses_org)
+
+
+def scope_params(params, org_id, uses_org):
+    params = dict(params or {})
+    if params.get("org_id", org_id) != org_id:
+        raise OrgScopeError(f"Organization {params['org_id']} used on a connection scoped to {org_id}")
+    if uses_org:
+        params["org_id"] = org_id
+    return params
+
+
+# A connection scoped to one organization; everything but execute() is the
+# underlying connection's
+class OrgConnection:
+    def __init__(self, conn, org_id):
+        self.unscoped = conn
+        self.org_id = org_id
+
+    def execute(self, statement, params=None):
+        return self.unscoped.execute(statement, scope(statement, params, self.org_id))
+
+    def __getattr__(self, name):
+        return getattr(self.unscoped, name)
+
+
+# Scopes a connection the caller already holds; a connection scoped to a
+# different organization is an error
+def scoped(conn, org_id):
+    if isinstance(conn, OrgConnection):
+        if conn.org_id != org_id:
+            raise OrgScopeError(f"Organization {org_id} used on a connection scoped to {conn.org_id}")
+        return conn
+    return OrgConnection(conn, org_id)
+
+
+@contextlib.contextmanager
+def connect(engine, org_id):
+    with engine.connect() as conn:
+        yield OrgConnection(conn, org_id)
+
+
+# An employee never changes organization, so lookups are kept for the life of
+# the process. Unknown ids are not kept: the row may not be committed yet.
+_employee_orgs = {}
+_employee_orgs_lock = threading.Lock()
+
+
+def employee_org(conn, employee_id):
+    with _employee_orgs_lock:
+        if employee_id in _employee_orgs:
+            return _employee_orgs[employee_id]
+    conn = getattr(conn, "unscoped", conn)
+    org_id = conn.execute(text('SELECT org_id FROM employees WHERE id = :id'), {'id': employee_id}).scalar()
+    if org_id is not None:
+        with _employee_orgs_lock:
+            _employee_orgs[employee_id] = org_id
+    return org_id
@@ -0,0 +1,56 @@
+import pytest
+from sqlalchemy import create_engine, text
+
+import tenancy
+
+
+@pytest.fixture
+def engine(monkeypatch):
+    monkeypatch.setattr(tenancy, "_employee_orgs", {})
+    engine = create_engine("sqlite://")
+    with engine.connect() as conn:
+        conn.execute(text('CREATE TABLE employees (id INTEGER PRIMARY KEY, org_id INTEGER, full_name TEXT)'))
+        conn.execute(text('CREATE TABLE organizations (id INTEGER PRIMARY KEY, name TEXT)'))
+        conn.execute(text('''
+        INSERT INTO employees (id, org_id, full_name) VALUES (1, 1, 'Ann'), (2, 1, 'Bob'), (3, 2, 'Cat')
+        '''))
+        conn.execute(text("INSERT INTO organizations (id, name) VALUES (1, 'One'), (2, 'Two')"))
+        conn.commit()
+    return engine
+
+
+def test_rejects_unscoped_tenant_query(engine):
+    with tenancy.connect(engine, 1) as conn:
+        with pytest.raises(tenancy.OrgScopeError):
+            conn.execute(text('SELECT full_name FROM employees'))
+        with pytest.raises(tenancy.OrgScopeError):
+            conn.execute(text('UPDATE employees SET full_name = :name WHERE id = :id'), {'name': 'Eve', 'id': 3})
+
+
+def test_binds_org_id(engine):
+    with tenancy.connect(engine, 1) as conn:
+        names = conn.execute(text('SELECT full_name FROM employees WHERE org_id = :org_id ORDER BY id')).scalars().all()
+        assert names == ['Ann', 'Bob']
+        conn.execute(text('INSERT INTO employees (org_id, full_name) VALUES (:org_id, :name)'), [{'name': 'Dan'}, {'name': 'Eli'}])
+        assert conn.execute(text('SELECT COUNT(*) FROM employees WHERE org_id = :org_id')).scalar() == 4
+        # Tables without org_id need no scoping
+        assert conn.execute(text('SELECT COUNT(*) FROM organizations')).scalar() == 2
+
+
+def test_rejects_other_org(engine):
+    with tenancy.connect(engine, 1) as conn:
+        with pytest.raises(tenancy.OrgScopeError):
+            conn.execute(text('SELECT full_name FROM employees WHERE org_id = :org_id'), {'org_id': 2})
+        with pytest.raises(tenancy.OrgScopeError):
+            tenancy.scoped(conn, 2)
+        assert tenancy.scoped(conn, 1) is conn
+
+
+def test_employee_org_is_cached(engine):
+    with tenancy.connect(engine, 1) as conn:
+        assert tenancy.employee_org(conn, 3) == 2
+        assert tenancy.employee_org(conn, 4) is None
+        conn.unscoped.execute(text('UPDATE employees SET org_id = 1 WHERE id = 3'))
+        conn.unscoped.execute(text("INSERT INTO employees (id, org_id, full_name) VALUES (4, 2, 'Dan')"))
+        assert tenancy.employee_org(conn, 3) == 2
+        assert tenancy.employee_org(conn, 4) == 2
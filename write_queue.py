@@ -0,0 +1,210 @@
+import queue
+import random
+import threading
+import time
+
+from sqlalchemy.exc import DBAPIError, OperationalError
+
+# Failed writes kept per owner until they have been shown
+MAX_FAILED_PER_OWNER = 20
+
+
+def error_message(error):
+    return str(getattr(error, "orig", None) or error)
+
+
+# Handle for one queued write; the UI can wait on it briefly or poll its status
+class WriteTicket:
+    def __init__(self, kind, params, owner=None):
+        self.kind = kind
+        self.params = params
+        self.owner = owner
+        self.status = "pending"
+        self.error = None
+        self.result = None
+        self.attempts = 0
+        self.created_at = time.time()
+        self._done = threading.Event()
+        self._callbacks = []
+        self._lock = threading.Lock()
+
+    @property
+    def done(self):
+        return self._done.is_set()
+
+    def wait(self, timeout=None):
+        return self._done.wait(timeout)
+
+    def add_done_callback(self, callback):
+        with self._lock:
+            if not self._done.is_set():
+                self._callbacks.append(callback)
+                return
+        callback(self)
+
+    def _finish(self, status, error=None):
+        with self._lock:
+            self.status = status
+            self.error = error
+            self._done.set()
+            callbacks, self._callbacks = self._callbacks, []
+        for callback in callbacks:
+            try:
+                callback(self)
+            except Exception:
+                pass
+
+
+# Write-behind queue: a single background thread drains queued writes in short
+# batched transactions. If the database is unreachable, it keeps the batch and
+# retries with capped exponential backoff. Handlers are plain functions taking
+# (conn, **params) and must be idempotent, because a batch can be replayed;
+# what a handler returns is kept as the ticket's result.
+# A write fails only when the database rejects it; failed writes with an owner
+# are kept until dismissed, so the owner can be told.
+class WriteBehindQueue:
+    def __init__(self, engine, handlers, batch_size=50, flush_interval=0.2, max_backoff=30.0, on_commit=None):
+        self.engine = engine
+        self.handlers = handlers
+        self.on_commit = on_commit
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_backoff = max_backoff
+        self.last_error = None
+        self._queue = queue.Queue()
+        self._pending = []
+        self._failed = {}
+        self._pending_lock = threading.Lock()
+        self._thread = threading.Thread(target=self._run, name="write-behind", daemon=True)
+        self._thread.start()
+
+    def submit(self, kind, params, owner=None):
+        if kind not in self.handlers:
+            raise ValueError(f"Unknown write kind: {kind}")
+        ticket = WriteTicket(kind, params, owner)
+        with self._pending_lock:
+            self._pending.append(ticket)
+        self._queue.put(ticket)
+        return ticket
+
+    def pending(self, owner=None):
+        with self._pending_lock:
+            return [t for t in self._pending if owner is None or t.owner == owner]
+
+    def failed(self, owner):
+        with self._pending_lock:
+            return list(self._failed.get(owner, []))
+
+    def dismiss_failed(self, owner, tickets):
+        with self._pending_lock:
+            remaining = [t for t in self._failed.get(owner, []) if t not in tickets]
+            if remaining:
+                self._failed[owner] = remaining
+            else:
+                self._failed.pop(owner, None)
+
+    # Collect whatever arrives within flush_interval of the first item
+    def _next_batch(self):
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            backoff = 0.5
+            while True:
+                try:
+                    self._flush(batch)
+                    self.last_error = None
+                    break
+                except (OperationalError, DBAPIError) as e:
+                    if not self._is_outage(e):
+                        # The database is reachable, so the batch itself is at fault;
+                        # isolate the offending writes
+                        self._flush_individually(batch)
+                        break
+                    backoff = self._wait_for_database(e, batch, backoff)
+                except Exception:
+                    self._flush_individually(batch)
+                    break
+
+    # Records the outage and sleeps before the next attempt; returns the next backoff
+    def _wait_for_database(self, error, tickets, backoff):
+        self.last_error = error_message(error)
+        for ticket in tickets:
+            ticket.attempts += 1
+        time.sleep(backoff + random.uniform(0, backoff / 2))
+        return min(backoff * 2, self.max_backoff)
+
+    def _is_outage(self, error):
+        if isinstance(error, DBAPIError) and error.connection_invalidated:
+            return True
+        if not isinstance(error, OperationalError):
+            return False
+        try:
+            with self.engine.connect() as conn:
+                conn.exec_driver_sql("SELECT 1")
+            return False
+        except Exception:
+            return True
+
+    def _apply(self, conn, ticket):
+        ticket.result = self.handlers[ticket.kind](conn, **ticket.params)
+
+    def _flush(self, batch):
+        with self.engine.begin() as conn:
+            for ticket in batch:
+                self._apply(conn, ticket)
+        self._committed(batch)
+        for ticket in batch:
+            self._complete(ticket, "done")
+
+    # One transaction per write, so only the writes the database rejects fail.
+    # An outage that starts part way through is waited out like in _run.
+    def _flush_individually(self, batch):
+        for ticket in batch:
+            backoff = 0.5
+            while True:
+                try:
+                    with self.engine.begin() as conn:
+                        self._apply(conn, ticket)
+                except (OperationalError, DBAPIError) as e:
+                    if self._is_outage(e):
+                        backoff = self._wait_for_database(e, [ticket], backoff)
+                        continue
+                    self._complete(ticket, "failed", error_message(e))
+                except Exception as e:
+                    self._complete(ticket, "failed", error_message(e))
+                else:
+                    self.last_error = None
+                    self._committed([ticket])
+                    self._complete(ticket, "done")
+                break
+
+    # Runs after commit and before tickets complete, so a waiting session never
+    # sees a finished write with stale caches
+    def _committed(self, tickets):
+        if self.on_commit:
+            try:
+                self.on_commit(tickets)
+            except Exception:
+                pass
+
+    def _complete(self, ticket, status, error=None):
+        with self._pending_lock:
+            if ticket in self._pending:
+                self._pending.remove(ticket)
+            if status == "failed" and ticket.owner is not None:
+                failed = self._failed.setdefault(ticket.owner, [])
+                failed.append(ticket)
+                del failed[:-MAX_FAILED_PER_OWNER]
+        ticket._finish(status, error)